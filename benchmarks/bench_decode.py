@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+# file: benchmarks/bench_decode.py
+"""Compare the legacy full decode path against reduced grayscale decoding for motion detection.
+
+Run from the repository root:
+    python -m benchmarks.bench_decode [--iterations 200] [--json results.json]
+"""
+import argparse
+import json
+import time
+
+import cv2
+import numpy as np
+
+from benchmarks.fixtures import RESOLUTIONS, encode_jpeg, synthetic_frame
+from classes.JpegCodec import available_codecs, create_codec, detection_scale_for
+
+
+def time_call(func, iterations):
+    """Return the mean wall time of func in milliseconds"""
+    func()  # Warm up
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - start) * 1000.0 / iterations
+
+
+def legacy_path(data):
+    """Decode path used before reduced decoding: full BGR decode, resize by half, convert to gray"""
+    frame = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+    height, width = frame.shape[:2]
+    small = cv2.resize(frame, (width // 2, height // 2))
+    return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--resolutions', default='VGA,SVGA,UXGA')
+    parser.add_argument('--quality', type=int, default=80)
+    parser.add_argument('--json', help='Write results to this file')
+    args = parser.parse_args()
+
+    results = []
+    for resolution in args.resolutions.split(','):
+        width, height = RESOLUTIONS[resolution]
+        data = encode_jpeg(synthetic_frame(width, height), args.quality)
+        scale = detection_scale_for(resolution)
+        legacy_ms = time_call(lambda: legacy_path(data), args.iterations)
+        row = {
+            'resolution': resolution,
+            'jpeg_bytes': len(data),
+            'scale': scale,
+            'legacy_ms': round(legacy_ms, 3)
+        }
+        for name in available_codecs():
+            codec = create_codec(name)
+            reduced_ms = time_call(lambda: codec.decode_gray(data, scale), args.iterations)
+            row[f'{name}_ms'] = round(reduced_ms, 3)
+            row[f'{name}_speedup'] = round(legacy_ms / reduced_ms, 2)
+        results.append(row)
+        print(f"[+] {resolution:5} {len(data):7d} B  scale 1/{scale}  legacy {legacy_ms:7.3f} ms  " +
+              "  ".join(f"{name} {row[f'{name}_ms']:7.3f} ms (x{row[f'{name}_speedup']})" for name in available_codecs()))
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'benchmark': 'decode', 'results': results}, f, indent=2)
+        print(f"[+] Results written to {args.json}")
+
+
+if __name__ == '__main__':
+    main()
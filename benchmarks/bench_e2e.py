@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+# file: benchmarks/bench_e2e.py
+"""End-to-end load benchmark: a fleet of simulated cameras and viewers against a WSServer hub.
+
+Run from the repository root:
+    python -m benchmarks.bench_e2e [--cameras 8] [--viewers 8] [--fps 10] [--seconds 20] [--json results.json]
+
+By default the hub runs in a child process so its CPU time can be measured on its own. Use
+--url (and --hub-pid for CPU figures) to load a hub that is already running. --fanout N runs
+the split deployment instead: viewers connect to N fan-out processes fed over the frame bus, and
+the hub CPU figure covers all of its processes. CPU figures include the descendants of each hub
+process, such as the motion workers of --backend process.
+"""
+import argparse
+import asyncio
+import glob
+import json
+import multiprocessing as mp
+import os
+import platform
+import signal
+import socket
+import subprocess
+import time
+
+from benchmarks.fleet import FrameLibrary, SimulatedCamera, SimulatedViewer
+
+
+def run_hub(port, stream_mode, detection_backend, settings_file, idle_stride, bus_path=None):
+    """Child process entry point running a hub with default options"""
+    from classes.LogPipeline import setup_logging
+    from classes.WSServer import WSServer
+    WSServer(host='127.0.0.1', port=port, stream_mode=stream_mode, detection_backend=detection_backend,
+             settings_file=settings_file, idle_stride=idle_stride, bus_path=bus_path,
+             log_rate_limit=setup_logging()).run()
+
+
+def run_fanout(bus_path, port, index):
+    """Child process entry point running one viewer fan-out process of the split deployment"""
+    from classes.FanoutServer import FanoutServer
+    from classes.LogPipeline import setup_logging
+    setup_logging()
+    FanoutServer(bus_path, host='127.0.0.1', port=port, name=f'fanout-{index}').run()
+
+
+def wait_for_port(port, timeout=20.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"Hub did not start listening on port {port}")
+
+
+def process_cpu_seconds(pid):
+    """User + system CPU seconds of a process and its threads, read from /proc"""
+    with open(f'/proc/{pid}/stat') as f:
+        fields = f.read().rsplit(')', 1)[1].split()
+    # utime and stime are fields 14 and 15 of the stat line, counted after the command name
+    return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+
+
+def process_tree(pid):
+    """A process and all its live descendants, found through /proc/<pid>/task/*/children"""
+    pids = [pid]
+    for task in glob.glob(f'/proc/{pid}/task/*/children'):
+        try:
+            with open(task) as f:
+                children = [int(child) for child in f.read().split()]
+        except OSError:
+            continue  # Thread exited
+        for child in children:
+            pids += process_tree(child)
+    return pids
+
+
+def tree_cpu_seconds(pid):
+    """CPU seconds of every process in a tree, keyed by pid so workers started later are counted from zero"""
+    seconds = {}
+    for member in process_tree(pid):
+        try:
+            seconds[member] = process_cpu_seconds(member)
+        except OSError:
+            pass  # Exited while the tree was walked
+    return seconds
+
+
+def percentiles(values, points=(50, 95, 99)):
+    """Milliseconds percentiles of a list of seconds"""
+    if not values:
+        return {f'p{point}': None for point in points}
+    ordered = sorted(values)
+    result = {f'p{point}': round(ordered[min(len(ordered) - 1, int(len(ordered) * point / 100))] * 1000.0, 2)
+              for point in points}
+    result['max'] = round(ordered[-1] * 1000.0, 2)
+    return result
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL,
+                                       text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run_fleet(args, url, viewer_url):
+    library = FrameLibrary(source_dir=args.frames, activity=args.activity)
+    library.frames(args.resolution, 80)  # Encode the fixtures before the clock starts
+    cameras = [SimulatedCamera(url, f"sim-{index}", library, fps=args.fps, resolution=args.resolution)
+               for index in range(args.cameras)]
+    tiers = args.tiers.split(',')
+    grids = [None] * args.viewers
+    if args.grid:
+        # Each viewer follows the next args.grid cameras in turn over one multiplexed connection
+        grids = [[cameras[(index + offset) % len(cameras)] for offset in range(min(args.grid, len(cameras)))]
+                 for index in range(args.viewers)]
+    viewers = [SimulatedViewer(viewer_url, cameras[index % len(cameras)], latency_every=args.latency_every,
+                               tier=tiers[index % len(tiers)], grid=grids[index])
+               for index in range(args.viewers)]
+    camera_tasks = [asyncio.ensure_future(camera.run(args.seconds + 2.0)) for camera in cameras]
+    await asyncio.sleep(1.0)  # Let cameras register before viewers select them
+    await asyncio.gather(*(viewer.run(args.seconds) for viewer in viewers))
+    await asyncio.gather(*camera_tasks)
+    return cameras, viewers
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--cameras', type=int, default=8)
+    parser.add_argument('--viewers', type=int, default=8)
+    parser.add_argument('--fps', type=float, default=10.0, help='Frames per second sent by each camera')
+    parser.add_argument('--resolution', default='VGA')
+    parser.add_argument('--seconds', type=float, default=20.0)
+    parser.add_argument('--frames', help='Directory of recorded JPEG frames, synthetic frames when omitted')
+    parser.add_argument('--activity', default='busy', choices=['static', 'noisy', 'busy'],
+                        help='Scene of the synthetic frames')
+    parser.add_argument('--idle-stride', type=int, default=5, help='Detection stride of quiet cameras, 1 disables it')
+    parser.add_argument('--mode', default='annotated', choices=['annotated', 'passthrough'])
+    parser.add_argument('--backend', default='thread', choices=['thread', 'process'])
+    parser.add_argument('--tiers', default='full', help='Quality tiers assigned to viewers in turn, e.g. full,thumb')
+    parser.add_argument('--grid', type=int, default=0,
+                        help='Cameras each viewer follows over one multiplexed connection, 0 selects one camera')
+    parser.add_argument('--latency-every', type=int, default=1, help='Decode the tag of every Nth received frame')
+    parser.add_argument('--port', type=int, default=5077)
+    parser.add_argument('--url', help='Load an already running hub instead of starting one')
+    parser.add_argument('--hub-pid', type=int, help='Process id of the hub given by --url, for CPU figures')
+    parser.add_argument('--viewer-url', help='Where viewers connect when --url is given, defaults to --url')
+    parser.add_argument('--fanout', type=int, default=0,
+                        help='Run the split deployment with this many viewer fan-out processes')
+    parser.add_argument('--json', help='Write results to this file')
+    args = parser.parse_args()
+
+    processes = []
+    url = args.url
+    viewer_url = args.viewer_url or url
+    hub_pids = [args.hub_pid] if args.hub_pid else []
+    if url is None:
+        url = viewer_url = f'ws://127.0.0.1:{args.port}'
+        settings_file = f'/tmp/bench-e2e-settings-{os.getpid()}.json'
+        bus_path = f'/tmp/bench-e2e-bus-{os.getpid()}.sock' if args.fanout else None
+        context = mp.get_context('spawn')
+        # Not a daemon, the process backend starts worker processes of its own
+        processes.append(context.Process(target=run_hub,
+                                         args=(args.port, args.mode, args.backend, settings_file,
+                                               args.idle_stride, bus_path)))
+        if args.fanout:
+            viewer_url = f'ws://127.0.0.1:{args.port + 1}'
+            processes += [context.Process(target=run_fanout, args=(bus_path, args.port + 1, index))
+                          for index in range(args.fanout)]
+        for process in processes:
+            process.start()
+        hub_pids = [process.pid for process in processes]
+        wait_for_port(args.port)
+        if args.fanout:
+            wait_for_port(args.port + 1)
+            time.sleep(1.0)  # Let every fan-out process reach the bus
+
+    try:
+        cpu_start = [tree_cpu_seconds(pid) for pid in hub_pids]
+        wall_start = time.perf_counter()
+        cameras, viewers = asyncio.run(run_fleet(args, url, viewer_url))
+        wall = time.perf_counter() - wall_start
+        # Read before shutdown, worker processes that exit take their CPU time with them
+        cpu_used = [sum(used - start.get(member, 0.0) for member, used in tree_cpu_seconds(pid).items())
+                    for pid, start in zip(hub_pids, cpu_start)]
+    finally:
+        for process in processes:
+            # An interrupt lets the hub clean up, stopping its worker processes too
+            os.kill(process.pid, signal.SIGINT)
+        for process in processes:
+            process.join(timeout=10.0)
+            if process.is_alive():
+                process.terminate()
+                process.join(timeout=5.0)
+
+    streaming = max(camera.elapsed for camera in cameras) or wall
+    frames_sent = sum(camera.frames_sent for camera in cameras)
+    bytes_sent = sum(camera.bytes_sent for camera in cameras)
+    frames_received = sum(viewer.frames_received for viewer in viewers)
+    frames_expected = sum(viewer.frames_expected for viewer in viewers)
+    latencies = [latency for viewer in viewers for latency in viewer.latencies]
+    unmatched = sum(viewer.unmatched for viewer in viewers)
+    cpu_percent = round(sum(cpu_used) * 100.0 / wall, 1) if cpu_used else None
+
+    results = {
+        'benchmark': 'e2e',
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'config': {key: value for key, value in vars(args).items() if key not in ('json', 'hub_pid')},
+        'ingest': {
+            'frames': frames_sent,
+            'fps': round(frames_sent / streaming, 1),
+            'mbit_per_s': round(bytes_sent * 8 / streaming / 1e6, 2),
+            'send_blocked_s': round(sum(camera.send_time for camera in cameras), 3)
+        },
+        'delivery': {
+            'frames_received': frames_received,
+            'frames_expected': frames_expected,
+            'mbit_per_s': round(sum(viewer.bytes_received for viewer in viewers) * 8 / streaming / 1e6, 2),
+            'drop_rate': round(1.0 - frames_received / frames_expected, 4) if frames_expected else None,
+            'unmatched_tags': unmatched
+        },
+        'latency_ms': dict(percentiles(latencies), samples=len(latencies)),
+        'hub_cpu': {
+            'percent': cpu_percent,
+            'percent_per_camera': round(cpu_percent / args.cameras, 2) if cpu_percent is not None else None,
+            'percent_per_process': [round(used * 100.0 / wall, 1) for used in cpu_used]
+        }
+    }
+
+    print(f"[+] Ingest     {results['ingest']['fps']:8.1f} frames/s  {results['ingest']['mbit_per_s']:7.2f} Mbit/s")
+    print(f"[+] Delivered  {frames_received}/{frames_expected} frames  drop rate {results['delivery']['drop_rate']}")
+    print(f"[+] Egress     {results['delivery']['mbit_per_s']:8.2f} Mbit/s to viewers")
+    latency = results['latency_ms']
+    print(f"[+] Latency    p50 {latency['p50']} ms  p95 {latency['p95']} ms  p99 {latency['p99']} ms  "
+          f"({latency['samples']} samples)")
+    if cpu_percent is not None:
+        print(f"[+] Hub CPU    {cpu_percent}% total, {results['hub_cpu']['percent_per_camera']}% per camera")
+        if len(cpu_used) > 1:
+            print(f"[+] Processes  {', '.join(f'{percent}%' for percent in results['hub_cpu']['percent_per_process'])} "
+                  f"(ingest first)")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"[+] Results written to {args.json}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+# file: benchmarks/bench_motion.py
+"""Micro-benchmarks of the frame pipeline, each motion engine, WSServer.detect_motion, cv2.imdecode
+and cv2.imencode with regression gates.
+
+Run from the repository root:
+    python -m benchmarks.bench_motion [--resolutions QVGA,VGA,SVGA,UXGA] [--activities static,noisy,busy]
+        [--blur-sizes 11,21,31,41] [--dilations 1,3,5] [--thresholds 15,25,40] [--full]
+        [--engines framediff,running_avg,mog2,knn] [--modes annotated,passthrough] [--codec auto]
+        [--frames DIR] [--save-baseline baseline.json | --baseline baseline.json] [--json results.json]
+
+The process_frame cases run what a camera's processing thread runs for every frame: a reduced
+grayscale decode at detection_scale_for(resolution), the selected engine and the re-encode, with
+the default motion settings. The detect cases time each engine alone on that reduced frame.
+
+Motion settings are swept one at a time around WSServer.default_motion_settings; --full runs
+every combination instead. --frames DIR replays recorded JPEGs from DIR/<activity>/, falling back
+to synthetic sequences for activities without recordings.
+
+Allocation figures come from tracemalloc in a separate pass so they do not distort the timings.
+They cover Python and NumPy buffers, including the arrays OpenCV returns, but not OpenCV's
+internal scratch memory.
+
+With --baseline, a case regresses when its p50 grows by more than --tolerance (and by at least
+--min-delta-ms) or its peak allocation grows by more than --tolerance; the run then exits with
+status 1. Baselines are only comparable on the machine that recorded them.
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+from benchmarks.fixtures import RESOLUTIONS, encode_jpeg, load_recorded_sequence, synthetic_sequence
+from classes.FramePipeline import DEFAULT_TIER, process_frame
+from classes.JpegCodec import create_codec, detection_scale_for
+from classes.MotionDetector import ENGINES, create_detector
+from classes.WSServer import WSServer
+
+ACTIVITIES = ('static', 'noisy', 'busy')
+SWEEP_SETTINGS = ('blur_size', 'dilation', 'threshold')
+ENCODE_QUALITY = 85  # Quality the annotated stream is re-encoded at
+
+
+def int_list(value):
+    return [int(item) for item in value.split(',') if item]
+
+
+def load_sequence(frames_dir, activity, width, height, count):
+    """JPEG frames of one activity, recorded when DIR/<activity>/ exists, otherwise synthetic"""
+    if frames_dir:
+        recorded = load_recorded_sequence(os.path.join(frames_dir, activity))
+        if recorded:
+            resized = []
+            for data in recorded[:count]:
+                frame = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+                if frame is not None:
+                    frame = cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA)
+                    resized.append(encode_jpeg(frame, 80))
+            if resized:
+                return resized
+    return [encode_jpeg(frame, 80) for frame in synthetic_sequence(width, height, count, activity)]
+
+
+def measure(call, count, warmup, prepare=None):
+    """Time count calls of call(index) after warmup calls, then measure allocations of a few more.
+
+    prepare(index), when given, runs untimed before each call and its result is passed instead of index.
+    """
+    prepare = prepare or (lambda index: index)
+    for index in range(warmup):
+        call(prepare(index))
+    timings = []
+    for index in range(warmup, warmup + count):
+        argument = prepare(index)
+        start = time.perf_counter()
+        call(argument)
+        timings.append(time.perf_counter() - start)
+
+    allocation_calls = min(count, 20)
+    peaks = []
+    retained = []
+    tracemalloc.start()
+    try:
+        for index in range(warmup + count, warmup + count + allocation_calls):
+            argument = prepare(index)
+            before, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            result = call(argument)
+            after, peak = tracemalloc.get_traced_memory()
+            peaks.append(peak - before)
+            retained.append(after - before)
+            del result
+    finally:
+        tracemalloc.stop()
+
+    timings.sort()
+    return {
+        'calls': count,
+        'mean_ms': round(statistics.fmean(timings) * 1000.0, 4),
+        'p50_ms': round(timings[len(timings) // 2] * 1000.0, 4),
+        'p95_ms': round(timings[min(len(timings) - 1, int(len(timings) * 0.95))] * 1000.0, 4),
+        'peak_kb': round(max(peaks) / 1024.0, 1),
+        'retained_kb': round(statistics.fmean(retained) / 1024.0, 1)
+    }
+
+
+def motion_cases(defaults, args):
+    """Motion settings to run: one setting varied at a time, or every combination with --full"""
+    values = {'blur_size': args.blur_sizes, 'dilation': args.dilations, 'threshold': args.thresholds}
+    if args.full:
+        for combination in itertools.product(*(values[name] for name in SWEEP_SETTINGS)):
+            yield dict(defaults, **dict(zip(SWEEP_SETTINGS, combination)))
+        return
+    yield dict(defaults)
+    for name in SWEEP_SETTINGS:
+        for value in values[name]:
+            if value != defaults[name]:
+                yield dict(defaults, **{name: value})
+
+
+def case_key(op, resolution, activity, settings=None, variant=None):
+    key = f'{op}/{resolution}/{activity}'
+    if variant is not None:
+        key += f'/{variant}'
+    if settings is not None:
+        key += '/' + ','.join(f'{name}={settings[name]}' for name in SWEEP_SETTINGS)
+    return key
+
+
+def compare(results, baseline, tolerance, min_delta_ms):
+    """Return a description of every case slower or hungrier than its baseline"""
+    previous = {row['case']: row for row in baseline.get('results', [])}
+    regressions = []
+    for row in results:
+        old = previous.get(row['case'])
+        if old is None:
+            continue
+        delta_ms = row['p50_ms'] - old['p50_ms']
+        if delta_ms > min_delta_ms and row['p50_ms'] > old['p50_ms'] * (1.0 + tolerance):
+            regressions.append(f"{row['case']}: p50 {old['p50_ms']:.3f} -> {row['p50_ms']:.3f} ms")
+        if old['peak_kb'] > 0 and row['peak_kb'] > old['peak_kb'] * (1.0 + tolerance):
+            regressions.append(f"{row['case']}: peak allocation {old['peak_kb']:.1f} -> {row['peak_kb']:.1f} KB")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--resolutions', default='QVGA,VGA,SVGA,UXGA')
+    parser.add_argument('--activities', default=','.join(ACTIVITIES))
+    parser.add_argument('--blur-sizes', type=int_list, default=[11, 21, 31, 41])
+    parser.add_argument('--dilations', type=int_list, default=[1, 3, 5])
+    parser.add_argument('--thresholds', type=int_list, default=[15, 25, 40])
+    parser.add_argument('--full', action='store_true', help='Run every combination of the swept settings')
+    parser.add_argument('--engines', default=','.join(ENGINES), help='Motion engines run through process_frame')
+    parser.add_argument('--modes', default='annotated,passthrough', help='Stream modes run through process_frame')
+    parser.add_argument('--codec', default='auto', help='JPEG codec of the process_frame cases, as JPEG_CODEC')
+    parser.add_argument('--frames', help='Directory with recorded JPEG sequences in one subdirectory per activity')
+    parser.add_argument('--sequence-length', type=int, default=30)
+    parser.add_argument('--iterations', type=int, default=100, help='Timed calls per case')
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument('--json', help='Write results to this file')
+    parser.add_argument('--save-baseline', help='Write results to this file as the new baseline')
+    parser.add_argument('--baseline', help='Compare against this baseline and exit 1 on regressions')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed relative growth before a case regresses')
+    parser.add_argument('--min-delta-ms', type=float, default=0.05, help='Ignore p50 growth smaller than this')
+    args = parser.parse_args()
+
+    settings_dir = tempfile.mkdtemp(prefix='bench-motion-')
+    server = WSServer(settings_file=os.path.join(settings_dir, 'camera_settings.json'))
+    defaults = dict(server.default_motion_settings)
+    codec = create_codec(args.codec)
+    engines = args.engines.split(',')
+    results = []
+
+    def report(row):
+        results.append(row)
+        print(f"[+] {row['case']:60} p50 {row['p50_ms']:8.3f} ms  p95 {row['p95_ms']:8.3f} ms  "
+              f"peak {row['peak_kb']:9.1f} KB")
+
+    try:
+        for resolution in args.resolutions.split(','):
+            width, height = RESOLUTIONS[resolution]
+            for activity in args.activities.split(','):
+                sequence = load_sequence(args.frames, activity, width, height, args.sequence_length)
+                buffers = [np.frombuffer(data, np.uint8) for data in sequence]
+                decoded = [cv2.imdecode(buffer, cv2.IMREAD_COLOR) for buffer in buffers]
+                length = len(sequence)
+
+                row = measure(lambda i: cv2.imdecode(buffers[i % length], cv2.IMREAD_COLOR),
+                              args.iterations, args.warmup)
+                report(dict(row, case=case_key('imdecode', resolution, activity), jpeg_bytes=len(sequence[0])))
+
+                encode_params = [cv2.IMWRITE_JPEG_QUALITY, ENCODE_QUALITY]
+                row = measure(lambda i: cv2.imencode('.jpg', decoded[i % length], encode_params),
+                              args.iterations, args.warmup)
+                report(dict(row, case=case_key('imencode', resolution, activity)))
+
+                # The production hot path, with each engine a camera may select
+                scale = detection_scale_for(resolution, server.detection_width)
+                grays = [codec.decode_gray(data, scale) for data in sequence]
+                for engine in engines:
+                    settings = dict(defaults, engine=engine)
+                    detector = create_detector(engine)
+                    row = measure(lambda i: detector.detect(grays[i % length], settings, scale),
+                                  args.iterations, args.warmup)
+                    report(dict(row, case=case_key('detect', resolution, activity, variant=engine), scale=scale))
+                    for mode in args.modes.split(','):
+                        detector = create_detector(engine)
+                        row = measure(lambda i: process_frame(codec, detector, sequence[i % length], settings, scale,
+                                                              mode, (DEFAULT_TIER,)),
+                                      args.iterations, args.warmup)
+                        report(dict(row, case=case_key('process_frame', resolution, activity,
+                                                       variant=f'{mode}/{engine}'), codec=codec.name))
+
+                for number, settings in enumerate(motion_cases(defaults, args)):
+                    # A fresh camera per case so detector state never leaks between settings
+                    camera_id = f'bench-{resolution}-{activity}-{number}'
+                    server.camera_motion_settings[camera_id] = settings
+                    # detect_motion draws into its input, so each frame is restored untimed before the call
+                    frames = [frame.copy() for frame in decoded]
+
+                    def restore(i):
+                        frame = frames[i % length]
+                        frame[...] = decoded[i % length]
+                        return frame
+
+                    row = measure(lambda frame: server.detect_motion(frame, camera_id), args.iterations,
+                                  args.warmup, prepare=restore)
+                    report(dict(row, case=case_key('detect_motion', resolution, activity, settings)))
+                    server.cameras.sessions.pop(camera_id, None)
+    finally:
+        server.settings_store.close()
+
+    output = {
+        'benchmark': 'motion',
+        'python': platform.python_version(),
+        'opencv': cv2.__version__,
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+        'default_motion_settings': defaults,
+        'results': results
+    }
+    for path in (args.json, args.save_baseline):
+        if path:
+            with open(path, 'w') as f:
+                json.dump(output, f, indent=2)
+            print(f"[+] Results written to {path}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance, args.min_delta_ms)
+        if regressions:
+            for regression in regressions:
+                print(f"[-] Regression {regression}")
+            sys.exit(1)
+        print(f"[+] No regressions against {args.baseline}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# file: benchmarks/bench_worker_pool.py
+"""Measure annotated-mode frame throughput of the motion worker pool as worker processes are added.
+
+Run from the repository root:
+    python -m benchmarks.bench_worker_pool [--cameras 12] [--seconds 5] [--json results.json]
+"""
+import argparse
+import json
+import os
+import threading
+import time
+
+from benchmarks.fixtures import RESOLUTIONS, encode_jpeg, synthetic_sequence
+from classes.FramePipeline import process_frame
+from classes.JpegCodec import create_codec, detection_scale_for
+from classes.MotionDetector import FrameDiffDetector
+from classes.MotionWorkerPool import MotionWorkerPool
+
+SETTINGS = {'min_area': 4000, 'threshold': 25, 'blur_size': 31, 'dilation': 3}
+
+
+def run_cameras(cameras, seconds, frames, handler):
+    """Feed frames from one thread per camera for a fixed time and return total frames processed"""
+    counts = [0] * cameras
+    deadline = time.perf_counter() + seconds
+
+    def camera_loop(index):
+        camera_id = f"bench-{index}"
+        while time.perf_counter() < deadline:
+            handler(camera_id, frames[counts[index] % len(frames)])
+            counts[index] += 1
+
+    threads = [threading.Thread(target=camera_loop, args=(index,)) for index in range(cameras)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sum(counts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--cameras', type=int, default=12)
+    parser.add_argument('--seconds', type=float, default=5.0)
+    parser.add_argument('--resolution', default='VGA')
+    parser.add_argument('--mode', default='annotated', choices=['annotated', 'passthrough'])
+    parser.add_argument('--json', help='Write results to this file')
+    args = parser.parse_args()
+
+    width, height = RESOLUTIONS[args.resolution]
+    frames = [encode_jpeg(frame) for frame in synthetic_sequence(width, height, 10, 'busy')]
+    scale = detection_scale_for(args.resolution)
+    results = []
+
+    # Baseline: the threaded backend, all cameras sharing one interpreter
+    codec = create_codec()
+    detectors = {}
+
+    def threaded(camera_id, data):
+        detector = detectors.setdefault(camera_id, FrameDiffDetector())
+        process_frame(codec, detector, data, SETTINGS, scale, args.mode)
+
+    total = run_cameras(args.cameras, args.seconds, frames, threaded)
+    results.append({'backend': 'thread', 'workers': 0, 'fps': round(total / args.seconds, 1)})
+    print(f"[+] thread backend          {total / args.seconds:8.1f} frames/s")
+
+    worker_counts = sorted({1, 2, 4, os.cpu_count() or 1})
+    for workers in worker_counts:
+        pool = MotionWorkerPool(workers=workers)
+        try:
+            pool_handler = lambda camera_id, data: pool.process(camera_id, data, SETTINGS, scale, args.mode)
+            run_cameras(args.cameras, 0.5, frames, pool_handler)  # Warm up the workers
+            total = run_cameras(args.cameras, args.seconds, frames, pool_handler)
+        finally:
+            pool.shutdown()
+        results.append({'backend': 'process', 'workers': workers, 'fps': round(total / args.seconds, 1)})
+        print(f"[+] process backend x{workers:<3}   {total / args.seconds:8.1f} frames/s")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'benchmark': 'worker_pool', 'cameras': args.cameras,
+                       'resolution': args.resolution, 'results': results}, f, indent=2)
+        print(f"[+] Results written to {args.json}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+# file: benchmarks/fixtures.py
+import glob
+import os
+
+import cv2
+import numpy as np
+
+# Frame sizes for the ESP32 resolution settings
+RESOLUTIONS = {
+    'QVGA': (320, 240),
+    'VGA': (640, 480),
+    'SVGA': (800, 600),
+    'XGA': (1024, 768),
+    'SXGA': (1280, 1024),
+    'UXGA': (1600, 1200)
+}
+
+
+def synthetic_frame(width, height, seed=0):
+    """Build a textured BGR test frame so JPEG coding costs resemble a real scene"""
+    rng = np.random.default_rng(seed)
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    base = (x * 0.6 + y * 0.4).astype(np.uint8)
+    frame = cv2.merge([base, np.flipud(base), np.fliplr(base)])
+    for _ in range(12):
+        x0, y0 = int(rng.integers(0, width)), int(rng.integers(0, height))
+        size = int(rng.integers(width // 20, width // 6))
+        colour = tuple(int(c) for c in rng.integers(0, 255, 3))
+        cv2.rectangle(frame, (x0, y0), (x0 + size, y0 + size), colour, -1)
+    noise = rng.normal(0, 6, frame.shape).astype(np.int16)
+    return np.clip(frame.astype(np.int16) + noise, 0, 255).astype(np.uint8)
+
+
+def synthetic_sequence(width, height, count=30, activity='static', seed=0):
+    """Build a frame sequence: 'static' scene, 'noisy' sensor noise only, or 'busy' moving objects"""
+    rng = np.random.default_rng(seed)
+    background = synthetic_frame(width, height, seed)
+    frames = []
+    for index in range(count):
+        frame = background.copy()
+        if activity in ('noisy', 'busy'):
+            noise = rng.normal(0, 10, frame.shape).astype(np.int16)
+            frame = np.clip(frame.astype(np.int16) + noise, 0, 255).astype(np.uint8)
+        if activity == 'busy':
+            for obj in range(4):
+                size = width // 8
+                x0 = (index * (8 + obj * 4) + obj * width // 4) % max(1, width - size)
+                y0 = (obj * height // 4 + index * 3) % max(1, height - size)
+                cv2.rectangle(frame, (x0, y0), (x0 + size, y0 + size), (40 * obj, 200, 255 - 40 * obj), -1)
+        frames.append(frame)
+    return frames
+
+
+def encode_jpeg(frame, quality=80):
+    """Encode a BGR frame to JPEG bytes"""
+    ok, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        raise RuntimeError("JPEG encoding failed")
+    return buffer.tobytes()
+
+
+def load_recorded_sequence(directory):
+    """Load a recorded sequence of JPEG files from a directory, sorted by name"""
+    paths = sorted(glob.glob(os.path.join(directory, '*.jpg')) + glob.glob(os.path.join(directory, '*.jpeg')))
+    frames = []
+    for path in paths:
+        with open(path, 'rb') as f:
+            frames.append(f.read())
+    return frames
@@ -0,0 +1,249 @@
+# file: benchmarks/fleet.py
+"""Simulated ESP32-CAM clients and web viewers for load testing the hub.
+
+Every frame a simulated camera sends carries a tag drawn into its top-left pixels. The tag
+survives annotated re-encoding as well as pass-through, so viewers can match each received
+frame to its send time and measure glass-to-glass latency.
+"""
+import asyncio
+import json
+import time
+
+import cv2
+import numpy as np
+import websockets
+
+from benchmarks.fixtures import RESOLUTIONS, encode_jpeg, load_recorded_sequence, synthetic_sequence
+from classes.FrameRing import unpack_tag
+
+TAG_BITS = 8  # Tag values cycle through 256 codes, long enough to outlast any queueing delay
+TAG_BLOCK = 16  # Side in pixels of each tag bit, large enough to survive JPEG quantization
+TAG_CODES = 1 << TAG_BITS
+
+# Downscale factor of each hub quality tier, to find the tag in reduced frames
+TIER_FACTORS = {'full': 1, 'half': 2, 'thumb': 4}
+
+
+def draw_tag(frame, code):
+    """Draw a tag (code followed by its complement as a checksum) into the frame's top row"""
+    bits = [(code >> bit) & 1 for bit in range(TAG_BITS)]
+    bits += [1 - value for value in bits]
+    for index, value in enumerate(bits):
+        x0 = index * TAG_BLOCK
+        frame[0:TAG_BLOCK, x0:x0 + TAG_BLOCK] = 255 if value else 0
+    return frame
+
+
+def read_tag(data, factor=1):
+    """Return the tag of a JPEG frame downscaled by factor, or None when it is missing or damaged"""
+    # Full frames are read from a half-size decode, tiers that are already reduced at their own size
+    flag = cv2.IMREAD_REDUCED_GRAYSCALE_2 if factor == 1 else cv2.IMREAD_GRAYSCALE
+    gray = cv2.imdecode(np.frombuffer(data, np.uint8), flag)
+    if gray is None:
+        return None
+    step = TAG_BLOCK // (2 if factor == 1 else factor)
+    row = gray[step // 2, step // 2::step][:TAG_BITS * 2]
+    if len(row) < TAG_BITS * 2:
+        return None
+    bits = [1 if value > 127 else 0 for value in row]
+    if any(bits[bit] == bits[bit + TAG_BITS] for bit in range(TAG_BITS)):
+        return None  # Checksum mismatch, e.g. a motion box drawn across the tag
+    return sum(value << bit for bit, value in enumerate(bits[:TAG_BITS]))
+
+
+class FrameLibrary:
+    """Pre-encoded tagged JPEG frames for each (resolution, quality), shared by all simulated cameras"""
+
+    def __init__(self, source_dir=None, count=20, activity='busy'):
+        self.source_dir = source_dir  # Directory of recorded JPEGs, synthetic frames when None
+        self.count = count
+        self.activity = activity
+        self.cache = {}
+
+    def _source_frames(self, width, height):
+        if self.source_dir:
+            frames = []
+            for data in load_recorded_sequence(self.source_dir):
+                frame = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+                if frame is not None:
+                    frames.append(cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA))
+            if frames:
+                return frames
+        return synthetic_sequence(width, height, self.count, self.activity)
+
+    def frames(self, resolution='VGA', quality=80):
+        """Return TAG_CODES encoded frames, frame i carrying tag i"""
+        key = (resolution, quality)
+        if key not in self.cache:
+            width, height = RESOLUTIONS[resolution]
+            source = self._source_frames(width, height)
+            self.cache[key] = [encode_jpeg(draw_tag(source[code % len(source)].copy(), code), quality)
+                               for code in range(TAG_CODES)]
+        return self.cache[key]
+
+
+def firmware_quality(quality):
+    """Map the firmware quality setting (lower is better, 10-63) to a JPEG encoder quality"""
+    return int(max(10, min(95, 100 - quality * 1.4)))
+
+
+class SimulatedCamera:
+    """A WebSocket client behaving like the ESP32-CAM firmware: register, stream JPEGs, obey settings"""
+
+    def __init__(self, url, camera_id, library, fps=10.0, resolution='VGA', quality=12, camera_name=None):
+        self.url = url
+        self.camera_id = camera_id
+        self.camera_name = camera_name or f"Sim {camera_id}"
+        self.library = library
+        self.fps = fps
+        self.resolution = resolution
+        self.quality = quality  # Firmware scale: lower numbers mean better quality
+        self.frame_interval = 0  # Milliseconds between frames the hub asked for, on top of the fps cap
+        self.seq = 0
+        self.sent_times = [0.0] * TAG_CODES  # Send time of the latest frame carrying each tag
+        self.frames_sent = 0
+        self.bytes_sent = 0
+        self.send_time = 0.0  # Time spent blocked in send(), a sign of hub backpressure
+        self.elapsed = 0.0  # Seconds spent streaming
+        self.settings_received = []
+
+    def apply_settings(self, camera):
+        """Apply a settings message from the hub the way the firmware does"""
+        self.settings_received.append(dict(camera))
+        if camera.get('resolution') in RESOLUTIONS:
+            self.resolution = camera['resolution']
+        if 'quality' in camera:
+            self.quality = int(camera['quality'])
+        if 'frame_interval' in camera:
+            self.frame_interval = min(max(int(camera['frame_interval']), 20), 5000)
+
+    @property
+    def interval(self):
+        """Seconds between frames: the configured fps, slowed further by the hub's frame_interval"""
+        return max(1.0 / self.fps, self.frame_interval / 1000.0)
+
+    async def _receive(self, websocket):
+        async for message in websocket:
+            if isinstance(message, bytes):
+                continue
+            try:
+                data = json.loads(message)
+            except ValueError:
+                continue
+            if data.get('type') == 'settings' and 'camera' in data.get('data', {}):
+                self.apply_settings(data['data']['camera'])
+                # The firmware confirms with the settings it applied
+                await websocket.send(json.dumps({
+                    "type": "settings",
+                    "data": {"camera": {"resolution": self.resolution, "quality": self.quality}}
+                }))
+
+    async def run(self, duration):
+        """Stream frames at the configured rate for duration seconds"""
+        async with websockets.connect(self.url, max_size=None) as websocket:
+            await websocket.send(json.dumps({
+                "type": "camera",
+                "message": "init",
+                "camera_id": self.camera_id,
+                "camera_name": self.camera_name
+            }))
+            receiver = asyncio.ensure_future(self._receive(websocket))
+            loop = asyncio.get_running_loop()
+            start = loop.time()
+            try:
+                deadline = start + duration
+                next_send = start
+                while loop.time() < deadline:
+                    frames = self.library.frames(self.resolution, firmware_quality(self.quality))
+                    code = self.seq % TAG_CODES
+                    data = frames[code]
+                    send_start = time.perf_counter()
+                    self.sent_times[code] = time.time()
+                    await websocket.send(data)
+                    self.send_time += time.perf_counter() - send_start
+                    self.seq += 1
+                    self.frames_sent += 1
+                    self.bytes_sent += len(data)
+                    # Keep a fixed schedule so slow sends do not lower the offered rate
+                    next_send += self.interval
+                    await asyncio.sleep(max(0.0, next_send - loop.time()))
+            finally:
+                self.elapsed = loop.time() - start
+                receiver.cancel()
+
+
+class SimulatedViewer:
+    """A web client selecting one camera, or following several over one connection, and timing the frames it receives"""
+
+    def __init__(self, url, camera, latency_every=1, tier=None, grid=None):
+        self.url = url
+        self.camera = camera  # SimulatedCamera whose send times tag the frames
+        self.tier = tier  # Quality tier to subscribe to, the server default when None
+        # SimulatedCameras followed over one multiplexed connection, whose frames arrive tagged
+        self.grid = {grid_camera.camera_id: grid_camera for grid_camera in grid} if grid else None
+        self.latency_every = max(1, latency_every)  # Decode the tag of every Nth frame only
+        self.frames_received = 0
+        self.bytes_received = 0
+        self.unmatched = 0  # Frames whose tag could not be read
+        self.latencies = []  # Seconds from camera send to viewer receive
+        self.messages = {}  # Count of JSON messages by type
+        self.seq_start = dict.fromkeys(self.followed(), 0)  # camera_id -> camera seq when frames started counting
+        self.seq_end = dict.fromkeys(self.followed(), 0)
+
+    @property
+    def frames_expected(self):
+        return sum(max(0, self.seq_end[camera_id] - start) for camera_id, start in self.seq_start.items())
+
+    def followed(self):
+        return self.grid if self.grid is not None else {self.camera.camera_id: self.camera}
+
+    def subscription(self):
+        if self.grid is not None:
+            options = {"tier": self.tier} if self.tier is not None else {}
+            return {"type": "web", "action": "subscribe", "cameras": {camera_id: options for camera_id in self.grid}}
+        selection = {
+            "type": "web",
+            "action": "select_camera",
+            "camera_id": self.camera.camera_id
+        }
+        if self.tier is not None:
+            selection["tier"] = self.tier
+        return selection
+
+    async def run(self, duration):
+        async with websockets.connect(self.url, max_size=None) as websocket:
+            await websocket.send(json.dumps({"message": "init"}))
+            await websocket.send(json.dumps(self.subscription()))
+            confirmation = 'subscribed' if self.grid is not None else 'camera_selected'
+            selected = False
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + duration
+            while loop.time() < deadline:
+                try:
+                    message = await asyncio.wait_for(websocket.recv(), timeout=max(0.01, deadline - loop.time()))
+                except asyncio.TimeoutError:
+                    break
+                received = time.time()
+                if isinstance(message, bytes):
+                    if not selected:
+                        continue  # Frames queued before the selection was confirmed are not counted
+                    self.frames_received += 1
+                    self.bytes_received += len(message)
+                    camera = self.camera
+                    if self.grid is not None:
+                        camera_id, _, _, message = unpack_tag(message)
+                        camera = self.grid.get(camera_id)
+                    if self.frames_received % self.latency_every == 0:
+                        code = read_tag(message, TIER_FACTORS.get(self.tier, 1)) if camera is not None else None
+                        if code is None:
+                            self.unmatched += 1
+                        else:
+                            self.latencies.append(received - camera.sent_times[code])
+                else:
+                    data = json.loads(message)
+                    message_type = data.get('type', 'unknown')
+                    self.messages[message_type] = self.messages.get(message_type, 0) + 1
+                    if data.get('message') == confirmation and not selected:
+                        selected = True
+                        self.seq_start = {camera_id: camera.seq for camera_id, camera in self.followed().items()}
+            self.seq_end = {camera_id: camera.seq for camera_id, camera in self.followed().items()}
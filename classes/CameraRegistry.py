@@ -0,0 +1,155 @@
+# file: classes/CameraRegistry.py
+import threading
+
+from classes.FrameMailbox import FrameMailbox
+from classes.FrameRing import FrameRing
+
+
+class CameraSession:
+    """All per-camera state: connection, frame mailbox, processing thread, frame ring, stats and detector"""
+    __slots__ = (
+        'camera_id', 'websocket', 'mailbox', 'thread', 'stop', 'lock',
+        'detector', 'fps', 'last_motion_boxes', 'last_detection', 'ring', 'ring_slots', 'ring_slot_size'
+    )
+
+    def __init__(self, camera_id, frame_queue_depth=1, ring_slots=32, ring_slot_size=384 * 1024):
+        self.camera_id = camera_id
+        self.websocket = None  # Camera connection, None while disconnected
+        self.mailbox = FrameMailbox(frame_queue_depth)  # Latest-frame-wins hand-off to the processing thread
+        self.thread = None  # Processing thread
+        self.stop = False  # Stop flag checked by the processing thread
+        self.lock = threading.Lock()  # Guards starting and stopping the processing thread
+        self.detector = None  # Motion detector state for the threaded backend
+        self.fps = 0.0
+        self.last_motion_boxes = []  # Last boxes sent to viewers in pass-through mode
+        self.last_detection = None  # (boxes, width, height) of the last frame run through detection
+        self.ring = None  # FrameRing holding the camera's encoded frames, created by its processing thread
+        self.ring_slots = ring_slots
+        self.ring_slot_size = ring_slot_size  # Largest slot size, rings for lower resolutions use less
+
+    @property
+    def connected(self):
+        return self.websocket is not None
+
+    def is_processing(self):
+        """Return True while the processing thread is alive"""
+        thread = self.thread
+        return thread is not None and thread.is_alive()
+
+    def frame_ring(self, slot_size=None):
+        """Return the camera's frame ring, reused across quick reconnects unless its slot size changed"""
+        slot_size = min(slot_size or self.ring_slot_size, self.ring_slot_size)
+        if self.ring is not None and self.ring.slot_size != slot_size:
+            self.close_ring()  # Resolution changed since the ring was sized
+        if self.ring is None:
+            self.ring = FrameRing(self.ring_slots, slot_size)
+        return self.ring
+
+    def close_ring(self):
+        """Free the frame ring once nothing can read or write it any more"""
+        ring, self.ring = self.ring, None
+        if ring is not None:
+            ring.close()
+
+    def start_processing(self, target):
+        """Start the processing thread if it is not already running, returning True if started.
+
+        A thread still winding down after stop_processing counts as running, so a quick reconnect
+        never puts a second thread on the same mailbox, ring and detector; the next frame retries.
+        """
+        with self.lock:
+            if self.is_processing():
+                return False
+            self.stop = False
+            self.mailbox.reopen()
+            self.thread = threading.Thread(target=target, args=(self.camera_id,), daemon=True)
+            self.thread.start()
+            return True
+
+    def stop_processing(self, timeout=1.0):
+        """Stop the processing thread and discard pending frames"""
+        with self.lock:
+            self.stop = True
+            # Discard pending frames and wake the processing thread
+            self.mailbox.close()
+            thread = self.thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout=timeout)
+        with self.lock:
+            # A thread stuck past the timeout stays referenced until it exits
+            if self.thread is thread and (thread is None or not thread.is_alive()):
+                self.thread = None
+        return thread is not None
+
+
+class CameraRegistry:
+    """Camera sessions indexed by camera id and by websocket for constant-time lookups"""
+
+    def __init__(self, frame_queue_depth=1, ring_slots=32, ring_slot_size=384 * 1024):
+        self.frame_queue_depth = frame_queue_depth
+        self.ring_slots = ring_slots  # Slots of each camera's frame ring
+        self.ring_slot_size = ring_slot_size  # Bytes per slot, larger frames bypass the ring
+        self.sessions = {}  # camera_id -> CameraSession
+        self.by_websocket = {}  # websocket -> CameraSession
+        self.lock = threading.Lock()
+
+    def __contains__(self, camera_id):
+        return camera_id in self.sessions
+
+    def __len__(self):
+        return len(self.sessions)
+
+    def get(self, camera_id):
+        """Get the session for a camera, or None"""
+        return self.sessions.get(camera_id)
+
+    def session(self, camera_id):
+        """Get the session for a camera, creating it if needed"""
+        session = self.sessions.get(camera_id)
+        if session is None:
+            with self.lock:
+                session = self.sessions.get(camera_id)
+                if session is None:
+                    session = self.sessions[camera_id] = CameraSession(camera_id, self.frame_queue_depth,
+                                                                       self.ring_slots, self.ring_slot_size)
+        return session
+
+    def for_websocket(self, websocket):
+        """Get the session of a camera connection, or None for web clients"""
+        return self.by_websocket.get(websocket)
+
+    def websocket(self, camera_id):
+        """Get the connection of a connected camera, or None"""
+        session = self.sessions.get(camera_id)
+        return session.websocket if session is not None else None
+
+    def attach(self, camera_id, websocket):
+        """Bind a camera connection to its session, replacing any previous connection"""
+        session = self.session(camera_id)
+        with self.lock:
+            if session.websocket is not None:
+                self.by_websocket.pop(session.websocket, None)
+            session.websocket = websocket
+            self.by_websocket[websocket] = session
+            session.mailbox.clear()
+        return session
+
+    def detach(self, websocket):
+        """Unbind a camera connection in one step, returning its session or None"""
+        with self.lock:
+            session = self.by_websocket.pop(websocket, None)
+            if session is not None and session.websocket is websocket:
+                session.websocket = None
+        return session
+
+    def connected(self):
+        """Return the sessions of all connected cameras"""
+        return [session for session in list(self.sessions.values()) if session.websocket is not None]
+
+    def clear(self):
+        """Remove every session, returning them so the caller can stop their threads"""
+        with self.lock:
+            sessions = list(self.sessions.values())
+            self.sessions.clear()
+            self.by_websocket.clear()
+        return sessions
@@ -0,0 +1,61 @@
+# file: classes/CameraThrottle.py
+import time
+
+# Milliseconds between frames the firmware uses unless told otherwise (20 fps)
+DEFAULT_FRAME_INTERVAL = 50
+
+# Settings pushed to a camera nobody needs: smallest supported resolution, strong compression, 2 fps
+LOW_POWER_PROFILE = {
+    'resolution': 'VGA',
+    'quality': 40,
+    'frame_interval': 500
+}
+
+
+class CameraThrottle:
+    """Demand tracking that moves cameras between their own settings and a low-power profile.
+
+    A camera is restored as soon as demand returns, but throttled only after it has had no demand
+    for `idle_delay` seconds, so a viewer flicking between cameras never makes them flap.
+    """
+
+    def __init__(self, profile=None, idle_delay=30.0, clock=time.monotonic):
+        self.profile = dict(profile if profile is not None else LOW_POWER_PROFILE)
+        self.idle_delay = idle_delay
+        self.clock = clock
+        self.throttled = set()  # Cameras currently running the low-power profile
+        self.idle_since = {}  # camera_id -> clock time demand was last seen
+        self.changes = 0  # Commands issued, for metrics
+
+    def update(self, camera_id, demand):
+        """Record a camera's demand, returning 'throttle' or 'restore' when a command is due, else None"""
+        now = self.clock()
+        if demand:
+            self.idle_since[camera_id] = now
+        idle_since = self.idle_since.setdefault(camera_id, now)
+        if camera_id in self.throttled:
+            if not demand:
+                return None
+            self.throttled.discard(camera_id)
+            action = 'restore'
+        else:
+            if demand or now - idle_since < self.idle_delay:
+                return None
+            self.throttled.add(camera_id)
+            action = 'throttle'
+        self.changes += 1
+        return action
+
+    def is_throttled(self, camera_id):
+        return camera_id in self.throttled
+
+    def settings_for(self, camera_id, settings):
+        """Settings the camera is running: the low-power profile over its own while throttled"""
+        if camera_id in self.throttled:
+            return {**settings, **self.profile}
+        return settings
+
+    def forget(self, camera_id):
+        """Drop the state of a disconnected camera, it starts over with its own settings on reconnect"""
+        self.throttled.discard(camera_id)
+        self.idle_since.pop(camera_id, None)
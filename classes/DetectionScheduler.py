@@ -0,0 +1,127 @@
+# file: classes/DetectionScheduler.py
+import threading
+import time
+
+MAX_DEGRADE_LEVEL = 3  # Each level doubles a camera's detection stride
+RECOVER_MARGIN = 0.9  # Share of the budget a recovering camera's doubled cost must fit in, so levels do not flap
+
+
+class CameraSchedule:
+    """Detection schedule state of one camera"""
+    __slots__ = ('priority', 'active_until', 'level', 'countdown', 'detected', 'skipped', 'cost', 'usage')
+
+    def __init__(self):
+        self.priority = 0  # Higher priorities are degraded last
+        self.active_until = 0.0  # Clock time at which an active camera falls back to idle
+        self.level = 0  # Degradation level applied while the CPU budget is exceeded
+        self.countdown = 0  # Frames to skip before the next detection
+        self.detected = 0
+        self.skipped = 0
+        self.cost = 0.0  # Detection seconds spent in the current budget window
+        self.usage = 0.0  # Cores used by this camera's detection over the last window
+
+
+class DetectionScheduler:
+    """Decides which frames of each camera go through motion detection.
+
+    A quiet camera is only checked every `idle_stride` frames. Any motion switches it to every
+    frame until `active_hold` seconds after the last detection. When the detection work of all
+    cameras exceeds `cpu_budget` cores, the lowest-priority cameras get their stride doubled one
+    level at a time. They recover highest priority first, once doubling that camera's detection
+    rate would still fit in the budget.
+    """
+
+    def __init__(self, idle_stride=5, active_hold=10.0, cpu_budget=None, window=1.0, clock=time.monotonic):
+        self.idle_stride = max(1, int(idle_stride))
+        self.active_hold = active_hold
+        self.cpu_budget = cpu_budget  # Cores available for detection, None for no limit
+        self.window = window  # Seconds between budget checks
+        self.clock = clock
+        self.cameras = {}
+        self.lock = threading.Lock()
+        self.window_start = clock()
+        self.usage = 0.0  # Cores used by detection over the last window
+
+    def camera(self, camera_id):
+        schedule = self.cameras.get(camera_id)
+        if schedule is None:
+            with self.lock:
+                schedule = self.cameras.setdefault(camera_id, CameraSchedule())
+        return schedule
+
+    def is_active(self, schedule, now=None):
+        return (now if now is not None else self.clock()) < schedule.active_until
+
+    def stride(self, schedule, now=None):
+        """Frames per detection for a camera in its current mode and degradation level"""
+        base = 1 if self.is_active(schedule, now) else self.idle_stride
+        return base << schedule.level
+
+    def should_detect(self, camera_id, priority=0):
+        """Called for every frame a camera processes, True when this one should be run through detection"""
+        schedule = self.camera(camera_id)
+        schedule.priority = priority
+        if schedule.countdown > 0:
+            schedule.countdown -= 1
+            schedule.skipped += 1
+            return False
+        schedule.countdown = self.stride(schedule) - 1
+        schedule.detected += 1
+        return True
+
+    def record(self, camera_id, motion, cost):
+        """Report the outcome and cost in seconds of a detection run"""
+        schedule = self.camera(camera_id)
+        now = self.clock()
+        if motion:
+            if not self.is_active(schedule, now):
+                schedule.countdown = 0  # Go to full rate from the very next frame
+            schedule.active_until = now + self.active_hold
+        schedule.cost += cost
+        if now - self.window_start >= self.window:
+            self.rebalance(now)
+
+    def rebalance(self, now):
+        """Move one camera one degradation level towards the CPU budget"""
+        with self.lock:
+            elapsed = now - self.window_start
+            if elapsed < self.window:
+                return  # Another camera's thread just rebalanced
+            schedules = list(self.cameras.values())
+            for schedule in schedules:
+                schedule.usage = schedule.cost / elapsed
+                schedule.cost = 0.0
+            self.usage = sum(schedule.usage for schedule in schedules)
+            self.window_start = now
+            if self.cpu_budget is None:
+                return
+            if self.usage > self.cpu_budget:
+                candidates = [schedule for schedule in schedules if schedule.level < MAX_DEGRADE_LEVEL]
+                if candidates:
+                    min(candidates, key=lambda schedule: (schedule.priority, schedule.level)).level += 1
+            else:
+                candidates = [schedule for schedule in schedules if schedule.level > 0]
+                if candidates:
+                    schedule = max(candidates, key=lambda schedule: (schedule.priority, -schedule.level))
+                    # Halving the stride roughly doubles the camera's detection cost
+                    if self.usage + schedule.usage <= self.cpu_budget * RECOVER_MARGIN:
+                        schedule.level -= 1
+
+    def remove(self, camera_id):
+        with self.lock:
+            self.cameras.pop(camera_id, None)
+
+    def status(self, camera_id):
+        """Mode, stride and counters of a camera, for the status channel and metrics"""
+        schedule = self.cameras.get(camera_id)
+        if schedule is None:
+            return None
+        active = self.is_active(schedule)
+        return {
+            'mode': 'active' if active else 'idle',
+            'stride': self.stride(schedule),
+            'degraded': schedule.level,
+            'priority': schedule.priority,
+            'detected': schedule.detected,
+            'skipped': schedule.skipped
+        }
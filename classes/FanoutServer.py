@@ -0,0 +1,192 @@
+# file: classes/FanoutServer.py
+import asyncio
+import json
+import logging
+import os
+import time
+
+import websockets
+
+from classes.FrameBus import CONTROL, FRAME, pack_control, read_message
+from classes.FramePipeline import DEFAULT_TIER
+from classes.ViewerChannel import ViewerChannel
+from classes.ViewerSubscriptions import Subscription
+
+logger = logging.getLogger(__name__)
+
+
+class FanoutServer:
+    """Viewer-facing process of the split deployment.
+
+    Owns the web client websockets and serves them frames and status received over the frame bus.
+    Their messages are relayed to the ingest process, which answers them as in the single-process
+    deployment. Several fan-out processes can listen on the same port, the kernel spreads viewers
+    across them.
+    """
+
+    def __init__(self, bus_path, host='0.0.0.0', port=5001, name=None, viewer_queue_size=2, viewer_max_lag=2.0,
+                 slow_viewer_policy='skip', reconnect_delay=1.0):
+        self.bus_path = bus_path
+        self.host = host
+        self.port = port
+        self.name = name or f'fanout-{os.getpid()}'
+        self.viewer_queue_size = viewer_queue_size
+        self.viewer_max_lag = viewer_max_lag
+        self.slow_viewer_policy = slow_viewer_policy
+        self.reconnect_delay = reconnect_delay  # Seconds between attempts to reach the ingest process
+        self.viewers = {}  # viewer id -> websocket
+        self.channels = {}  # viewer id -> ViewerChannel
+        self.selected = {}  # viewer id -> camera_id confirmed by the ingest process, None before any selection
+        self.tiers = {}  # viewer id -> quality tier confirmed by the ingest process
+        self.subscriptions = {}  # viewer id -> {camera_id: Subscription} confirmed by the ingest process
+        self.next_viewer_id = 0
+        self.writer = None  # Bus connection to the ingest process, None while it is unreachable
+
+    def send_bus(self, message):
+        if self.writer is not None and not self.writer.is_closing():
+            self.writer.write(pack_control(message))
+
+    async def handler(self, websocket, path=None):
+        """Serve one web client, relaying its messages to the ingest process"""
+        try:
+            message = await websocket.recv()
+        except websockets.exceptions.ConnectionClosed:
+            return
+        if isinstance(message, str) and '"camera"' in message:
+            try:
+                if json.loads(message).get('type') == 'camera':
+                    logger.warning("[-] Camera tried to connect to fan-out process %s", self.name)
+                    await websocket.close(code=1008, reason='Cameras connect to the ingest port')
+                    return
+            except json.JSONDecodeError:
+                pass
+        if self.writer is None:
+            await websocket.close(code=1013, reason='Hub unavailable')
+            return
+
+        viewer_id = self.next_viewer_id
+        self.next_viewer_id += 1
+        channel = ViewerChannel(websocket, max_frames=self.viewer_queue_size, max_lag=self.viewer_max_lag,
+                                policy=self.slow_viewer_policy)
+        self.viewers[viewer_id] = websocket
+        self.channels[viewer_id] = channel
+        self.selected[viewer_id] = None
+        channel.start()
+        self.send_bus({'op': 'join', 'viewer': viewer_id, 'address': str(websocket.remote_address)})
+        try:
+            async for message in websocket:
+                if isinstance(message, str):
+                    self.send_bus({'op': 'message', 'viewer': viewer_id, 'data': message})
+        except websockets.exceptions.ConnectionClosed:
+            pass
+        finally:
+            self.drop_viewer(viewer_id)
+            self.send_bus({'op': 'leave', 'viewer': viewer_id})
+
+    def drop_viewer(self, viewer_id):
+        self.viewers.pop(viewer_id, None)
+        self.selected.pop(viewer_id, None)
+        self.tiers.pop(viewer_id, None)
+        self.subscriptions.pop(viewer_id, None)
+        channel = self.channels.pop(viewer_id, None)
+        if channel is not None:
+            channel.close()
+
+    def deliver_frame(self, meta, data):
+        """Queue a frame for the local viewers of its camera and tier, tagged for multiplexed viewers"""
+        camera_id = meta['camera']
+        tier = meta['tier']
+        motion_message = meta.get('motion')
+        jpeg = data[meta.get('tag', 0):]
+        now = time.monotonic()
+        for viewer_id, channel in list(self.channels.items()):
+            subscriptions = self.subscriptions.get(viewer_id)
+            if subscriptions is not None:
+                subscription = subscriptions.get(camera_id)
+                if subscription is None or subscription.tier != tier or not subscription.due(now):
+                    continue
+                frame = data
+            else:
+                selected = self.selected.get(viewer_id)
+                if selected != camera_id or self.tiers.get(viewer_id, DEFAULT_TIER) != tier:
+                    continue
+                frame = jpeg
+            channel.send_frame(*((motion_message, frame) if motion_message is not None else (frame,)))
+
+    def deliver_control(self, viewer_ids, message):
+        """Queue a control message for local viewers, noting the selections the ingest process confirmed"""
+        if 'camera_selected' in message or 'tier_selected' in message or '"subscribed"' in message:
+            data = json.loads(message)
+            for viewer_id in viewer_ids:
+                if data.get('message') == 'camera_selected':
+                    self.selected[viewer_id] = data.get('camera_id')
+                if data.get('message') in ('camera_selected', 'tier_selected'):
+                    self.tiers[viewer_id] = data.get('tier', DEFAULT_TIER)
+                if data.get('message') == 'subscribed':
+                    cameras = data.get('cameras')
+                    if cameras is None:
+                        self.subscriptions.pop(viewer_id, None)
+                    else:
+                        self.subscriptions[viewer_id] = {
+                            camera_id: Subscription(options.get('tier'), options.get('max_fps'))
+                            for camera_id, options in cameras.items()
+                        }
+                    channel = self.channels.get(viewer_id)
+                    if channel is not None:
+                        channel.set_streams(len(cameras) if cameras is not None else 1)
+        for viewer_id in viewer_ids:
+            channel = self.channels.get(viewer_id)
+            if channel is not None:
+                channel.send(message)
+
+    async def read_bus(self, reader):
+        while True:
+            kind, message = await read_message(reader)
+            if kind == FRAME:
+                self.deliver_frame(*message)
+            elif kind == CONTROL and message.get('op') == 'send':
+                self.deliver_control(message.get('viewers', []), message.get('data'))
+
+    async def serve(self):
+        async with websockets.serve(
+            self.handler,
+            self.host,
+            self.port,
+            reuse_port=True,  # Every fan-out process listens on the same port
+            ping_interval=30,
+            ping_timeout=20,
+            close_timeout=20,
+            max_size=10_000_000,
+            compression=None,
+            max_queue=32,
+            read_limit=2**16,
+            write_limit=2**16
+        ):
+            logger.info("[+] Fan-out process %s serving viewers on ws://%s:%s", self.name, self.host, self.port)
+            while True:
+                try:
+                    reader, writer = await asyncio.open_unix_connection(self.bus_path)
+                except OSError:
+                    await asyncio.sleep(self.reconnect_delay)
+                    continue
+                self.writer = writer
+                self.send_bus({'op': 'hello', 'role': 'fanout', 'name': self.name})
+                logger.info("[+] Fan-out process %s connected to the frame bus", self.name)
+                try:
+                    await self.read_bus(reader)
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    logger.warning("[-] Fan-out process %s lost the frame bus, disconnecting viewers", self.name)
+                finally:
+                    self.writer = None
+                    writer.close()
+                    # Viewers reconnect and register again once the ingest process is back
+                    for websocket in list(self.viewers.values()):
+                        await websocket.close(code=1012, reason='Hub restarting')
+                await asyncio.sleep(self.reconnect_delay)
+
+    def run(self):
+        """Run the fan-out process until interrupted"""
+        try:
+            asyncio.run(self.serve())
+        except KeyboardInterrupt:
+            logger.info("[+] Shutting down fan-out process %s", self.name)
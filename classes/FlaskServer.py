@@ -1,17 +1,166 @@
 # file: classes/FlaskServer.py
-from flask import Flask, render_template, request, redirect, url_for
+from datetime import datetime, timezone
+
+from flask import Flask, Response, abort, render_template, request, redirect, url_for, jsonify
+
+from classes.MotionEventStore import MAX_PAGE_SIZE
 
 # Initialize Flask app
-app = Flask(__name__, 
+app = Flask(__name__,
             static_folder='../static',
             template_folder='../templates')
+app.config['EVENT_STORE'] = None  # MotionEventStore shared with the WebSocket server
+app.config['FRAME_BUFFER'] = None  # LatestFrameBuffer published by the WebSocket server's processing threads
+app.config['METRICS'] = None  # Metrics recorded by the WebSocket server's frame pipeline
+app.config['PROFILER'] = None  # PipelineProfiler bound to the WebSocket server's processing threads
+app.config['THUMBNAILS'] = None  # ThumbnailCache of camera previews refreshed by the WebSocket server
+app.config['WS_PORT'] = 5000  # Port the web UI opens its WebSocket on
+
+# Seconds a stream waits for a new frame before checking the camera is still connected
+STREAM_WAIT_TIMEOUT = 5.0
+
+
+def parse_time(value):
+    """Parse a query time given as epoch seconds or ISO 8601, returning epoch seconds or None"""
+    if value is None or value == '':
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+
+def query_events(camera_id=None):
+    """Run an event query from the request's start, end, limit and cursor arguments"""
+    store = app.config['EVENT_STORE']
+    if store is None:
+        return jsonify({'error': 'Motion event storage is disabled'}), 503
+    try:
+        start = parse_time(request.args.get('start'))
+        end = parse_time(request.args.get('end'))
+        limit = int(request.args.get('limit', 100))
+        cursor = request.args.get('cursor')
+        events, next_cursor = store.query(camera_id=camera_id, start=start, end=end, limit=limit, cursor=cursor)
+    except ValueError as e:
+        return jsonify({'error': f'Invalid query: {e}'}), 400
+    return jsonify({'events': events, 'next_cursor': next_cursor, 'max_limit': MAX_PAGE_SIZE})
+
+
+def latest_frame_or_404(camera_id):
+    """Latest published frame of a camera, aborting with 404 when there is none"""
+    frame_buffer = app.config['FRAME_BUFFER']
+    frame = frame_buffer.latest(camera_id) if frame_buffer is not None else None
+    if frame is None:
+        abort(404)
+    return frame_buffer, frame
+
+
+def mjpeg_stream(frame_buffer, camera_id, frame):
+    """Yield multipart parts of every newly published frame until the camera disconnects"""
+    while frame is not None:
+        yield (b'--frame\r\nContent-Type: image/jpeg\r\nContent-Length: ' + str(len(frame.data)).encode() +
+               b'\r\n\r\n' + frame.data + b'\r\n')
+        seq = frame.seq
+        frame = None
+        while frame is None:
+            frame = frame_buffer.wait(camera_id, seq, timeout=STREAM_WAIT_TIMEOUT)
+            if frame is None and frame_buffer.latest(camera_id) is None:
+                return  # Camera disconnected
 
 # Routes
 @app.route('/')
 def index():
     """Serve the main page"""
-    return render_template('index.html')
+    return render_template('index.html', ws_port=app.config['WS_PORT'])
+
+@app.route('/api/events')
+def events():
+    """Motion events of all cameras, newest first, optionally filtered by camera_id"""
+    return query_events(request.args.get('camera_id') or None)
+
+@app.route('/api/cameras/<camera_id>/events')
+def camera_events(camera_id):
+    """Motion events of one camera, newest first"""
+    return query_events(camera_id)
+
+@app.route('/snapshot/<camera_id>')
+def snapshot(camera_id):
+    """Latest frame of a camera as a JPEG, answering 304 when the client already has it"""
+    _, frame = latest_frame_or_404(camera_id)
+    response = Response(frame.data, mimetype='image/jpeg')
+    response.set_etag(frame.etag)
+    response.last_modified = datetime.fromtimestamp(int(frame.timestamp), tz=timezone.utc)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
+@app.route('/thumbnail/<camera_id>')
+def thumbnail(camera_id):
+    """Low-rate preview of a camera as a JPEG, answering 304 when the client already has it"""
+    thumbnails = app.config['THUMBNAILS']
+    preview = thumbnails.get(camera_id) if thumbnails is not None else None
+    if preview is None:
+        abort(404)
+    response = Response(preview.data, mimetype='image/jpeg')
+    response.set_etag(preview.etag)
+    response.last_modified = datetime.fromtimestamp(int(preview.timestamp), tz=timezone.utc)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
+@app.route('/stream/<camera_id>')
+def stream(camera_id):
+    """Live MJPEG stream of a camera, sending each published frame as it arrives"""
+    frame_buffer, frame = latest_frame_or_404(camera_id)
+    response = Response(mjpeg_stream(frame_buffer, camera_id, frame),
+                        mimetype='multipart/x-mixed-replace; boundary=frame')
+    response.headers['Cache-Control'] = 'no-cache, no-store'
+    return response
+
+@app.route('/metrics')
+def metrics():
+    """Frame pipeline metrics in the Prometheus text format"""
+    pipeline_metrics = app.config['METRICS']
+    if pipeline_metrics is None:
+        abort(404)
+    return Response(pipeline_metrics.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/profile/<camera_id>', methods=['POST'])
+def start_profile(camera_id):
+    """Start profiling a camera's pipeline; mode, duration and interval come from the query string"""
+    profiler = app.config['PROFILER']
+    if profiler is None or profiler.thread_for(camera_id) is None:
+        abort(404)
+    try:
+        run = profiler.start(camera_id,
+                             mode=request.args.get('mode', 'sample'),
+                             duration=request.args.get('duration', 10.0),
+                             interval=request.args.get('interval', 0.005))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except RuntimeError as e:
+        return jsonify({'error': str(e)}), 409
+    return jsonify(run.status()), 202
+
+@app.route('/profile/<camera_id>')
+def profile_report(camera_id):
+    """Download the camera's latest profile report, or its status while it is still running"""
+    profiler = app.config['PROFILER']
+    status = profiler.status(camera_id) if profiler is not None else None
+    if status is None:
+        abort(404)
+    if not status['done']:
+        return jsonify(status), 202
+    response = Response(profiler.report(camera_id), mimetype='text/plain')
+    started = datetime.fromtimestamp(status['started']).strftime('%Y%m%d-%H%M%S')
+    response.headers['Content-Disposition'] = f'attachment; filename="profile-{started}-{status["mode"]}.txt"'
+    return response
 
-def run(host='0.0.0.0', port=4242):
+def run(host='0.0.0.0', port=4242, event_store=None, frame_buffer=None, metrics=None, profiler=None, ws_port=5000,
+        thumbnails=None):
     """Run the Flask server"""
-    app.run(host=host, port=port, debug=False, threaded=True)
\ No newline at end of file
+    app.config['WS_PORT'] = ws_port
+    app.config['EVENT_STORE'] = event_store
+    app.config['FRAME_BUFFER'] = frame_buffer
+    app.config['METRICS'] = metrics
+    app.config['PROFILER'] = profiler
+    app.config['THUMBNAILS'] = thumbnails
+    app.run(host=host, port=port, debug=False, threaded=True)
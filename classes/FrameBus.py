@@ -0,0 +1,337 @@
+# file: classes/FrameBus.py
+import asyncio
+import json
+import logging
+import os
+import struct
+import threading
+import time
+
+from classes.FramePipeline import DEFAULT_TIER
+from classes.FrameRing import FrameRef, tag_frame
+
+logger = logging.getLogger(__name__)
+
+# Every bus message is a kind byte and a body length, followed by the body
+HEADER = struct.Struct('!BI')
+FRAME_META = struct.Struct('!H')  # Length of a frame's JSON metadata, which precedes the JPEG bytes
+CONTROL = 0  # JSON object with an 'op' key
+# JSON metadata (camera, tier, time, tag length, optional motion message or thumbnail flag), the frame tag and the JPEG
+FRAME = 1
+
+
+def pack_control(message):
+    body = json.dumps(message).encode()
+    return HEADER.pack(CONTROL, len(body)) + body
+
+
+def pack_frame(meta, *chunks):
+    """Return the frame message as (header, *chunks) so the tag and JPEG are written without being copied"""
+    meta_bytes = json.dumps(meta).encode()
+    header = HEADER.pack(FRAME, FRAME_META.size + len(meta_bytes) + sum(len(chunk) for chunk in chunks))
+    return (header + FRAME_META.pack(len(meta_bytes)) + meta_bytes,) + chunks
+
+
+async def read_message(reader):
+    """Read one message, returning (CONTROL, dict) or (FRAME, (meta, memoryview of the tagged frame))"""
+    kind, length = HEADER.unpack(await reader.readexactly(HEADER.size))
+    body = await reader.readexactly(length)
+    if kind == CONTROL:
+        return kind, json.loads(body)
+    meta_length, = FRAME_META.unpack_from(body)
+    end = FRAME_META.size + meta_length
+    return kind, (json.loads(body[FRAME_META.size:end]), memoryview(body)[end:])
+
+
+class RemoteViewer:
+    """Stand-in for the websocket of a web client connected to a fan-out process"""
+
+    def __init__(self, link, viewer_id, remote_address=None):
+        self.link = link
+        self.viewer_id = viewer_id
+        self.remote_address = remote_address
+
+
+class RemoteViewerChannel:
+    """Stand-in for the ViewerChannel of a remote viewer, relaying control messages over its bus link"""
+
+    def __init__(self, link, viewer_id):
+        self.link = link
+        self.viewer_id = viewer_id
+
+    def start(self):
+        pass
+
+    def send(self, message, key=None):
+        self.link.send_to_viewer(self.viewer_id, message)
+
+    def set_streams(self, count):
+        pass  # Sized by the fan-out process, which owns the real channel
+
+    def send_frame(self, *messages):
+        return False  # Frames cross the bus once per camera and tier, see BusLink.publish_frame
+
+    def close(self):
+        pass
+
+    def stats(self):
+        return {'fanout': self.link.name}
+
+
+class BusLink:
+    """One fan-out or HTTP process connected to the ingest process"""
+
+    def __init__(self, bus, writer):
+        self.bus = bus
+        self.writer = writer
+        self.role = None  # 'fanout' or 'http', from the process's hello
+        self.name = None
+        self.viewers = {}  # viewer id -> RemoteViewer registered with the WSServer
+        self.pending = {}  # id(message) -> (message, viewer ids) relayed once per event loop iteration
+        self.frames_sent = 0
+        self.frames_dropped = 0
+
+    async def handle(self, message):
+        server = self.bus.server
+        op = message.get('op')
+        if op == 'hello':
+            self.role = message.get('role')
+            self.name = message.get('name') or self.role
+            self.bus.refresh_roles()
+            logger.info("[+] %s process %s joined the frame bus", self.role, self.name)
+        elif op == 'join':
+            viewer_id = message.get('viewer')
+            viewer = RemoteViewer(self, viewer_id, message.get('address'))
+            self.viewers[viewer_id] = viewer
+            server.add_web_client(viewer, RemoteViewerChannel(self, viewer_id))
+            logger.info("[+] Web client connected through %s", self.name)
+        elif op == 'message':
+            viewer = self.viewers.get(message.get('viewer'))
+            if viewer is not None:
+                await server.handle_message(viewer, message.get('data'))
+        elif op == 'leave':
+            viewer = self.viewers.pop(message.get('viewer'), None)
+            if viewer is not None:
+                await server.unregister(viewer)
+        elif op == 'demand':
+            # Cameras the HTTP process served recently keep their own settings, see WSServer.camera_demand
+            now = time.monotonic()
+            for camera_id in message.get('cameras', []):
+                server.remote_demand[camera_id] = now
+
+    def send_control(self, message):
+        if not self.writer.is_closing():
+            self.writer.write(pack_control(message))
+
+    def send_to_viewer(self, viewer_id, message):
+        """Queue a control message for a remote viewer, a broadcast crosses the bus once for all of them"""
+        entry = self.pending.get(id(message))
+        if entry is None:
+            if not self.pending:
+                asyncio.get_running_loop().call_soon(self.flush_pending)
+            self.pending[id(message)] = (message, [viewer_id])
+        else:
+            entry[1].append(viewer_id)
+
+    def flush_pending(self):
+        pending, self.pending = self.pending, {}
+        for message, viewer_ids in pending.values():
+            self.send_control({'op': 'send', 'viewers': viewer_ids, 'data': message})
+
+    def publish_frame(self, camera_id, frames, motion_message, timestamp, tag):
+        """Send each tier of the frame this process's viewers watch, once, dropping frames while it lags"""
+        if self.role == 'http':
+            tiers = {DEFAULT_TIER}
+        else:
+            server = self.bus.server
+            tiers = {server.viewer_frame_tier(viewer, camera_id) for viewer in self.viewers.values()}
+            tiers.discard(None)
+        if not tiers or self.writer.is_closing():
+            return
+        if self.writer.transport.get_write_buffer_size() > self.bus.max_buffer:
+            self.frames_dropped += len(tiers)
+            return
+        for tier in tiers:
+            data = frames.get(tier) or frames.get(DEFAULT_TIER) or next(iter(frames.values()))
+            # Fan-out processes send the tagged frame to multiplexed viewers and the JPEG after the tag to the others
+            meta = {'camera': camera_id, 'tier': tier, 'time': timestamp, 'tag': len(tag)}
+            if motion_message is not None and self.role != 'http':
+                meta['motion'] = motion_message
+            if isinstance(data, FrameRef):
+                # The transport may hold on to what it could not write yet, long after the ring moved on
+                data = tag_frame(data, tag).tobytes()
+                if data is None:
+                    self.frames_dropped += 1
+                    continue
+                self.writer.writelines(pack_frame(meta, data))
+            else:
+                self.writer.writelines(pack_frame(meta, tag, data))
+            self.frames_sent += 1
+
+    def publish_thumbnail(self, camera_id, thumbnail):
+        """Send a camera's refreshed preview to an HTTP process for its /thumbnail route"""
+        if self.role != 'http' or self.writer.is_closing():
+            return
+        meta = {'camera': camera_id, 'tier': 'thumb', 'time': thumbnail.timestamp, 'tag': 0, 'thumbnail': True}
+        self.writer.writelines(pack_frame(meta, thumbnail.data))
+
+    async def close(self):
+        """Unregister the link's viewers after its process went away"""
+        for viewer in list(self.viewers.values()):
+            await self.bus.server.unregister(viewer)
+        self.viewers.clear()
+        self.writer.close()
+
+
+class BusServer:
+    """Ingest side of the frame bus, a Unix domain socket fan-out and HTTP processes connect to.
+
+    Frames cross the bus once per camera and tier however many viewers a process serves. Viewer
+    messages are run by the WSServer as if the viewer were connected to it, so selection, settings,
+    tiers and throttling behave the same in both deployments.
+    """
+
+    def __init__(self, server, path, max_buffer=4 * 1024 * 1024, metrics_interval=5.0):
+        self.server = server  # WSServer owning the cameras
+        self.path = path
+        self.max_buffer = max_buffer  # Bytes queued to a slow process before its frames are dropped
+        self.metrics_interval = metrics_interval  # Seconds between metrics pushed to HTTP processes
+        self.links = set()
+        self.serves_http = False  # True while an HTTP process needs the full tier of every camera
+        self.listener = None
+        self.task = None
+
+    def refresh_roles(self):
+        # Read by processing threads through WSServer.tiers_for, so replaced rather than computed on demand
+        self.serves_http = any(link.role == 'http' for link in self.links)
+
+    async def start(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)  # Left behind by a previous run
+        self.listener = await asyncio.start_unix_server(self.handle_link, path=self.path)
+        self.task = asyncio.get_running_loop().create_task(self.push_metrics())
+        logger.info("[+] Frame bus listening on %s", self.path)
+
+    async def handle_link(self, reader, writer):
+        link = BusLink(self, writer)
+        self.links.add(link)
+        try:
+            while True:
+                kind, message = await read_message(reader)
+                if kind == CONTROL:
+                    await link.handle(message)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except Exception as e:
+            logger.exception("[-] Error on frame bus link %s: %s", link.name, e)
+        finally:
+            self.links.discard(link)
+            self.refresh_roles()
+            await link.close()
+            logger.info("[-] %s process %s left the frame bus", link.role, link.name)
+
+    def publish_frame(self, camera_id, frames, motion_message=None, tag=b''):
+        timestamp = time.time()
+        for link in list(self.links):
+            link.publish_frame(camera_id, frames, motion_message, timestamp, tag)
+
+    def publish_thumbnail(self, camera_id, thumbnail):
+        for link in list(self.links):
+            link.publish_thumbnail(camera_id, thumbnail)
+
+    def publish(self, message):
+        """Send a control message to every connected process"""
+        for link in list(self.links):
+            link.send_control(message)
+
+    async def push_metrics(self):
+        """Mirror the pipeline metrics to HTTP processes for their /metrics route"""
+        while True:
+            await asyncio.sleep(self.metrics_interval)
+            links = [link for link in list(self.links) if link.role == 'http']
+            if links:
+                message = {'op': 'metrics', 'text': self.server.metrics.render_prometheus()}
+                for link in links:
+                    link.send_control(message)
+
+    def close(self):
+        if self.task is not None:
+            self.task.cancel()
+        if self.listener is not None:
+            self.listener.close()
+            self.listener = None
+        for link in list(self.links):
+            link.writer.close()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+class BusMetrics:
+    """Latest Prometheus text pushed by the ingest process, served by the HTTP process's /metrics"""
+
+    def __init__(self):
+        self.text = ''
+
+    def render_prometheus(self):
+        return self.text
+
+
+class BusFrameFeed:
+    """HTTP side of the frame bus: mirrors the full tier of every camera into a LatestFrameBuffer,
+    and their previews into a ThumbnailCache when given one"""
+
+    def __init__(self, path, frame_buffer, demand_window=10.0, reconnect_delay=1.0, thumbnails=None):
+        self.path = path
+        self.frame_buffer = frame_buffer
+        self.thumbnails = thumbnails
+        self.demand_window = demand_window  # Seconds an HTTP read keeps its camera in demand
+        self.reconnect_delay = reconnect_delay
+        self.metrics = BusMetrics()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=lambda: asyncio.run(self.run()), daemon=True)
+        self.thread.start()
+        return self.thread
+
+    async def run(self):
+        while True:
+            try:
+                reader, writer = await asyncio.open_unix_connection(self.path)
+            except OSError:
+                await asyncio.sleep(self.reconnect_delay)
+                continue
+            writer.write(pack_control({'op': 'hello', 'role': 'http', 'name': f'http-{os.getpid()}'}))
+            reporter = asyncio.get_running_loop().create_task(self.report_demand(writer))
+            try:
+                while True:
+                    kind, message = await read_message(reader)
+                    if kind == FRAME:
+                        meta, data = message
+                        if meta.get('thumbnail'):
+                            if self.thumbnails is not None:
+                                self.thumbnails.put(meta['camera'], data[meta.get('tag', 0):], meta.get('time'))
+                            continue
+                        self.frame_buffer.publish(meta['camera'], data[meta.get('tag', 0):], meta.get('time'))
+                    elif message.get('op') == 'discard':
+                        self.frame_buffer.discard(message.get('camera'))
+                    elif message.get('op') == 'metrics':
+                        self.metrics.text = message.get('text', '')
+            except (asyncio.IncompleteReadError, ConnectionError):
+                logger.warning("[-] Lost the frame bus, waiting for the ingest process")
+            finally:
+                reporter.cancel()
+                writer.close()
+                # Streams end instead of repeating the last frame of a hub that is gone
+                for camera_id in self.frame_buffer.camera_ids():
+                    self.frame_buffer.discard(camera_id)
+            await asyncio.sleep(self.reconnect_delay)
+
+    async def report_demand(self, writer):
+        """Tell the ingest process once a second which cameras HTTP clients are reading"""
+        while True:
+            await asyncio.sleep(1.0)
+            cameras = [camera_id for camera_id in self.frame_buffer.camera_ids()
+                       if self.frame_buffer.read_recently(camera_id, self.demand_window)]
+            if cameras:
+                writer.write(pack_control({'op': 'demand', 'cameras': cameras}))
@@ -0,0 +1,100 @@
+# file: classes/FrameMailbox.py
+import threading
+import time
+from collections import deque
+from queue import Empty
+
+
+class FrameMailbox:
+    """Bounded per-camera frame mailbox where newer frames overwrite older ones"""
+
+    def __init__(self, depth=1):
+        self.depth = max(1, int(depth))
+        self.frames = deque()
+        self.cond = threading.Condition()
+        self.closed = False
+        self.received = 0  # Frames offered to the mailbox
+        self.superseded = 0  # Frames overwritten by a newer frame before being taken
+        self.dropped = 0  # Frames taken or cleared but never processed
+        self.last_wait = 0.0  # Seconds the last taken frame spent in the mailbox
+
+    def put(self, frame):
+        """Store a frame, evicting the oldest one if the mailbox is full"""
+        with self.cond:
+            if self.closed:
+                self.dropped += 1
+                return False
+            self.received += 1
+            superseded = False
+            while len(self.frames) >= self.depth:
+                self.frames.popleft()
+                self.superseded += 1
+                superseded = True
+            self.frames.append((time.monotonic(), frame))
+            self.cond.notify()
+            return superseded
+
+    def get(self, timeout=None):
+        """Take the oldest pending frame, returning None once the mailbox is closed"""
+        with self.cond:
+            if not self.cond.wait_for(lambda: self.frames or self.closed, timeout=timeout):
+                raise Empty
+            if self.closed:
+                return None
+            return self._take()
+
+    def get_nowait(self):
+        """Take the oldest pending frame without waiting"""
+        with self.cond:
+            if not self.frames:
+                raise Empty
+            return self._take()
+
+    def _take(self):
+        queued_at, frame = self.frames.popleft()
+        self.last_wait = time.monotonic() - queued_at
+        return frame
+
+    def empty(self):
+        """Return True if no frame is pending"""
+        with self.cond:
+            return not self.frames
+
+    def qsize(self):
+        """Return the number of pending frames"""
+        with self.cond:
+            return len(self.frames)
+
+    def clear(self):
+        """Discard all pending frames, counting them as dropped"""
+        with self.cond:
+            self.dropped += len(self.frames)
+            self.frames.clear()
+
+    def mark_dropped(self, count=1):
+        """Record frames the consumer took but chose not to process"""
+        with self.cond:
+            self.dropped += count
+
+    def reopen(self):
+        """Reset the closed flag so the mailbox can be reused after a reconnect"""
+        with self.cond:
+            self.closed = False
+
+    def close(self):
+        """Wake any waiting consumer and make further gets return None"""
+        with self.cond:
+            self.closed = True
+            self.dropped += len(self.frames)
+            self.frames.clear()
+            self.cond.notify_all()
+
+    def stats(self):
+        """Return a snapshot of the mailbox counters"""
+        with self.cond:
+            return {
+                'received': self.received,
+                'superseded': self.superseded,
+                'dropped': self.dropped,
+                'depth': len(self.frames)
+            }
@@ -0,0 +1,106 @@
+# file: classes/FramePipeline.py
+import time
+from collections import namedtuple
+
+import cv2
+
+# Outcome of processing one camera frame: boxes at full resolution, frame size, the JPEG
+# encoded for each requested quality tier ({tier: buffer}) and the time spent in each stage in seconds
+FrameResult = namedtuple('FrameResult', ['boxes', 'width', 'height', 'encoded', 'detect_time',
+                                         'decode_time', 'encode_time'], defaults=(0.0, 0.0))
+
+# Quality tiers web clients can subscribe to: (downscale factor, JPEG quality)
+QUALITY_TIERS = {
+    'full': (1, 85),
+    'half': (2, 70),
+    'thumb': (4, 60)
+}
+DEFAULT_TIER = 'full'
+
+
+def scale_boxes(boxes, factor):
+    """Scale full-resolution boxes down to a tier's frame size"""
+    if factor == 1:
+        return boxes
+    return [[x // factor, y // factor, max(1, w // factor), max(1, h // factor)] for x, y, w, h in boxes]
+
+
+def prepare_detection_frame(frame, scale):
+    """Reduce an already decoded BGR frame to the grayscale detection frame"""
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    if scale == 1:
+        return gray
+    height, width = gray.shape[:2]
+    return cv2.resize(gray, ((width + scale - 1) // scale, (height + scale - 1) // scale),
+                      interpolation=cv2.INTER_AREA)
+
+
+def draw_boxes(frame, boxes):
+    """Draw motion boxes into a BGR frame"""
+    for x, y, w, h in boxes:
+        cv2.rectangle(frame, (x, y), (x + w, y + h), (0, 255, 0), 2)
+    return frame
+
+
+def process_frame(codec, detector, frame_data, settings, scale, stream_mode, tiers=(DEFAULT_TIER,), reuse=None):
+    """Decode, detect and encode one JPEG frame for each requested tier, returning a FrameResult or None.
+
+    Pass-through frames are already encoded at full quality, so only reduced tiers are encoded and
+    they carry no boxes; annotated frames get boxes drawn into every tier. Passing reuse as the
+    (boxes, width, height) of an earlier frame skips detection and keeps showing those boxes.
+    """
+    start_time = time.perf_counter()
+    gray = None
+    if stream_mode == 'passthrough':
+        frame = None
+        if reuse is None:
+            # Only detection needs pixels, so decode straight to reduced grayscale
+            gray = codec.decode_gray(frame_data, scale)
+            if gray is None:
+                return None
+            height, width = gray.shape[0] * scale, gray.shape[1] * scale
+        else:
+            # Nothing to decode unless a reduced tier is encoded below
+            width, height = reuse[1], reuse[2]
+    else:
+        # Annotated frames need the full colour image to draw on
+        frame = codec.decode(frame_data)
+        if frame is None:
+            return None
+        height, width = frame.shape[:2]
+        if reuse is None:
+            gray = prepare_detection_frame(frame, scale)
+    decode_time = time.perf_counter() - start_time
+
+    # Check for minimum frame size
+    if width < 100 or height < 100:
+        return None
+
+    start_time = time.perf_counter()
+    boxes = detector.detect(gray, settings, scale) if reuse is None else reuse[0]
+    detect_time = time.perf_counter() - start_time
+
+    encoded = {}
+    start_time = time.perf_counter()
+    # Smallest tiers first, so the full frame is only drawn on once the others are resized from it
+    for tier in sorted(tiers, key=lambda name: -QUALITY_TIERS[name][0]):
+        factor, quality = QUALITY_TIERS[tier]
+        if frame is None:
+            if factor == 1:
+                continue  # The camera's own JPEG is the full tier
+            # Let the decoder do the downscaling, far cheaper than a full decode and resize
+            tier_frame = codec.decode_scaled(frame_data, factor)
+        elif factor == 1:
+            tier_frame = draw_boxes(frame, boxes)
+        else:
+            tier_frame = cv2.resize(frame, (width // factor, height // factor), interpolation=cv2.INTER_AREA)
+            tier_frame = draw_boxes(tier_frame, scale_boxes(boxes, factor))
+        if tier_frame is None:
+            continue
+        buffer = codec.encode(tier_frame, quality)
+        if buffer is not None and len(buffer) >= 100:
+            encoded[tier] = buffer
+    encode_time = time.perf_counter() - start_time
+    if frame is not None and tiers and not encoded:
+        return None
+    return FrameResult(boxes, width, height, encoded, detect_time, decode_time, encode_time)
@@ -0,0 +1,177 @@
+# file: classes/FrameRing.py
+import struct
+import threading
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# Slots two frames may reserve (raw input plus every quality tier each). A slot this close to being
+# reused is treated as gone, so a reader that passed the check never races the writer onto it
+RESERVE_MARGIN = 8
+
+# Tag sent ahead of the JPEG to multiplexed viewers: version, camera id length, per-camera frame
+# sequence and hub receive time in seconds since the epoch, followed by the UTF-8 camera id
+FRAME_TAG = struct.Struct('!BBId')
+FRAME_TAG_VERSION = 1
+TAG_ROOM = FRAME_TAG.size + 255  # Bytes kept in front of every slot for the tag
+
+
+def pack_tag(camera_id, seq, timestamp):
+    """Build the tag of one frame, camera ids are cut to 255 bytes"""
+    name = str(camera_id).encode()[:255]
+    return FRAME_TAG.pack(FRAME_TAG_VERSION, len(name), seq & 0xFFFFFFFF, timestamp) + name
+
+
+def unpack_tag(message):
+    """Split a tagged frame into (camera_id, seq, timestamp, JPEG memoryview)"""
+    version, name_length, seq, timestamp = FRAME_TAG.unpack_from(message)
+    end = FRAME_TAG.size + name_length
+    view = memoryview(message)
+    return bytes(view[FRAME_TAG.size:end]).decode(), seq, timestamp, view[end:]
+
+
+class FrameRef:
+    """A JPEG held in a FrameRing slot, readable until the ring wraps around onto it"""
+    __slots__ = ('ring', 'slot', 'seq', 'start', 'length', 'tag_length')
+
+    def __init__(self, ring, slot, seq, start, length, tag_length=0):
+        self.ring = ring
+        self.slot = slot
+        self.seq = seq
+        self.start = start  # Offset of the first byte in the ring's shared memory
+        self.length = length
+        self.tag_length = tag_length  # Bytes of frame tag written just before start
+
+    def __len__(self):
+        return self.length
+
+    def tagged(self):
+        """The same frame with its tag in front, as sent to multiplexed viewers"""
+        return FrameRef(self.ring, self.slot, self.seq, self.start - self.tag_length, self.length + self.tag_length)
+
+    def view(self):
+        """memoryview of the JPEG, None once its slot is about to be reused"""
+        return self.ring.view(self)
+
+    def tobytes(self):
+        """Validated copy of the JPEG, None if its slot was reused"""
+        return self.ring.copy(self)
+
+
+def tag_frame(data, tag):
+    """The frame with its tag in front, in place for ring frames (tagged on commit) and one copy for bytes"""
+    if isinstance(data, FrameRef):
+        return data.tagged()
+    return tag + data
+
+
+class FrameRing:
+    """Fixed-slot ring of one camera's JPEGs in shared memory.
+
+    Every slot carries the sequence number and length of the frame in it. Writers reserve a slot,
+    fill it and commit it; readers take FrameRefs and read through memoryviews, checking the
+    sequence number so a reused slot is never mistaken for the frame they hold. Each slot starts
+    with TAG_ROOM bytes where the frame's tag is written right before the JPEG, so tagged and plain
+    frames are both sent in place. Memory use is slots * (slot_size + TAG_ROOM) for the lifetime
+    of the camera, frames larger than a slot are left to the caller to keep as bytes.
+    """
+
+    def __init__(self, slots=32, slot_size=384 * 1024):
+        if slots <= RESERVE_MARGIN:
+            raise ValueError(f"a frame ring needs more than {RESERVE_MARGIN} slots")
+        self.slots = slots
+        self.slot_size = slot_size
+        self.stride = TAG_ROOM + slot_size
+        # Shared memory so motion worker processes read inputs from and encode into the ring directly
+        self.shm = shared_memory.SharedMemory(create=True, size=slots * self.stride)
+        self.array = np.ndarray((slots, self.stride), np.uint8, buffer=self.shm.buf)
+        self.seqs = [0] * slots  # Sequence number of the frame in each slot, 0 while free or being written
+        self.lengths = [0] * slots
+        self.head = 0  # Sequence number of the most recently reserved slot
+        self.poisoned = set()  # Slots a timed-out motion worker may still write to, skipped by reserve
+        self.lock = threading.Lock()
+        self.oversized = 0  # Frames too large for a slot
+        self.closed = False
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    @property
+    def nbytes(self):
+        return self.slots * self.stride
+
+    def offset(self, slot):
+        """Offset of a slot's JPEG in the shared memory"""
+        return slot * self.stride + TAG_ROOM
+
+    def reserve(self):
+        """Claim the next slot for writing, returning (slot, seq); the frame it held becomes unreadable"""
+        with self.lock:
+            self.head += 1
+            while self.head % self.slots in self.poisoned:
+                self.head += 1
+            seq = self.head
+        slot = seq % self.slots
+        self.seqs[slot] = 0
+        return slot, seq
+
+    def poison(self, slots):
+        """Keep reserved slots out of reuse until release, for writers that may still fill them late"""
+        with self.lock:
+            if len(self.poisoned) + len(slots) > self.slots - RESERVE_MARGIN:
+                raise ValueError("too many poisoned slots in the frame ring")
+            self.poisoned.update(slots)
+
+    def release(self, slots):
+        """Return poisoned slots to use once their late writer is done with them"""
+        with self.lock:
+            self.poisoned.difference_update(slots)
+
+    def commit(self, slot, seq, length, tag=b''):
+        """Publish a filled slot with the frame's tag, returning the FrameRef readers use"""
+        if tag:
+            self.array[slot, TAG_ROOM - len(tag):TAG_ROOM] = np.frombuffer(tag, np.uint8)
+        self.lengths[slot] = length
+        self.seqs[slot] = seq
+        return FrameRef(self, slot, seq, self.offset(slot), length, len(tag))
+
+    def write(self, data, tag=b''):
+        """Copy a JPEG (bytes or an encoder's buffer) into the next slot, returning a FrameRef or None if too large"""
+        source = np.frombuffer(data, np.uint8)
+        length = source.size
+        if length > self.slot_size:
+            self.oversized += 1
+            return None
+        slot, seq = self.reserve()
+        self.array[slot, TAG_ROOM:TAG_ROOM + length] = source
+        return self.commit(slot, seq, length, tag)
+
+    def readable(self, ref):
+        return not self.closed and self.seqs[ref.slot] == ref.seq and self.head - ref.seq < self.slots - RESERVE_MARGIN
+
+    def view(self, ref):
+        if not self.readable(ref):
+            return None
+        return self.shm.buf[ref.start:ref.start + ref.length]
+
+    def copy(self, ref):
+        view = self.view(ref)
+        if view is None:
+            return None
+        data = bytes(view)
+        # The slot may have been reused while it was copied
+        return data if self.seqs[ref.slot] == ref.seq else None
+
+    def close(self):
+        """Free the shared memory, views still held elsewhere keep their pages until released"""
+        self.closed = True  # FrameRefs still queued for viewers read as overwritten from now on
+        self.array = None
+        try:
+            self.shm.close()
+        except BufferError:
+            pass  # A viewer still holds a memoryview, the mapping goes when it is released
+        try:
+            self.shm.unlink()
+        except FileNotFoundError:
+            pass
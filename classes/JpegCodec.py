@@ -0,0 +1,141 @@
+# file: classes/JpegCodec.py
+import logging
+
+import cv2
+import numpy as np
+
+# Optional libjpeg-turbo binding for DCT-scaled decoding
+try:
+    from turbojpeg import TurboJPEG, TJPF_BGR, TJPF_GRAY
+except ImportError:
+    TurboJPEG = None
+
+logger = logging.getLogger(__name__)
+
+# Frame widths reported by the ESP32 for each resolution setting
+RESOLUTION_WIDTHS = {
+    'QQVGA': 160,
+    'QVGA': 320,
+    'VGA': 640,
+    'SVGA': 800,
+    'XGA': 1024,
+    'HD': 1280,
+    'SXGA': 1280,
+    'UXGA': 1600
+}
+
+# Scale denominators supported by reduced JPEG decoding
+DECODE_SCALES = (1, 2, 4, 8)
+
+
+def detection_scale_for(resolution, target_width=320):
+    """Pick the largest decode scale that keeps the detection frame at least target_width wide"""
+    width = RESOLUTION_WIDTHS.get(resolution, RESOLUTION_WIDTHS['VGA'])
+    scale = 1
+    for candidate in DECODE_SCALES:
+        if width // candidate >= target_width:
+            scale = candidate
+    return scale
+
+
+def jpeg_size_bound(resolution):
+    """Bytes that hold any JPEG the hub encodes at a resolution: 4 bits per 4:3 pixel, in 16 KB steps"""
+    width = RESOLUTION_WIDTHS.get(resolution, RESOLUTION_WIDTHS['VGA'])
+    size = width * (width * 3 // 4) // 2
+    return (size + 0x3FFF) & ~0x3FFF
+
+
+class JpegCodec:
+    """Interface for JPEG decode/encode backends used by the frame pipeline"""
+    name = 'base'
+
+    def decode(self, data):
+        """Decode JPEG bytes to a full-resolution BGR frame"""
+        raise NotImplementedError
+
+    def decode_gray(self, data, scale=1):
+        """Decode JPEG bytes straight to a grayscale frame reduced by scale (1, 2, 4 or 8)"""
+        raise NotImplementedError
+
+    def decode_scaled(self, data, scale=1):
+        """Decode JPEG bytes straight to a BGR frame reduced by scale (1, 2, 4 or 8)"""
+        raise NotImplementedError
+
+    def encode(self, frame, quality=85):
+        """Encode a BGR frame to JPEG, returning a numpy buffer or None on failure"""
+        ok, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        return buffer if ok else None
+
+
+class OpenCVCodec(JpegCodec):
+    """Pure OpenCV backend using the IMREAD_REDUCED_* flags for scaled decoding"""
+    name = 'opencv'
+
+    GRAY_FLAGS = {
+        1: cv2.IMREAD_GRAYSCALE,
+        2: cv2.IMREAD_REDUCED_GRAYSCALE_2,
+        4: cv2.IMREAD_REDUCED_GRAYSCALE_4,
+        8: cv2.IMREAD_REDUCED_GRAYSCALE_8
+    }
+
+    COLOR_FLAGS = {
+        1: cv2.IMREAD_COLOR,
+        2: cv2.IMREAD_REDUCED_COLOR_2,
+        4: cv2.IMREAD_REDUCED_COLOR_4,
+        8: cv2.IMREAD_REDUCED_COLOR_8
+    }
+
+    def decode(self, data):
+        return cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+
+    def decode_gray(self, data, scale=1):
+        return cv2.imdecode(np.frombuffer(data, np.uint8), self.GRAY_FLAGS[scale])
+
+    def decode_scaled(self, data, scale=1):
+        return cv2.imdecode(np.frombuffer(data, np.uint8), self.COLOR_FLAGS[scale])
+
+
+class TurboJPEGCodec(JpegCodec):
+    """libjpeg-turbo backend decoding with DCT scaling through PyTurboJPEG"""
+    name = 'turbojpeg'
+
+    def __init__(self):
+        if TurboJPEG is None:
+            raise RuntimeError("PyTurboJPEG is not installed")
+        self.jpeg = TurboJPEG()
+
+    def decode(self, data):
+        return self.jpeg.decode(data, pixel_format=TJPF_BGR)
+
+    def decode_gray(self, data, scale=1):
+        gray = self.jpeg.decode(data, pixel_format=TJPF_GRAY, scaling_factor=(1, scale))
+        return gray[:, :, 0] if gray.ndim == 3 else gray
+
+    def decode_scaled(self, data, scale=1):
+        return self.jpeg.decode(data, pixel_format=TJPF_BGR, scaling_factor=(1, scale))
+
+    def encode(self, frame, quality=85):
+        return np.frombuffer(self.jpeg.encode(frame, quality=quality), np.uint8)
+
+
+def available_codecs():
+    """Return the names of the codec backends usable on this machine"""
+    names = ['opencv']
+    if TurboJPEG is not None:
+        try:
+            TurboJPEGCodec()
+            names.append('turbojpeg')
+        except Exception:
+            pass  # Binding installed without the native library
+    return names
+
+
+def create_codec(name='auto'):
+    """Create a codec backend by name, 'auto' prefers libjpeg-turbo and falls back to OpenCV"""
+    if name in ('auto', 'turbojpeg'):
+        try:
+            return TurboJPEGCodec()
+        except Exception as e:
+            if name == 'turbojpeg':
+                logger.warning("[-] TurboJPEG codec unavailable, falling back to OpenCV: %s", e)
+    return OpenCVCodec()
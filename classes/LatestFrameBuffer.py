@@ -0,0 +1,108 @@
+# file: classes/LatestFrameBuffer.py
+import itertools
+import os
+import threading
+import time
+from collections import namedtuple
+
+from classes.FrameRing import FrameRef
+
+# An encoded frame as published by the processing pipeline
+LatestFrame = namedtuple('LatestFrame', ['seq', 'timestamp', 'data', 'etag'])
+
+
+class _Slot:
+    """Latest frame of one camera and the condition its HTTP streams wait on"""
+
+    def __init__(self):
+        self.frame = None
+        self.condition = threading.Condition()
+        self.closed = False
+
+
+class LatestFrameBuffer:
+    """Latest encoded JPEG of every camera, published once per frame and read by any number of HTTP clients"""
+
+    def __init__(self):
+        self.slots = {}
+        self.lock = threading.Lock()
+        self.boot_id = os.urandom(4).hex()  # Keeps ETags from matching across server restarts
+        self.counter = itertools.count(1)  # Sequence shared by all cameras so ETags are never reused
+        self.read_times = {}  # camera_id -> monotonic time an HTTP client last asked for a frame
+
+    def _slot(self, camera_id, create=False):
+        slot = self.slots.get(camera_id)
+        if slot is None and create:
+            with self.lock:
+                slot = self.slots.get(camera_id)
+                if slot is None:
+                    slot = self.slots[camera_id] = _Slot()
+        return slot
+
+    def publish(self, camera_id, data, timestamp=None):
+        """Replace the latest frame of a camera and wake its streams.
+
+        A FrameRef is kept as it is and copied out of the camera's ring only once an HTTP client
+        reads it, so cameras nobody fetches over HTTP cost no copy.
+        """
+        if not isinstance(data, FrameRef):
+            data = bytes(data)
+        slot = self._slot(camera_id, create=True)
+        with slot.condition:
+            seq = next(self.counter)
+            slot.frame = LatestFrame(seq, time.time() if timestamp is None else timestamp, data,
+                                     f"{self.boot_id}-{seq}")
+            slot.closed = False
+            slot.condition.notify_all()
+
+    @staticmethod
+    def _resolve(slot):
+        """Copy the slot's frame out of its ring once for all readers, call with the condition held"""
+        frame = slot.frame
+        if frame is not None and isinstance(frame.data, FrameRef):
+            data = frame.data.tobytes()
+            # None only when the ring wrapped without publishing here, which leaves nothing to serve
+            frame = slot.frame = frame._replace(data=data) if data is not None else None
+        return frame
+
+    def latest(self, camera_id):
+        """Return the latest frame of a camera, or None"""
+        self.read_times[camera_id] = time.monotonic()
+        slot = self._slot(camera_id)
+        if slot is None:
+            return None
+        with slot.condition:
+            return self._resolve(slot)
+
+    def wait(self, camera_id, after_seq=0, timeout=None):
+        """Block until a frame newer than after_seq is published; None on timeout or when the camera goes away"""
+        self.read_times[camera_id] = time.monotonic()
+        slot = self._slot(camera_id)
+        if slot is None:
+            return None
+        with slot.condition:
+            slot.condition.wait_for(
+                lambda: slot.closed or (slot.frame is not None and slot.frame.seq > after_seq),
+                timeout=timeout
+            )
+            frame = self._resolve(slot)
+            if slot.closed or frame is None or frame.seq <= after_seq:
+                return None
+            return frame
+
+    def discard(self, camera_id):
+        """Forget a disconnected camera's frame and end its streams"""
+        with self.lock:
+            slot = self.slots.pop(camera_id, None)
+        if slot is not None:
+            with slot.condition:
+                slot.closed = True
+                slot.frame = None
+                slot.condition.notify_all()
+
+    def read_recently(self, camera_id, seconds):
+        """True when an HTTP snapshot or stream client read the camera within the last seconds"""
+        return time.monotonic() - self.read_times.get(camera_id, float('-inf')) < seconds
+
+    def camera_ids(self):
+        return [camera_id for camera_id, slot in list(self.slots.items()) if slot.frame is not None]
@@ -0,0 +1,100 @@
+# file: classes/LogPipeline.py
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+
+_listener = None
+_listener_pid = None  # A forked child inherits the listener object but not its thread
+_setup_lock = threading.Lock()
+
+
+class RateLimitFilter(logging.Filter):
+    """Let through at most `burst` records per call site and camera every `interval` seconds.
+
+    Records are keyed by logger, source line and the `camera` attribute set with
+    extra={'camera': camera_id}, so one failing camera cannot drown out the others. The first
+    record let through after a quiet period reports how many were suppressed.
+    """
+
+    def __init__(self, burst=5, interval=10.0, clock=time.monotonic):
+        super().__init__()
+        self.burst = burst
+        self.interval = interval
+        self.clock = clock
+        self.windows = {}  # key -> [window start, records let through, records suppressed]
+        self.lock = threading.Lock()
+        self.suppressed = 0  # Total records dropped, for metrics
+
+    def filter(self, record):
+        key = (record.name, record.lineno, getattr(record, 'camera', None))
+        now = self.clock()
+        with self.lock:
+            window = self.windows.get(key)
+            if window is None or now - window[0] >= self.interval:
+                dropped = window[2] if window is not None else 0
+                self.windows[key] = [now, 1, 0]
+                if dropped:
+                    record.msg = f"{record.msg} ({dropped} similar messages suppressed)"
+                return True
+            if window[1] < self.burst:
+                window[1] += 1
+                return True
+            window[2] += 1
+            self.suppressed += 1
+            return False
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that leaves formatting, tracebacks included, to the listener thread.
+
+    The stock handler fully formats every record before queueing it. Records never leave the
+    process here, so only the message is merged with its arguments in the calling thread, while
+    they still hold the values being logged; the formatter and tracebacks run on the listener.
+    """
+
+    def prepare(self, record):
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+def setup_logging(level=logging.INFO, stream=None, burst=5, interval=10.0):
+    """Route all logging through a queue drained by a background thread, once per process.
+
+    Returns the rate limit filter so callers can read how many records it suppressed.
+    """
+    global _listener, _listener_pid
+    with _setup_lock:
+        root = logging.getLogger()
+        if _listener is not None and _listener_pid == os.getpid():
+            return _listener.rate_limit
+        output = logging.StreamHandler(stream if stream is not None else sys.stdout)
+        output.setFormatter(logging.Formatter('%(message)s'))
+        records = queue.SimpleQueue()
+        handler = DeferredQueueHandler(records)
+        rate_limit = RateLimitFilter(burst=burst, interval=interval)
+        handler.addFilter(rate_limit)
+        for existing in list(root.handlers):
+            root.removeHandler(existing)
+        root.addHandler(handler)
+        root.setLevel(level)
+        _listener = logging.handlers.QueueListener(records, output, respect_handler_level=True)
+        _listener.rate_limit = rate_limit
+        _listener.start()
+        _listener_pid = os.getpid()
+        atexit.register(stop_logging)
+        return rate_limit
+
+
+def stop_logging():
+    """Write out every queued record and stop the listener thread"""
+    global _listener
+    with _setup_lock:
+        if _listener is not None and _listener_pid == os.getpid():
+            _listener.stop()
+            _listener = None
@@ -0,0 +1,170 @@
+# file: classes/Metrics.py
+import logging
+import threading
+from bisect import bisect_left
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds in seconds shared by every latency histogram
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+# Frame pipeline stages timed for each camera
+STAGES = ('ingest', 'queue_wait', 'decode', 'detect', 'encode', 'fan_out')
+
+
+def escape_label(value):
+    """Escape a Prometheus label value"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Histogram:
+    """Fixed-bucket latency histogram, cheap enough to observe on every frame"""
+    __slots__ = ('counts', 'sum', 'count', 'ema')
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)  # Last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.ema = 0.0  # Exponential moving average, tracks the recent cost
+
+    def observe(self, value):
+        self.counts[bisect_left(LATENCY_BUCKETS, value)] += 1
+        self.sum += value
+        self.ema = value if self.count == 0 else self.ema * 0.9 + value * 0.1
+        self.count += 1
+
+    def quantile(self, q):
+        """Estimate a quantile as the upper bound of the bucket that contains it"""
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return LATENCY_BUCKETS[-1]
+
+    def summary(self):
+        """Milliseconds view of the histogram for the JSON status channel"""
+        return {
+            'count': self.count,
+            'mean_ms': round(self.sum / self.count * 1000.0, 3) if self.count else 0.0,
+            'recent_ms': round(self.ema * 1000.0, 3),
+            'p50_ms': round(self.quantile(0.5) * 1000.0, 3),
+            'p95_ms': round(self.quantile(0.95) * 1000.0, 3)
+        }
+
+
+class CameraMetrics:
+    """Stage histograms and byte counters of one camera"""
+    __slots__ = ('stages', 'frames_in', 'bytes_in', 'frames_out', 'bytes_out')
+
+    def __init__(self):
+        self.stages = {stage: Histogram() for stage in STAGES}
+        self.frames_in = 0
+        self.bytes_in = 0
+        self.frames_out = 0  # Frames queued to viewers, one per viewer
+        self.bytes_out = 0
+
+    def observe(self, stage, seconds):
+        self.stages[stage].observe(seconds)
+
+
+class Metrics:
+    """Frame pipeline instrumentation, rendered as Prometheus text or a JSON summary.
+
+    Each stage of a camera is only observed from one thread, so observations take no lock;
+    collectors registered by the server add gauges such as queue depth when rendering.
+    """
+
+    def __init__(self, prefix='espcam'):
+        self.prefix = prefix
+        self.cameras = {}
+        self.lock = threading.Lock()
+        self.viewer_lag = Histogram()  # Time frames waited in viewer send queues
+        self.collectors = []  # Callables returning [(name, type, help, [(labels, value), ...]), ...]
+
+    def camera(self, camera_id):
+        """Get the metrics of a camera, creating them on first use"""
+        metrics = self.cameras.get(camera_id)
+        if metrics is None:
+            with self.lock:
+                metrics = self.cameras.setdefault(camera_id, CameraMetrics())
+        return metrics
+
+    def add_collector(self, collector):
+        """Register a callable providing extra samples at scrape time"""
+        self.collectors.append(collector)
+
+    def render_prometheus(self):
+        """Render all metrics in the Prometheus text exposition format"""
+        prefix = self.prefix
+        lines = []
+        cameras = list(self.cameras.items())
+
+        name = f'{prefix}_stage_seconds'
+        lines.append(f'# HELP {name} Frame pipeline stage latency per camera')
+        lines.append(f'# TYPE {name} histogram')
+        for camera_id, metrics in cameras:
+            camera = escape_label(camera_id)
+            for stage, histogram in metrics.stages.items():
+                labels = f'camera="{camera}",stage="{stage}"'
+                self._render_histogram(lines, name, labels, histogram)
+
+        for attribute, help_text in (('frames_in', 'Frames received from the camera'),
+                                     ('bytes_in', 'JPEG bytes received from the camera'),
+                                     ('frames_out', 'Frames queued to web clients'),
+                                     ('bytes_out', 'JPEG bytes queued to web clients')):
+            name = f'{prefix}_{attribute}_total'
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} counter')
+            for camera_id, metrics in cameras:
+                lines.append(f'{name}{{camera="{escape_label(camera_id)}"}} {getattr(metrics, attribute)}')
+
+        name = f'{prefix}_viewer_send_lag_seconds'
+        lines.append(f'# HELP {name} Time frames waited in web client send queues')
+        lines.append(f'# TYPE {name} histogram')
+        self._render_histogram(lines, name, '', self.viewer_lag)
+
+        for collector in list(self.collectors):
+            try:
+                samples = collector()
+            except Exception as e:
+                logger.exception("[-] Error collecting metrics: %s", e)
+                continue
+            for metric, metric_type, help_text, values in samples:
+                name = f'{prefix}_{metric}'
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} {metric_type}')
+                for labels, value in values:
+                    label_text = ','.join(f'{key}="{escape_label(val)}"' for key, val in labels.items())
+                    lines.append(f'{name}{{{label_text}}} {value}' if label_text else f'{name} {value}')
+        lines.append('')
+        return '\n'.join(lines)
+
+    @staticmethod
+    def _render_histogram(lines, name, labels, histogram):
+        separator = ',' if labels else ''
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS, histogram.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels}{separator}le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{labels}{separator}le="+Inf"}} {histogram.count}')
+        suffix = f'{{{labels}}}' if labels else ''
+        lines.append(f'{name}_sum{suffix} {histogram.sum}')
+        lines.append(f'{name}_count{suffix} {histogram.count}')
+
+    def summary(self):
+        """Compact per-camera summary sent to web clients over the status channel"""
+        cameras = {}
+        for camera_id, metrics in list(self.cameras.items()):
+            cameras[camera_id] = {
+                'stages': {stage: histogram.summary() for stage, histogram in metrics.stages.items()
+                           if histogram.count},
+                'frames_in': metrics.frames_in,
+                'bytes_in': metrics.bytes_in,
+                'frames_out': metrics.frames_out,
+                'bytes_out': metrics.bytes_out
+            }
+        return {'cameras': cameras, 'viewer_send_lag': self.viewer_lag.summary()}
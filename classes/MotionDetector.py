@@ -0,0 +1,221 @@
+# file: classes/MotionDetector.py
+import cv2
+import numpy as np
+
+from classes.MotionZones import ZoneMask
+
+# Kernel used to dilate thresholded motion masks
+DILATE_KERNEL = np.ones((3, 3), np.uint8)
+
+# Background models handle sensor noise themselves, so they never need a large blur
+BACKGROUND_MODEL_MAX_BLUR = 7
+
+
+def scaled_settings(settings, scale):
+    """Adapt blur size and minimum area, tuned for a half-resolution frame, to the decode scale"""
+    ratio = 2.0 / scale
+    blur_size = max(3, int(settings['blur_size'] * ratio) | 1)
+    min_area = settings['min_area'] * ratio * ratio
+    return blur_size, min_area
+
+
+def find_boxes(mask, min_area, scale, offset=(0, 0)):
+    """Extract [x, y, w, h] boxes at full resolution from a binary motion mask cropped at offset"""
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    boxes = []
+    offset_x, offset_y = offset
+    for contour in contours:
+        if cv2.contourArea(contour) > min_area:
+            x, y, w, h = cv2.boundingRect(contour)
+            # Scale coordinates back to original frame size
+            boxes.append([(x + offset_x) * scale, (y + offset_y) * scale, w * scale, h * scale])
+    return boxes
+
+
+class MotionDetector:
+    """Base class for motion detection engines, limiting detection to the camera's motion zones"""
+    name = 'base'
+
+    def __init__(self):
+        self.zone_mask = ZoneMask()
+        self.rect = None  # Detection rectangle of the previous frame
+
+    def detect(self, gray, settings, scale):
+        """Return motion boxes for a reduced grayscale frame, limited to the camera's motion zones"""
+        blur_size, min_area = scaled_settings(settings, scale)
+        rect, zone_mask = self.zone_mask.update(settings.get('zones'), gray.shape)
+        if rect != self.rect:
+            # Background state of another rectangle is meaningless, start over
+            self.reset()
+            self.rect = rect
+        offset = (0, 0)
+        if rect is not None:
+            x, y, w, h = rect
+            gray = gray[y:y + h, x:x + w]  # Only the watched area is blurred, differenced and thresholded
+            offset = (x, y)
+        if gray.size == 0:
+            mask = None
+        else:
+            mask = self.motion_mask(gray, settings, blur_size)
+        if mask is not None and zone_mask is not None:
+            mask = cv2.bitwise_and(mask, zone_mask)
+        return [] if mask is None else find_boxes(mask, min_area, scale, offset)
+
+    def motion_mask(self, gray, settings, blur_size):
+        """Return a dilated binary mask of moving pixels, or None while the model warms up"""
+        raise NotImplementedError
+
+    def reset(self):
+        """Forget all background state"""
+
+
+class FrameDiffDetector(MotionDetector):
+    """Two-frame difference detector keeping the previous blurred frame of one camera"""
+    name = 'framediff'
+
+    def __init__(self):
+        super().__init__()
+        self.prev_frame = None
+
+    def motion_mask(self, gray, settings, blur_size):
+        # Apply Gaussian blur with optimized kernel size
+        blurred = cv2.GaussianBlur(gray, (blur_size, blur_size), 0)
+
+        # Calculate frame difference
+        if self.prev_frame is None:
+            self.prev_frame = blurred
+            return None
+
+        # Ensure both frames have the same size before comparison
+        if self.prev_frame.shape != blurred.shape:
+            self.prev_frame = cv2.resize(self.prev_frame, (blurred.shape[1], blurred.shape[0]))
+
+        frame_diff = cv2.absdiff(self.prev_frame, blurred)
+        self.prev_frame = blurred
+
+        # Threshold the difference
+        _, thresh = cv2.threshold(frame_diff, settings['threshold'], 255, cv2.THRESH_BINARY)
+
+        # Dilate the thresholded image with optimized kernel
+        return cv2.dilate(thresh, DILATE_KERNEL, iterations=settings['dilation'])
+
+    def reset(self):
+        self.prev_frame = None
+
+
+class RunningAverageDetector(MotionDetector):
+    """Difference against an accumulateWeighted running average, far less noisy than two frames"""
+    name = 'running_avg'
+
+    def __init__(self):
+        super().__init__()
+        self.average = None
+
+    def motion_mask(self, gray, settings, blur_size):
+        # The averaged background already suppresses sensor noise, so a light blur is enough
+        blur_size = min(blur_size, BACKGROUND_MODEL_MAX_BLUR)
+        blurred = cv2.GaussianBlur(gray, (blur_size, blur_size), 0)
+        if self.average is None or self.average.shape != blurred.shape:
+            self.average = blurred.astype(np.float32)
+            return None
+
+        frame_diff = cv2.absdiff(blurred, cv2.convertScaleAbs(self.average))
+        cv2.accumulateWeighted(blurred, self.average, settings.get('learning_rate', 0.05))
+        _, thresh = cv2.threshold(frame_diff, settings['threshold'], 255, cv2.THRESH_BINARY)
+        return cv2.dilate(thresh, DILATE_KERNEL, iterations=settings['dilation'])
+
+    def reset(self):
+        self.average = None
+
+
+class BackgroundSubtractorDetector(MotionDetector):
+    """Detector backed by one of OpenCV's statistical background subtractors"""
+
+    def __init__(self):
+        super().__init__()
+        self.subtractor = None
+        self.shape = None
+        self.threshold = None  # Motion threshold the model currently runs with
+
+    def create_subtractor(self, settings):
+        raise NotImplementedError
+
+    def set_threshold(self, threshold):
+        """Apply a changed motion threshold to the running model, keeping what it learned"""
+        raise NotImplementedError
+
+    def motion_mask(self, gray, settings, blur_size):
+        blur_size = min(blur_size, BACKGROUND_MODEL_MAX_BLUR)
+        blurred = cv2.GaussianBlur(gray, (blur_size, blur_size), 0)
+        # The model is per resolution, rebuild it when the frame size changes
+        if self.subtractor is None or self.shape != blurred.shape:
+            self.subtractor = self.create_subtractor(settings)
+            self.shape = blurred.shape
+            self.threshold = settings['threshold']
+        elif settings['threshold'] != self.threshold:
+            # The threshold slider moved
+            self.set_threshold(settings['threshold'])
+            self.threshold = settings['threshold']
+        foreground = self.subtractor.apply(blurred, learningRate=settings.get('learning_rate', 0.05))
+        # Drop shadow pixels (127) and keep confident foreground only
+        _, thresh = cv2.threshold(foreground, 200, 255, cv2.THRESH_BINARY)
+        return cv2.dilate(thresh, DILATE_KERNEL, iterations=settings['dilation'])
+
+    def reset(self):
+        self.subtractor = None
+        self.shape = None
+        self.threshold = None
+
+
+class MOG2Detector(BackgroundSubtractorDetector):
+    """Gaussian mixture background model (createBackgroundSubtractorMOG2)"""
+    name = 'mog2'
+
+    def create_subtractor(self, settings):
+        # The motion threshold doubles as the squared Mahalanobis distance threshold
+        return cv2.createBackgroundSubtractorMOG2(history=500, varThreshold=settings['threshold'], detectShadows=False)
+
+    def set_threshold(self, threshold):
+        self.subtractor.setVarThreshold(threshold)
+
+
+class KNNDetector(BackgroundSubtractorDetector):
+    """K-nearest-neighbours background model (createBackgroundSubtractorKNN)"""
+    name = 'knn'
+
+    def create_subtractor(self, settings):
+        # KNN compares squared distances, so scale the threshold into its range
+        return cv2.createBackgroundSubtractorKNN(history=500, dist2Threshold=settings['threshold'] * 16.0, detectShadows=False)
+
+    def set_threshold(self, threshold):
+        self.subtractor.setDist2Threshold(threshold * 16.0)
+
+
+# Motion detection engines selectable through the 'engine' motion setting
+ENGINES = {
+    FrameDiffDetector.name: FrameDiffDetector,
+    RunningAverageDetector.name: RunningAverageDetector,
+    MOG2Detector.name: MOG2Detector,
+    KNNDetector.name: KNNDetector
+}
+
+
+def create_detector(engine='framediff'):
+    """Create a detector for the named engine, falling back to frame differencing"""
+    return ENGINES.get(engine, FrameDiffDetector)()
+
+
+def ensure_detector(detector, settings):
+    """Return the detector if it matches the selected engine, otherwise a new one for that engine"""
+    engine = settings.get('engine', FrameDiffDetector.name)
+    if engine not in ENGINES:
+        engine = FrameDiffDetector.name
+    if detector is None or detector.name != engine:
+        detector = create_detector(engine)
+    return detector
+
+
+def detector_for(detectors, camera_id, settings):
+    """Get the camera's detector from a dictionary, replacing it when the selected engine changes"""
+    detector = detectors[camera_id] = ensure_detector(detectors.get(camera_id), settings)
+    return detector
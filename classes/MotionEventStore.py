@@ -0,0 +1,160 @@
+# file: classes/MotionEventStore.py
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY,
+    camera_id TEXT NOT NULL,
+    ts REAL NOT NULL,
+    box_count INTEGER NOT NULL,
+    area INTEGER NOT NULL,
+    boxes TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS events_camera_ts ON events (camera_id, ts);
+CREATE INDEX IF NOT EXISTS events_ts ON events (ts);
+"""
+
+MAX_PAGE_SIZE = 1000
+
+
+def encode_cursor(timestamp, event_id):
+    """Opaque pagination cursor pointing just past an event"""
+    return f"{timestamp!r}:{event_id}"
+
+
+def decode_cursor(cursor):
+    """Parse a cursor produced by encode_cursor, raising ValueError when malformed"""
+    timestamp, event_id = cursor.rsplit(':', 1)
+    return float(timestamp), int(event_id)
+
+
+class MotionEventStore:
+    """Motion detections stored in SQLite (WAL mode), written in batches by a background thread.
+
+    Events are paginated newest first with keyset cursors on (ts, id), so every page is an
+    index range scan whatever its depth in the table.
+    """
+
+    def __init__(self, path='motion_events.db', batch_size=500, flush_interval=1.0, max_pending=100000):
+        self.path = path
+        self.batch_size = batch_size  # Events inserted per transaction
+        self.flush_interval = flush_interval  # Longest an event waits before being committed
+        self.max_pending = max_pending  # Events queued beyond this are dropped instead of growing memory
+        self.pending = deque()
+        self.condition = threading.Condition()
+        self.local = threading.local()  # One read connection per thread
+        self.recorded = 0
+        self.dropped = 0
+        self.closed = False
+        connection = self._connect()
+        connection.executescript(SCHEMA)
+        connection.commit()
+        self.writer = threading.Thread(target=self._writer_loop, daemon=True)
+        self.writer.start()
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=10.0, check_same_thread=False)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')  # Durable enough in WAL mode, far fewer fsyncs
+        return connection
+
+    def _reader(self):
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = self.local.connection = self._connect()
+        return connection
+
+    def record(self, camera_id, boxes, timestamp=None):
+        """Queue a detection for storage, never blocking the caller"""
+        if not boxes:
+            return
+        timestamp = time.time() if timestamp is None else timestamp
+        area = sum(int(w) * int(h) for _, _, w, h in boxes)
+        boxes_json = json.dumps([[int(v) for v in box] for box in boxes], separators=(',', ':'))
+        with self.condition:
+            if len(self.pending) >= self.max_pending:
+                self.dropped += 1
+                return
+            self.pending.append((str(camera_id), timestamp, len(boxes), area, boxes_json))
+            if len(self.pending) >= self.batch_size:
+                self.condition.notify()
+
+    def _writer_loop(self):
+        """Insert queued events in batched transactions"""
+        connection = self._connect()
+        while True:
+            with self.condition:
+                if not self.closed and len(self.pending) < self.batch_size:
+                    self.condition.wait(timeout=self.flush_interval)
+                batch = list(self.pending)
+                self.pending.clear()
+                closed = self.closed
+            if batch:
+                try:
+                    with connection:
+                        connection.executemany(
+                            'INSERT INTO events (camera_id, ts, box_count, area, boxes) VALUES (?, ?, ?, ?, ?)',
+                            batch
+                        )
+                    self.recorded += len(batch)
+                except sqlite3.Error as e:
+                    logger.error("[-] Error storing %d motion events: %s", len(batch), e)
+            if closed:
+                break
+        connection.close()
+
+    def query(self, camera_id=None, start=None, end=None, limit=100, cursor=None):
+        """Return (events, next_cursor) for a time range, newest first"""
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        clauses, params = [], []
+        if camera_id is not None:
+            clauses.append('camera_id = ?')
+            params.append(str(camera_id))
+        if start is not None:
+            clauses.append('ts >= ?')
+            params.append(float(start))
+        if end is not None:
+            clauses.append('ts < ?')
+            params.append(float(end))
+        if cursor:
+            cursor_ts, cursor_id = decode_cursor(cursor)
+            clauses.append('(ts, id) < (?, ?)')
+            params.extend((cursor_ts, cursor_id))
+        sql = 'SELECT id, camera_id, ts, box_count, area, boxes FROM events'
+        if clauses:
+            sql += ' WHERE ' + ' AND '.join(clauses)
+        sql += ' ORDER BY ts DESC, id DESC LIMIT ?'
+        params.append(limit + 1)  # One extra row tells whether another page exists
+        rows = self._reader().execute(sql, params).fetchall()
+        events = [{
+            'id': event_id,
+            'camera_id': event_camera_id,
+            'timestamp': ts,
+            'box_count': box_count,
+            'area': area,
+            'boxes': json.loads(boxes)
+        } for event_id, event_camera_id, ts, box_count, area, boxes in rows[:limit]]
+        next_cursor = None
+        if len(rows) > limit:
+            last = events[-1]
+            next_cursor = encode_cursor(last['timestamp'], last['id'])
+        return events, next_cursor
+
+    def close(self):
+        """Commit queued events and stop the writer"""
+        with self.condition:
+            if self.closed:
+                return
+            self.closed = True
+            self.condition.notify()
+        self.writer.join(timeout=10.0)
+
+    def stats(self):
+        return {'recorded': self.recorded, 'dropped': self.dropped, 'pending': len(self.pending)}
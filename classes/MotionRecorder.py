@@ -0,0 +1,290 @@
+# file: classes/MotionRecorder.py
+import logging
+import os
+import re
+import struct
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# Index record per frame: capture timestamp, byte offset in the segment, JPEG length
+INDEX_RECORD = struct.Struct('<dQI')
+
+SEGMENT_EXTENSION = '.mjpeg'
+INDEX_EXTENSION = '.idx'
+
+
+def safe_camera_dir(camera_id):
+    """Directory name for a camera id, keeping only filesystem-safe characters"""
+    return re.sub(r'[^A-Za-z0-9_.-]', '_', str(camera_id)) or 'camera'
+
+
+class PreRollBuffer:
+    """Fixed-memory ring of the most recent JPEG frames of one camera"""
+
+    def __init__(self, seconds=5.0, max_bytes=8 * 1024 * 1024):
+        self.seconds = seconds
+        self.max_bytes = max_bytes
+        self.frames = deque()  # (timestamp, jpeg bytes)
+        self.bytes = 0
+
+    def append(self, timestamp, data):
+        self.frames.append((timestamp, data))
+        self.bytes += len(data)
+        # Evict by age, then by size so a burst of large frames cannot grow the ring
+        while self.frames and (timestamp - self.frames[0][0] > self.seconds or self.bytes > self.max_bytes):
+            _, old = self.frames.popleft()
+            self.bytes -= len(old)
+
+    def drain(self):
+        """Remove and return all buffered frames, oldest first"""
+        frames = list(self.frames)
+        self.frames.clear()
+        self.bytes = 0
+        return frames
+
+    def __len__(self):
+        return len(self.frames)
+
+
+class _CameraState:
+    """Recording state of one camera, only touched by that camera's processing thread"""
+
+    def __init__(self, pre_roll, max_pre_roll_bytes):
+        self.pre_roll = PreRollBuffer(pre_roll, max_pre_roll_bytes)
+        self.recording = False
+        self.last_motion = 0.0
+
+
+class _Segment:
+    """Open segment files of one camera, only touched by the writer thread"""
+
+    def __init__(self, path, started):
+        self.path = path
+        self.started = started
+        self.data = open(path + SEGMENT_EXTENSION, 'ab')
+        self.index = open(path + INDEX_EXTENSION, 'ab')
+        self.offset = self.data.tell()
+        self.frames = 0
+
+    def write(self, timestamp, data):
+        self.data.write(data)
+        self.index.write(INDEX_RECORD.pack(timestamp, self.offset, len(data)))
+        self.offset += len(data)
+        self.frames += 1
+
+    def flush(self):
+        self.data.flush()
+        self.index.flush()
+
+    def close(self):
+        self.data.close()
+        self.index.close()
+
+
+class MotionRecorder:
+    """Record motion events to append-only MJPEG segments with a pre-roll and a post-roll.
+
+    Processing threads only append to in-memory buffers and a queue; a single writer thread
+    owns every open file, so disk latency never reaches frame ingest.
+    """
+
+    def __init__(self, directory='recordings', pre_roll=5.0, post_roll=5.0, max_pre_roll_bytes=8 * 1024 * 1024,
+                 max_pending_bytes=64 * 1024 * 1024, segment_seconds=300.0, flush_interval=1.0):
+        self.directory = directory
+        self.pre_roll = pre_roll  # Seconds of video kept before motion starts
+        self.post_roll = post_roll  # Seconds recorded after the last motion
+        self.max_pre_roll_bytes = max_pre_roll_bytes  # Memory cap of each camera's pre-roll ring
+        self.max_pending_bytes = max_pending_bytes  # Frames waiting for the writer beyond this are dropped
+        self.segment_seconds = segment_seconds  # Long events are split into segments of this length
+        self.flush_interval = flush_interval
+        self.cameras = {}
+        self.cameras_lock = threading.Lock()
+        self.queue = deque()  # ('open' | 'frame' | 'close', camera_id, timestamp, data)
+        self.condition = threading.Condition()
+        self.pending_bytes = 0
+        self.dropped_frames = 0
+        self.written_frames = 0
+        self.segments = 0
+        self.closed = False
+        os.makedirs(directory, exist_ok=True)
+        self.writer = threading.Thread(target=self._writer_loop, daemon=True)
+        self.writer.start()
+
+    def _state(self, camera_id):
+        state = self.cameras.get(camera_id)
+        if state is None:
+            with self.cameras_lock:
+                state = self.cameras.setdefault(camera_id, _CameraState(self.pre_roll, self.max_pre_roll_bytes))
+        return state
+
+    def _enqueue(self, kind, camera_id, timestamp, data=None):
+        with self.condition:
+            if kind == 'frame':
+                # Never block the caller: shed frames while the disk cannot keep up
+                if self.pending_bytes + len(data) > self.max_pending_bytes:
+                    self.dropped_frames += 1
+                    return
+                self.pending_bytes += len(data)
+            self.queue.append((kind, camera_id, timestamp, data))
+            self.condition.notify()
+
+    def add_frame(self, camera_id, data, timestamp=None):
+        """Buffer a camera JPEG, writing it out while an event is being recorded"""
+        timestamp = time.time() if timestamp is None else timestamp
+        state = self._state(camera_id)
+        if state.recording:
+            self._enqueue('frame', camera_id, timestamp, data)
+        else:
+            state.pre_roll.append(timestamp, data)
+
+    def update_motion(self, camera_id, motion, timestamp=None):
+        """Start or extend an event on motion, end it after the post-roll; return True when the state changed"""
+        timestamp = time.time() if timestamp is None else timestamp
+        state = self._state(camera_id)
+        if motion:
+            state.last_motion = timestamp
+            if not state.recording:
+                state.recording = True
+                frames = state.pre_roll.drain()
+                self._enqueue('open', camera_id, frames[0][0] if frames else timestamp)
+                for frame_time, data in frames:
+                    self._enqueue('frame', camera_id, frame_time, data)
+                return True
+        elif state.recording and timestamp - state.last_motion > self.post_roll:
+            state.recording = False
+            self._enqueue('close', camera_id, timestamp)
+            return True
+        return False
+
+    def is_recording(self, camera_id):
+        state = self.cameras.get(camera_id)
+        return state is not None and state.recording
+
+    def stop_camera(self, camera_id):
+        """End any event of a disconnected camera and free its pre-roll"""
+        with self.cameras_lock:
+            state = self.cameras.pop(camera_id, None)
+        if state is not None and state.recording:
+            self._enqueue('close', camera_id, time.time())
+
+    def _open_segment(self, camera_id, started):
+        camera_dir = os.path.join(self.directory, safe_camera_dir(camera_id))
+        os.makedirs(camera_dir, exist_ok=True)
+        name = time.strftime('%Y%m%d-%H%M%S', time.localtime(started)) + f'-{int(started * 1000) % 1000:03d}'
+        self.segments += 1
+        return _Segment(os.path.join(camera_dir, name), started)
+
+    def _writer_loop(self):
+        """Single writer thread owning every segment file"""
+        segments = {}
+        last_flush = time.monotonic()
+        while True:
+            with self.condition:
+                while not self.queue and not self.closed:
+                    self.condition.wait(timeout=self.flush_interval)
+                    if not self.queue:
+                        break
+                if not self.queue and self.closed:
+                    break
+                items = list(self.queue)
+                self.queue.clear()
+                self.pending_bytes -= sum(len(item[3]) for item in items if item[0] == 'frame')
+            for kind, camera_id, timestamp, data in items:
+                try:
+                    segment = segments.get(camera_id)
+                    if kind == 'open':
+                        if segment is None:
+                            segments[camera_id] = self._open_segment(camera_id, timestamp)
+                    elif kind == 'close':
+                        if segment is not None:
+                            segment.close()
+                            del segments[camera_id]
+                    else:
+                        if segment is None:
+                            continue  # Event already closed
+                        if timestamp - segment.started > self.segment_seconds:
+                            segment.close()
+                            segment = segments[camera_id] = self._open_segment(camera_id, timestamp)
+                        segment.write(timestamp, data)
+                        self.written_frames += 1
+                except OSError as e:
+                    logger.error("[-] Error writing recording for camera %s: %s", camera_id, e, extra={'camera': camera_id})
+            if time.monotonic() - last_flush >= self.flush_interval:
+                for segment in segments.values():
+                    segment.flush()
+                last_flush = time.monotonic()
+        for segment in segments.values():
+            segment.close()
+
+    def close(self):
+        """Write everything still queued and close all segments"""
+        with self.condition:
+            if self.closed:
+                return
+            self.closed = True
+            for camera_id, state in list(self.cameras.items()):
+                if state.recording:
+                    self.queue.append(('close', camera_id, time.time(), None))
+            self.condition.notify()
+        self.writer.join(timeout=10.0)
+
+    def stats(self):
+        return {
+            'segments': self.segments,
+            'written_frames': self.written_frames,
+            'dropped_frames': self.dropped_frames,
+            'pending_bytes': self.pending_bytes
+        }
+
+
+class SegmentReader:
+    """Random access to a recorded segment through its index, seeking by timestamp in O(log n)"""
+
+    def __init__(self, path):
+        # Accept the segment path with or without extension
+        self.path = os.path.splitext(path)[0] if path.endswith((SEGMENT_EXTENSION, INDEX_EXTENSION)) else path
+        with open(self.path + INDEX_EXTENSION, 'rb') as f:
+            index = f.read()
+        # Ignore a trailing partial record from a segment that is still being written
+        self.count = len(index) // INDEX_RECORD.size
+        self.index = memoryview(index)[:self.count * INDEX_RECORD.size]
+
+    def __len__(self):
+        return self.count
+
+    def entry(self, position):
+        """Return (timestamp, offset, length) of a frame"""
+        return INDEX_RECORD.unpack_from(self.index, position * INDEX_RECORD.size)
+
+    def seek(self, timestamp):
+        """Position of the first frame captured at or after the timestamp"""
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self.entry(middle)[0] < timestamp:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def frame(self, position):
+        """Return (timestamp, jpeg bytes) of a frame"""
+        timestamp, offset, length = self.entry(position)
+        with open(self.path + SEGMENT_EXTENSION, 'rb') as f:
+            f.seek(offset)
+            return timestamp, f.read(length)
+
+    def frames(self, start=None, end=None):
+        """Yield (timestamp, jpeg bytes) for frames between two timestamps"""
+        position = 0 if start is None else self.seek(start)
+        with open(self.path + SEGMENT_EXTENSION, 'rb') as f:
+            while position < self.count:
+                timestamp, offset, length = self.entry(position)
+                if end is not None and timestamp > end:
+                    break
+                f.seek(offset)
+                yield timestamp, f.read(length)
+                position += 1
@@ -0,0 +1,225 @@
+# file: classes/MotionWorkerPool.py
+import itertools
+import logging
+import multiprocessing as mp
+import os
+import threading
+import zlib
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from classes.FramePipeline import DEFAULT_TIER, FrameResult
+from classes.FrameRing import FrameRing
+
+logger = logging.getLogger(__name__)
+
+MAX_LATE_REQUESTS = 2  # Timed-out requests of one camera a worker may still be busy with before frames are dropped
+
+
+def _attach(name, cache):
+    """Attach to a shared memory block created by the parent, caching the handle"""
+    shm = cache.get(name)
+    if shm is None:
+        # Spawned workers share the parent's resource tracker, so the parent's unlink covers this handle
+        shm = shared_memory.SharedMemory(name=name)
+        cache[name] = shm
+    return shm
+
+
+def _worker_main(requests, results, codec_name):
+    """Worker process loop: decode, detect and encode frames for the cameras pinned to it"""
+    from classes.FramePipeline import process_frame
+    from classes.JpegCodec import create_codec
+    from classes.MotionDetector import detector_for
+
+    codec = create_codec(codec_name)
+    detectors = {}  # Per-camera detector state lives only in the worker the camera is pinned to
+    buffers = {}
+    while True:
+        request = requests.get()
+        if request is None:
+            break
+        camera_id, token, ring_name, slot_size, in_offset, length, inline, out_offsets, settings, scale, \
+            stream_mode, tiers, reuse = request
+        try:
+            ring = _attach(ring_name, buffers).buf
+            if inline is not None:
+                frame_data = inline
+            else:
+                frame_data = np.frombuffer(ring, np.uint8, count=length, offset=in_offset)
+            detector = detector_for(detectors, camera_id, settings)
+            result = process_frame(codec, detector, frame_data, settings, scale, stream_mode, tiers, reuse)
+            del frame_data
+            if result is None:
+                results.put((camera_id, token, None))
+                continue
+            # Each tier is encoded into one of the ring slots the parent reserved, overflow is sent inline
+            layout = []
+            for index, (tier, buffer) in enumerate(result.encoded.items()):
+                size = len(buffer)
+                if size <= slot_size:
+                    start = out_offsets[index]
+                    ring[start:start + size] = buffer.data
+                    layout.append((tier, index, size, None))
+                else:
+                    layout.append((tier, index, size, buffer.tobytes()))
+            del ring
+            results.put((camera_id, token, (result.boxes, result.width, result.height, layout,
+                                            result.detect_time, result.decode_time, result.encode_time)))
+        except Exception as e:
+            results.put((camera_id, token, e))
+    for shm in buffers.values():
+        shm.close()
+
+
+class _CameraSlots:
+    """In-flight request of one camera, and the frame ring of callers that do not bring their own"""
+
+    def __init__(self):
+        self.ring = None
+        self.future = None
+        self.token = 0
+
+    def release(self):
+        if self.ring is not None:
+            self.ring.close()
+
+
+class MotionWorkerPool:
+    """Process pool running decode + motion detection + encode with shared-memory frame hand-off.
+
+    Frames travel through the camera's FrameRing: the parent writes the camera's JPEG into one slot,
+    the worker encodes each quality tier into another and the parent hands out FrameRefs to them.
+    """
+
+    def __init__(self, workers=None, codec='auto', timeout=5.0):
+        self.workers = workers or os.cpu_count() or 1
+        self.timeout = timeout
+        self.context = mp.get_context('spawn')  # Processing threads already run, so never fork
+        self.results = self.context.Queue()
+        self.requests = []
+        self.processes = []
+        for _ in range(self.workers):
+            requests = self.context.Queue()
+            process = self.context.Process(target=_worker_main, args=(requests, self.results, codec), daemon=True)
+            process.start()
+            self.requests.append(requests)
+            self.processes.append(process)
+        self.slots = {}
+        self.tokens = itertools.count(1)  # Unique across cameras and reconnects, so late replies are never mistaken
+        self.late = {}  # token -> (camera_id, ring, slots) of timed-out requests, poisoned until the worker replies
+        self.lock = threading.Lock()
+        self.collector = threading.Thread(target=self._collect, daemon=True)
+        self.collector.start()
+        logger.info("[+] Started motion worker pool with %d processes", self.workers)
+
+    def worker_for(self, camera_id):
+        """Pin a camera to a worker so its detector state never moves"""
+        return zlib.crc32(str(camera_id).encode()) % self.workers
+
+    def _collect(self):
+        """Resolve the futures of finished frames"""
+        while True:
+            item = self.results.get()
+            if item is None:
+                break
+            camera_id, token, payload = item
+            with self.lock:
+                late = self.late.pop(token, None)
+                if late is None:
+                    slots = self.slots.get(camera_id)
+                    if slots is None or slots.token != token or slots.future is None:
+                        continue
+                    # Resolved under the lock so a timeout sees either the result or no reply at all
+                    if isinstance(payload, Exception):
+                        slots.future.set_exception(payload)
+                    else:
+                        slots.future.set_result(payload)
+                    continue
+            # The worker is done writing the slots of a request that timed out, they may be reused
+            _, ring, poisoned = late
+            ring.release(poisoned)
+
+    def process(self, camera_id, frame_data, settings, scale, stream_mode, tiers=(DEFAULT_TIER,), reuse=None,
+                ring=None, tag=b''):
+        """Run one frame through the pipeline in the camera's worker, returning a FrameResult or None.
+
+        Encoded tiers come back as FrameRefs into `ring`, the camera's FrameRing, or into one the
+        pool keeps for the camera when none is given, each with `tag` in front.
+        """
+        with self.lock:
+            slots = self.slots.get(camera_id)
+            if slots is None:
+                slots = self.slots[camera_id] = _CameraSlots()
+        if ring is None:
+            if slots.ring is None:
+                slots.ring = FrameRing()
+            ring = slots.ring
+        with self.lock:
+            late = sum(1 for late_camera, _, _ in self.late.values() if late_camera == camera_id)
+        if late >= MAX_LATE_REQUESTS:
+            return None  # The worker is still busy with frames that timed out, queueing more only adds delay
+        slots.token = next(self.tokens)
+        slots.future = Future()
+        length = len(frame_data)
+        inline = None
+        in_offset = None
+        if length <= ring.slot_size:
+            in_slot, _ = ring.reserve()
+            in_offset = ring.offset(in_slot)
+            ring.shm.buf[in_offset:in_offset + length] = frame_data
+        else:
+            ring.oversized += 1  # Sent to the worker as a copy
+            inline = bytes(frame_data)
+        # Reserved before the request so the worker writes where no reader can be looking
+        outputs = [ring.reserve() for _ in tiers]
+        self.requests[self.worker_for(camera_id)].put((
+            camera_id, slots.token, ring.name, ring.slot_size, in_offset, length, inline,
+            [ring.offset(slot) for slot, _ in outputs], dict(settings), scale, stream_mode, tuple(tiers), reuse
+        ))
+        future = slots.future
+        try:
+            payload = future.result(timeout=self.timeout)
+        except FutureTimeout:
+            logger.warning("[-] Motion worker timed out for camera %s", camera_id, extra={'camera': camera_id})
+            with self.lock:
+                slots.future = None
+                if not future.done():
+                    # The worker may still write into these slots, so they stay out of reuse until its late reply
+                    reserved = [slot for slot, _ in outputs] + ([in_slot] if inline is None else [])
+                    ring.poison(reserved)
+                    self.late[slots.token] = (camera_id, ring, reserved)
+            return None
+        finally:
+            slots.future = None
+        if payload is None:
+            return None
+        boxes, width, height, layout, detect_time, decode_time, encode_time = payload
+        encoded = {tier: inline if inline is not None else ring.commit(*outputs[index], size, tag)
+                   for tier, index, size, inline in layout}
+        return FrameResult(boxes, width, height, encoded, detect_time, decode_time, encode_time)
+
+    def release_camera(self, camera_id):
+        """Forget a disconnected camera, freeing the frame ring the pool kept for it"""
+        with self.lock:
+            slots = self.slots.pop(camera_id, None)
+        if slots is not None:
+            slots.release()
+
+    def shutdown(self):
+        """Stop the workers and free all shared memory"""
+        for requests in self.requests:
+            requests.put(None)
+        for process in self.processes:
+            process.join(timeout=2.0)
+            if process.is_alive():
+                process.terminate()
+        self.results.put(None)
+        with self.lock:
+            slots, self.slots = list(self.slots.values()), {}
+            self.late.clear()
+        for camera_slots in slots:
+            camera_slots.release()
+        logger.info("[+] Motion worker pool stopped")
@@ -0,0 +1,88 @@
+# file: classes/MotionZones.py
+import cv2
+import numpy as np
+
+ZONE_TYPES = ('include', 'exclude')
+MAX_ZONES = 16
+MAX_ZONE_POINTS = 64
+
+
+def normalize_zones(zones):
+    """Validate zones from the 'zones' motion setting, raising ValueError for malformed input.
+
+    Each zone is {"type": "include" | "exclude", "points": [[x, y], ...]} with at least three
+    points in frame-relative coordinates from 0 to 1, so zones survive resolution changes.
+    """
+    if zones is None:
+        return []
+    if not isinstance(zones, list):
+        raise ValueError("zones must be a list")
+    if len(zones) > MAX_ZONES:
+        raise ValueError(f"at most {MAX_ZONES} zones are supported")
+    normalized = []
+    for zone in zones:
+        if not isinstance(zone, dict):
+            raise ValueError("each zone must be an object with type and points")
+        zone_type = zone.get('type', 'include')
+        if zone_type not in ZONE_TYPES:
+            raise ValueError(f"zone type must be one of {', '.join(ZONE_TYPES)}")
+        points = zone.get('points')
+        if not isinstance(points, list) or not 3 <= len(points) <= MAX_ZONE_POINTS:
+            raise ValueError(f"a zone needs 3 to {MAX_ZONE_POINTS} points")
+        clean = []
+        for point in points:
+            try:
+                x, y = (float(value) for value in point)
+            except (TypeError, ValueError):
+                raise ValueError("zone points must be [x, y] pairs") from None
+            clean.append([min(max(x, 0.0), 1.0), min(max(y, 0.0), 1.0)])
+        normalized.append({'type': zone_type, 'points': clean})
+    return normalized
+
+
+class ZoneMask:
+    """Zones of one camera rasterised at the detection resolution, rebuilt only when they change.
+
+    The mask is cropped to the bounding rectangle of the watched area, so detection can blur,
+    difference and threshold that rectangle alone.
+    """
+
+    def __init__(self):
+        self.zones = None
+        self.shape = None
+        self.rect = None  # (x, y, w, h) of the watched area in the detection frame, None for the whole frame
+        self.mask = None  # uint8 mask of rect, 255 where motion counts, None when every pixel counts
+        self.builds = 0
+
+    def update(self, zones, shape):
+        """Return (rect, mask) for the zones at this frame shape, from cache when nothing changed"""
+        if zones != self.zones or shape != self.shape:
+            self.zones = zones
+            self.shape = shape
+            self.rect, self.mask = self.build(zones, shape)
+            self.builds += 1
+        return self.rect, self.mask
+
+    @staticmethod
+    def build(zones, shape):
+        if not zones:
+            return None, None
+        height, width = shape[:2]
+        scale = np.array([width - 1, height - 1], np.float32)
+        polygons = {zone_type: [np.round(np.array(zone['points'], np.float32) * scale).astype(np.int32)
+                                for zone in zones if zone['type'] == zone_type]
+                    for zone_type in ZONE_TYPES}
+        if polygons['include']:
+            mask = np.zeros((height, width), np.uint8)
+            cv2.fillPoly(mask, polygons['include'], 255)
+        else:
+            mask = np.full((height, width), 255, np.uint8)
+        if polygons['exclude']:
+            cv2.fillPoly(mask, polygons['exclude'], 0)
+        x, y, w, h = cv2.boundingRect(mask)
+        if w == 0 or h == 0:
+            return (0, 0, 0, 0), None  # Everything excluded
+        mask = np.ascontiguousarray(mask[y:y + h, x:x + w])
+        if (w, h) == (width, height) and cv2.countNonZero(mask) == w * h:
+            return None, None  # Zones cover the whole frame
+        return (x, y, w, h), mask
@@ -0,0 +1,189 @@
+# file: classes/PipelineProfiler.py
+import cProfile
+import io
+import logging
+import math
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+PROFILE_MODES = ('sample', 'cprofile')
+MAX_DURATION = 60.0  # Longest profiling window, in seconds
+MIN_INTERVAL = 0.001  # Shortest sampling interval, in seconds
+
+
+class ProfileRun:
+    """One profiling window of a camera's processing thread"""
+
+    def __init__(self, camera_id, mode, duration, interval):
+        self.camera_id = camera_id
+        self.mode = mode
+        self.duration = duration
+        self.interval = interval
+        self.started = time.time()
+        self.deadline = time.monotonic() + duration
+        self.profile = None  # cProfile.Profile, enabled inside the processing thread
+        self.samples = Counter()  # Sampled stacks, outermost frame first
+        self.sample_count = 0
+        self.done = False
+        self.report = None
+
+    def status(self):
+        return {
+            'camera_id': self.camera_id,
+            'mode': self.mode,
+            'duration': self.duration,
+            'started': self.started,
+            'done': self.done
+        }
+
+
+def parse_seconds(name, value):
+    """Parse a duration argument, raising ValueError unless it is a finite number"""
+    try:
+        seconds = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} must be a number of seconds") from None
+    if not math.isfinite(seconds):
+        raise ValueError(f"{name} must be finite")
+    return seconds
+
+
+def frame_label(frame):
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+class PipelineProfiler:
+    """Profile one camera's processing thread for a fixed window, on demand and without restarting.
+
+    'sample' mode reads the thread's stack from a separate thread every `interval` seconds, so the
+    pipeline itself pays nothing. 'cprofile' mode enables a deterministic profiler inside the
+    processing thread at its next checkpoint, giving exact call counts at a higher cost.
+    """
+
+    def __init__(self, thread_for=None):
+        self.thread_for = thread_for  # Callable returning the processing thread of a camera, or None
+        self.runs = {}  # camera_id -> latest ProfileRun
+        self.lock = threading.Lock()
+        self.on_complete = None  # Optional callable(run) invoked when a report is ready
+
+    def bind(self, thread_for, on_complete=None):
+        """Connect the profiler to the server that owns the processing threads"""
+        self.thread_for = thread_for
+        self.on_complete = on_complete
+
+    def start(self, camera_id, mode='sample', duration=10.0, interval=0.005):
+        """Start profiling a camera.
+
+        Raises ValueError for bad arguments and RuntimeError when the camera is not processing or
+        is already being profiled.
+        """
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Unknown profile mode '{mode}', expected one of {', '.join(PROFILE_MODES)}")
+        duration = min(max(parse_seconds('duration', duration), 0.1), MAX_DURATION)
+        interval = max(parse_seconds('interval', interval), MIN_INTERVAL)
+        thread = self.thread_for(camera_id) if self.thread_for is not None else None
+        if thread is None or not thread.is_alive():
+            raise RuntimeError(f"Camera {camera_id} has no running processing thread")
+        with self.lock:
+            current = self.runs.get(camera_id)
+            if current is not None and not current.done:
+                raise RuntimeError(f"Camera {camera_id} is already being profiled")
+            run = self.runs[camera_id] = ProfileRun(camera_id, mode, duration, interval)
+        if mode == 'sample':
+            threading.Thread(target=self._sample, args=(run, thread.ident), daemon=True).start()
+        logger.info("[+] Profiling camera %s for %.1fs (%s)", camera_id, duration, mode, extra={'camera': camera_id})
+        return run
+
+    def checkpoint(self, camera_id, final=False):
+        """Called by the processing thread once per loop and when it exits, enables or finishes cProfile runs"""
+        run = self.runs.get(camera_id)
+        if run is None or run.done or run.mode != 'cprofile':
+            return
+        if run.profile is None:
+            if final:
+                self._finish(run, self._header(run) + "Processing stopped before profiling started\n")
+                return
+            run.profile = cProfile.Profile()
+            run.profile.enable()
+        elif final or time.monotonic() >= run.deadline:
+            run.profile.disable()
+            self._finish(run, self._cprofile_report(run))
+
+    def _sample(self, run, ident):
+        """Sampling thread: record the processing thread's stack until the window closes"""
+        while time.monotonic() < run.deadline:
+            frame = sys._current_frames().get(ident)
+            if frame is None:
+                break  # Processing thread exited
+            stack = []
+            while frame is not None:
+                stack.append(frame_label(frame))
+                frame = frame.f_back
+            run.samples[tuple(reversed(stack))] += 1
+            run.sample_count += 1
+            del frame
+            time.sleep(run.interval)
+        self._finish(run, self._sample_report(run))
+
+    def _finish(self, run, report):
+        run.report = report
+        run.done = True
+        logger.info("[+] Profile of camera %s ready", run.camera_id, extra={'camera': run.camera_id})
+        if self.on_complete is not None:
+            try:
+                self.on_complete(run)
+            except Exception as e:
+                logger.exception("[-] Error announcing profile report: %s", e, extra={'camera': run.camera_id})
+
+    def _header(self, run):
+        started = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(run.started))
+        return f"Camera {run.camera_id} - {run.mode} profile of {run.duration:.1f}s started {started}\n\n"
+
+    def _cprofile_report(self, run):
+        output = io.StringIO()
+        output.write(self._header(run))
+        stats = pstats.Stats(run.profile, stream=output)
+        stats.sort_stats('cumulative').print_stats(40)
+        stats.sort_stats('tottime').print_stats(20)
+        return output.getvalue()
+
+    def _sample_report(self, run):
+        total = run.sample_count
+        output = io.StringIO()
+        output.write(self._header(run))
+        output.write(f"{total} samples every {run.interval * 1000:.1f} ms\n\n")
+        if not total:
+            return output.getvalue()
+        leaf, inclusive = Counter(), Counter()
+        for stack, count in run.samples.items():
+            leaf[stack[-1]] += count
+            for label in set(stack):
+                inclusive[label] += count
+        output.write("Self time (innermost frame)\n")
+        for label, count in leaf.most_common(25):
+            output.write(f"{count * 100.0 / total:6.1f}%  {count:6d}  {label}\n")
+        output.write("\nTotal time (anywhere on the stack)\n")
+        for label, count in inclusive.most_common(25):
+            output.write(f"{count * 100.0 / total:6.1f}%  {count:6d}  {label}\n")
+        # Folded stacks, the input format of flamegraph.pl and speedscope
+        output.write("\nFolded stacks\n")
+        for stack, count in run.samples.most_common():
+            output.write(f"{';'.join(stack)} {count}\n")
+        return output.getvalue()
+
+    def status(self, camera_id):
+        """Return the state of the camera's latest run, or None"""
+        run = self.runs.get(camera_id)
+        return run.status() if run is not None else None
+
+    def report(self, camera_id):
+        """Return the latest finished report of a camera, or None"""
+        run = self.runs.get(camera_id)
+        return run.report if run is not None and run.done else None
@@ -0,0 +1,127 @@
+# file: classes/SettingsStore.py
+import asyncio
+import json
+import logging
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class SettingsStore:
+    """Write-behind settings file: changes are debounced, written off the event loop and replaced atomically"""
+
+    def __init__(self, path, snapshot, delay=1.0, max_delay=5.0):
+        self.path = path
+        self.snapshot = snapshot  # Callable returning the settings dictionary to persist
+        self.delay = delay  # Quiet time after the last change before writing
+        self.max_delay = max_delay  # Longest a change may wait while changes keep arriving
+        self.executor = ThreadPoolExecutor(max_workers=1)  # Single writer keeps writes in order
+        self.write_lock = threading.Lock()
+        self.timer = None
+        self.first_pending = None  # Loop time of the oldest change not yet written
+        self.last_written = None  # Serialized settings currently on disk
+        self.requests = 0  # Number of save requests
+        self.writes = 0  # Number of files actually written
+        self.skipped = 0  # Number of flushes skipped because nothing changed
+        self.closed = False  # Set by close, later saves are written synchronously
+
+    def load(self):
+        """Read the settings file, raising FileNotFoundError when there is none"""
+        with open(self.path, 'r') as f:
+            text = f.read()
+        settings = json.loads(text)
+        self.last_written = self.serialize(settings)
+        return settings
+
+    @staticmethod
+    def serialize(settings):
+        return json.dumps(settings, sort_keys=True)
+
+    def mark_dirty(self):
+        """Request a save; the write happens once changes stop arriving for `delay` seconds"""
+        self.requests += 1
+        if self.closed:
+            self.flush()  # The writer thread is gone
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # Not on the event loop, nothing to debounce with
+            self.flush()
+            return
+        now = loop.time()
+        if self.first_pending is None:
+            self.first_pending = now
+        if self.timer is not None:
+            self.timer.cancel()
+        when = min(now + self.delay, self.first_pending + self.max_delay)
+        self.timer = loop.call_at(when, self._flush_later, loop)
+
+    def _flush_later(self, loop):
+        """Timer callback: snapshot on the loop, write in the writer thread"""
+        if self.closed:
+            return  # close already flushed
+        self.timer = None
+        self.first_pending = None
+        text = self._pending_text()
+        if text is not None:
+            loop.run_in_executor(self.executor, self._write, text)
+
+    def _pending_text(self):
+        """Serialize the current settings, or return None when they match the file"""
+        try:
+            text = self.serialize(self.snapshot())
+        except Exception as e:
+            logger.error("[-] Error serializing settings: %s", e)
+            return None
+        if text == self.last_written:
+            self.skipped += 1
+            return None
+        self.last_written = text
+        return text
+
+    def _write(self, text):
+        """Write to a temporary file next to the target and rename it over the target"""
+        directory = os.path.dirname(os.path.abspath(self.path))
+        with self.write_lock:
+            fd, tmp_path = tempfile.mkstemp(prefix='.settings-', suffix='.tmp', dir=directory)
+            try:
+                with os.fdopen(fd, 'w') as f:
+                    f.write(text)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, self.path)
+                self.writes += 1
+                logger.info("[+] Settings saved successfully")
+            except Exception as e:
+                logger.error("[-] Error saving settings: %s", e)
+                self.last_written = None  # Retry on the next flush
+                try:
+                    os.unlink(tmp_path)
+                except OSError:
+                    pass
+
+    def flush(self):
+        """Write pending changes now, blocking the caller"""
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        self.first_pending = None
+        text = self._pending_text()
+        if text is not None:
+            self._write(text)
+
+    def close(self):
+        """Let queued writes finish, then flush pending changes"""
+        self.closed = True
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        self.executor.shutdown(wait=True)
+        self.flush()
+
+    def stats(self):
+        return {'requests': self.requests, 'writes': self.writes, 'skipped': self.skipped}
@@ -0,0 +1,141 @@
+# file: classes/StatusPublisher.py
+import asyncio
+import json
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class StatusPublisher:
+    """Coalesce device status changes and push them to web clients as rate-limited deltas"""
+
+    def __init__(self, server, max_rate=2.0, report_interval=60.0, metrics_interval=5.0):
+        self.server = server
+        self.interval = 1.0 / max_rate  # Minimum time between two flushes
+        self.report_interval = report_interval
+        self.metrics_interval = metrics_interval  # Seconds between pipeline metrics summaries
+        self.dirty = False
+        self.last_sent = {}  # Status as last published, used to compute deltas
+        self.requests = 0  # Number of times a status update was requested
+        self.flushes = 0  # Number of delta broadcasts actually sent
+        self.task = None
+
+    @property
+    def coalesced(self):
+        """Number of requested broadcasts that were merged into another flush"""
+        return max(0, self.requests - self.flushes)
+
+    def mark_dirty(self):
+        """Request a status broadcast, safe to call from any thread"""
+        self.requests += 1
+        self.dirty = True
+
+    def snapshot(self):
+        """Copy the device status, rounding noisy fields so unchanged values compare equal"""
+        status = self.server.device_status
+        cameras = {}
+        for camera_id, info in list(status['cameras'].items()):
+            info = dict(info)
+            if 'fps' in info:
+                info['fps'] = round(info['fps'], 1)
+            if 'last_seen' in info:
+                info['last_seen'] = int(info['last_seen'])
+            cameras[camera_id] = info
+        snapshot = dict(status)
+        snapshot['cameras'] = cameras
+        return snapshot
+
+    def snapshot_message(self):
+        """Full status message sent to a client when it connects"""
+        return json.dumps({
+            "type": "status",
+            "data": self.snapshot()
+        }, separators=(',', ':'))
+
+    def compute_delta(self, current):
+        """Return only the fields that changed since the last flush"""
+        delta = {}
+        previous_cameras = self.last_sent.get('cameras', {})
+        camera_changes = {}
+        for camera_id, info in current['cameras'].items():
+            previous = previous_cameras.get(camera_id, {})
+            changed = {key: value for key, value in info.items() if key not in previous or previous[key] != value}
+            changed.update((key, None) for key in previous if key not in info)  # Field removed
+            if changed:
+                camera_changes[camera_id] = changed
+        for camera_id in previous_cameras:
+            if camera_id not in current['cameras']:
+                camera_changes[camera_id] = None  # Camera removed
+        if camera_changes:
+            delta['cameras'] = camera_changes
+        for key, value in current.items():
+            if key != 'cameras' and self.last_sent.get(key) != value:
+                delta[key] = value
+        return delta
+
+    async def flush(self):
+        """Send pending changes to all web clients as one compact delta"""
+        self.dirty = False
+        current = self.snapshot()
+        delta = self.compute_delta(current)
+        self.last_sent = current
+        if not delta:
+            return
+        self.flushes += 1
+        message = json.dumps({
+            "type": "status_delta",
+            "data": delta
+        }, separators=(',', ':'))
+        await self.server.broadcast_to_web_clients(message)
+
+    async def publish_metrics(self):
+        """Send the pipeline metrics summary to all web clients"""
+        metrics = getattr(self.server, 'metrics', None)
+        if metrics is None or not self.server.web_clients:
+            return
+        summary = metrics.summary()
+        summary['viewers'] = self.server.get_viewer_stats()  # Send lag and drops of each web client
+        message = json.dumps({
+            "type": "metrics",
+            "data": summary
+        }, separators=(',', ':'))
+        await self.server.broadcast_to_web_clients(message, key='metrics')
+
+    async def run(self):
+        """Flush dirty status at most max_rate times per second"""
+        last_report = time.time()
+        last_metrics = time.time()
+        while True:
+            try:
+                if self.dirty:
+                    await self.flush()
+                if time.time() - last_metrics >= self.metrics_interval:
+                    last_metrics = time.time()
+                    await self.publish_metrics()
+                if time.time() - last_report >= self.report_interval:
+                    last_report = time.time()
+                    logger.info("[+] Status publisher: %d broadcasts sent, %d coalesced", self.flushes, self.coalesced)
+            except Exception as e:
+                logger.exception("[-] Error publishing status: %s", e)
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        """Start the publisher task on the running event loop"""
+        if self.task is None or self.task.done():
+            self.task = asyncio.get_running_loop().create_task(self.run())
+        return self.task
+
+    def stop(self):
+        """Cancel the publisher task"""
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+    def stats(self):
+        """Return publisher counters"""
+        return {
+            'requests': self.requests,
+            'flushes': self.flushes,
+            'coalesced': self.coalesced
+        }
@@ -0,0 +1,91 @@
+# file: classes/ThumbnailCache.py
+import itertools
+import os
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+THUMBNAIL_TIER = 'thumb'  # Quality tier stored as each camera's preview
+
+# A camera preview as refreshed by the processing pipeline
+Thumbnail = namedtuple('Thumbnail', ['seq', 'timestamp', 'data', 'etag'])
+
+
+class ThumbnailCache:
+    """Low-rate thumbnail of every camera for previews, capped in memory with least-recently-used eviction.
+
+    Processing threads store a camera's thumb tier at most once every `interval` seconds. Reads and
+    refreshes both count as use, so the cameras evicted first are those nobody previews and that
+    stopped sending frames.
+    """
+
+    def __init__(self, max_bytes=2 * 1024 * 1024, interval=2.0):
+        self.max_bytes = max_bytes
+        self.interval = interval  # Seconds between refreshes of one camera's thumbnail
+        self.entries = OrderedDict()  # camera_id -> Thumbnail, least recently used first
+        self.refreshed = {}  # camera_id -> monotonic time of the last refresh, kept across evictions
+        self.bytes = 0
+        self.lock = threading.Lock()
+        self.boot_id = os.urandom(4).hex()  # Keeps ETags from matching across server restarts
+        self.counter = itertools.count(1)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def due(self, camera_id):
+        """True when the camera's thumbnail should be refreshed from its next frame"""
+        return time.monotonic() - self.refreshed.get(camera_id, float('-inf')) >= self.interval
+
+    def put(self, camera_id, data, timestamp=None):
+        """Store a camera's new thumbnail, evicting least recently used ones over the memory cap.
+
+        Returns None without storing anything when there is no data or it alone exceeds the cap.
+        """
+        if data is None:
+            return None
+        data = bytes(data)  # Outlives the frame ring slot it may come from
+        if len(data) > self.max_bytes:
+            return None
+        with self.lock:
+            seq = next(self.counter)
+            thumbnail = Thumbnail(seq, time.time() if timestamp is None else timestamp, data,
+                                  f"{self.boot_id}-t{seq}")
+            previous = self.entries.pop(camera_id, None)
+            if previous is not None:
+                self.bytes -= len(previous.data)
+            self.entries[camera_id] = thumbnail
+            self.bytes += len(data)
+            self.refreshed[camera_id] = time.monotonic()
+            while self.bytes > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.bytes -= len(evicted.data)
+                self.evictions += 1
+        return thumbnail
+
+    def get(self, camera_id):
+        """Return a camera's thumbnail, or None"""
+        with self.lock:
+            thumbnail = self.entries.get(camera_id)
+            if thumbnail is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(camera_id)
+            self.hits += 1
+            return thumbnail
+
+    def discard(self, camera_id):
+        """Forget a camera's thumbnail"""
+        with self.lock:
+            thumbnail = self.entries.pop(camera_id, None)
+            if thumbnail is not None:
+                self.bytes -= len(thumbnail.data)
+            self.refreshed.pop(camera_id, None)
+
+    def stats(self):
+        return {
+            'entries': len(self.entries),
+            'bytes': self.bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions
+        }
@@ -0,0 +1,163 @@
+# file: classes/ViewerChannel.py
+import asyncio
+import logging
+import time
+from collections import deque
+
+import websockets.exceptions
+
+from classes.FrameRing import FrameRef
+from classes.Metrics import Histogram
+
+logger = logging.getLogger(__name__)
+
+
+def viewer_name(websocket):
+    """host:port of a web client, used to key its send statistics"""
+    address = getattr(websocket, 'remote_address', None)
+    if isinstance(address, (tuple, list)) and len(address) >= 2:
+        return f"{address[0]}:{address[1]}"
+    return str(address or id(websocket))
+
+
+class ViewerChannel:
+    """Bounded outbound queue and sender task for one web client"""
+
+    def __init__(self, websocket, max_frames=2, max_lag=2.0, policy='skip', lag_histogram=None, max_control=64):
+        self.websocket = websocket
+        self.frames_per_stream = max(1, int(max_frames))
+        self.max_frames = self.frames_per_stream  # Frames waiting to be sent before the oldest is dropped
+        self.max_lag = max_lag  # Seconds a frame may wait before the slow-consumer policy applies
+        self.policy = policy  # 'skip' drops stale frames, 'disconnect' closes the connection
+        self.frames = deque()  # (queued_at, messages) tuples, droppable
+        self.control = deque()  # (key, message) of status, settings and other messages that are never dropped
+        self.max_control = max_control  # Undelivered control messages before the client is disconnected
+        self.wakeup = asyncio.Event()
+        self.task = None
+        self.closed = False
+        self.frames_sent = 0
+        self.frames_dropped = 0
+        self.bytes_sent = 0
+        self.last_lag = 0.0  # Queue delay of the most recently sent frame
+        self.max_lag_seen = 0.0
+        self.lag_histogram = lag_histogram  # Optional Histogram observing the queue delay of every frame
+        self.lag = Histogram()  # Queue delay of this client's frames, for per-viewer lag quantiles
+
+    def start(self):
+        """Start the sender task on the running event loop"""
+        if self.task is None:
+            self.task = asyncio.get_running_loop().create_task(self.run())
+        return self.task
+
+    def set_streams(self, count):
+        """Size the frame queue for a client following several cameras, so one camera cannot crowd out another"""
+        self.max_frames = self.frames_per_stream * max(1, count)
+
+    def send(self, message, key=None):
+        """Queue a control message, delivered in order and never dropped.
+
+        A message with a key replaces the queued message with the same key, so periodic messages
+        such as thumbnails and metrics summaries do not pile up for a stalled client.
+        """
+        if self.closed:
+            return
+        if key is not None:
+            for index, (queued_key, _) in enumerate(self.control):
+                if queued_key == key:
+                    self.control[index] = (key, message)
+                    return
+        if len(self.control) >= self.max_control:
+            # Skipping status deltas or replies would leave the client out of sync, it resyncs on reconnect
+            logger.warning("[-] Disconnecting stalled web client, %d control messages undelivered", len(self.control))
+            self.abort()
+            return
+        self.control.append((key, message))
+        self.wakeup.set()
+
+    def send_frame(self, *messages):
+        """Queue a frame (with any metadata sent just before it), dropping the oldest frame when full"""
+        if self.closed:
+            return False
+        self.frames.append((time.monotonic(), messages))
+        while len(self.frames) > self.max_frames:
+            self.frames.popleft()
+            self.frames_dropped += 1
+        self.wakeup.set()
+        return True
+
+    async def run(self):
+        """Drain the queues, control messages first, until the connection closes"""
+        try:
+            while not self.closed:
+                await self.wakeup.wait()
+                self.wakeup.clear()
+                while self.control or self.frames:
+                    if self.control:
+                        await self.websocket.send(self.control.popleft()[1])
+                        continue
+                    queued_at, messages = self.frames.popleft()
+                    lag = time.monotonic() - queued_at
+                    self.lag.observe(lag)
+                    if self.lag_histogram is not None:
+                        self.lag_histogram.observe(lag)
+                    if lag > self.max_lag:
+                        if self.policy == 'disconnect':
+                            logger.warning("[-] Disconnecting slow web client, frame lag %.2fs", lag)
+                            await self.websocket.close(code=1013, reason='Viewer too slow')
+                            return
+                        self.frames_dropped += 1
+                        continue
+                    if not await self.send_messages(messages):
+                        self.frames_dropped += 1  # Overwritten in the camera's ring while queued
+                        continue
+                    self.frames_sent += 1
+                    self.last_lag = lag
+                    self.max_lag_seen = max(self.max_lag_seen, lag)
+        except websockets.exceptions.ConnectionClosed:
+            pass
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.warning("[-] Error sending to web client: %s", e)
+        finally:
+            self.closed = True
+            self.frames.clear()
+            self.control.clear()
+
+    async def send_messages(self, messages):
+        """Send one frame's messages, False if its JPEG left the camera's ring before it went out"""
+        for message in messages:
+            if isinstance(message, FrameRef):
+                # Sent straight from shared memory, the websocket copies it before send first yields
+                message = message.view()
+                if message is None:
+                    return False
+            await self.websocket.send(message)
+            self.bytes_sent += len(message)
+        return True
+
+    def abort(self):
+        """Close the connection of a client that stopped reading, the server unregisters it when it ends"""
+        self.close()
+        asyncio.ensure_future(self.websocket.close(code=1013, reason='Viewer too slow'))
+
+    def close(self):
+        """Stop the sender task and discard pending messages"""
+        self.closed = True
+        self.frames.clear()
+        self.control.clear()
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+    def stats(self):
+        """Return per-viewer send counters"""
+        return {
+            'frames_sent': self.frames_sent,
+            'frames_dropped': self.frames_dropped,
+            'bytes_sent': self.bytes_sent,
+            'pending': len(self.frames),
+            'last_lag': round(self.last_lag, 4),
+            'lag_p95': self.lag.quantile(0.95),
+            'max_lag': round(self.max_lag_seen, 4)
+        }
@@ -0,0 +1,54 @@
+# file: classes/ViewerSubscriptions.py
+from classes.FramePipeline import DEFAULT_TIER, QUALITY_TIERS
+
+MAX_SUBSCRIPTIONS = 64  # Cameras one web client may follow at once
+
+
+class Subscription:
+    """One camera followed by a multiplexed web client, in its own tier and at most max_fps frames per second"""
+    __slots__ = ('tier', 'max_fps', 'interval', 'next_due')
+
+    def __init__(self, tier=DEFAULT_TIER, max_fps=None):
+        self.tier = tier if tier in QUALITY_TIERS else DEFAULT_TIER
+        self.max_fps = max_fps if max_fps and max_fps > 0 else None
+        self.interval = 1.0 / self.max_fps if self.max_fps else 0.0
+        self.next_due = 0.0
+
+    def due(self, now):
+        """True when a frame may be sent at monotonic time now, claiming the send"""
+        if now < self.next_due:
+            return False
+        # Keep the average rate against camera frame jitter, without a burst after a gap
+        self.next_due += self.interval
+        if self.next_due < now:
+            self.next_due = now + self.interval
+        return True
+
+    def to_dict(self):
+        return {'tier': self.tier, 'max_fps': self.max_fps}
+
+
+def parse_subscriptions(cameras, known=None):
+    """Build {camera_id: Subscription} from a subscribe message's `cameras`.
+
+    Accepts a mapping of camera id to {'tier', 'max_fps'} or a list of camera ids, dropping cameras
+    not in `known` when given. Raises ValueError for anything else.
+    """
+    if isinstance(cameras, list):
+        cameras = {camera_id: {} for camera_id in cameras}
+    if not isinstance(cameras, dict):
+        raise ValueError("cameras must be a list of camera ids or an object keyed by camera id")
+    subscriptions = {}
+    for camera_id, options in cameras.items():
+        if known is not None and camera_id not in known:
+            continue
+        if len(subscriptions) >= MAX_SUBSCRIPTIONS:
+            break
+        options = options if isinstance(options, dict) else {}
+        max_fps = options.get('max_fps')
+        try:
+            max_fps = float(max_fps) if max_fps is not None else None
+        except (TypeError, ValueError):
+            raise ValueError(f"invalid max_fps for camera {camera_id}")
+        subscriptions[camera_id] = Subscription(options.get('tier', DEFAULT_TIER), max_fps)
+    return subscriptions
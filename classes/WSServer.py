@@ -3,69 +3,117 @@ import asyncio
 import websockets
 import json
 import time
-import cv2
-import numpy as np
 from collections import deque
-from io import BytesIO
-import base64
-from concurrent.futures import ThreadPoolExecutor
-from queue import Queue, Empty
-import threading
-import cProfile
-import pstats
-from functools import wraps
+from queue import Empty
 import logging
 
-# Set up logging
-logging.basicConfig(level=logging.INFO)  # Change to INFO for less verbose logging
+from classes.CameraRegistry import CameraRegistry
+from classes.CameraThrottle import DEFAULT_FRAME_INTERVAL, CameraThrottle
+from classes.DetectionScheduler import DetectionScheduler
+from classes.FrameBus import BusServer
+from classes.FramePipeline import (DEFAULT_TIER, QUALITY_TIERS, FrameResult, draw_boxes, prepare_detection_frame,
+                                   process_frame)
+from classes.FrameRing import FrameRef, pack_tag, tag_frame
+from classes.JpegCodec import create_codec, detection_scale_for, jpeg_size_bound
+from classes.Metrics import Metrics
+from classes.MotionDetector import ENGINES, ensure_detector
+from classes.MotionRecorder import MotionRecorder
+from classes.MotionZones import normalize_zones
+from classes.MotionWorkerPool import MotionWorkerPool
+from classes.PipelineProfiler import PipelineProfiler
+from classes.SettingsStore import SettingsStore
+from classes.ThumbnailCache import THUMBNAIL_TIER
+from classes.StatusPublisher import StatusPublisher
+from classes.ViewerChannel import ViewerChannel, viewer_name
+from classes.ViewerSubscriptions import parse_subscriptions
+
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.INFO)
 
-def profile_function(func):
-    @wraps(func)
-    def wrapper(*args, **kwargs):
-        profiler = cProfile.Profile()
-        try:
-            return profiler.runcall(func, *args, **kwargs)
-        finally:
-            stats = pstats.Stats(profiler)
-            stats.sort_stats('cumulative')
-            # Only print top 5 time-consuming operations
-            stats.print_stats(5)
-    return wrapper
+# Motion setting names used by the web UI and their server-side equivalents
+MOTION_SETTING_ALIASES = {
+    'minArea': 'min_area',
+    'blurSize': 'blur_size',
+    'maxFps': 'max_fps',
+    'learningRate': 'learning_rate'
+}
 
 class WSServer:
-    def __init__(self, host='0.0.0.0', port=5000):
+    DEMAND_READ_WINDOW = 10.0  # Seconds an HTTP snapshot or MJPEG read keeps a camera in demand
+
+    def __init__(self, host='0.0.0.0', port=5000, frame_queue_depth=1, stream_mode='annotated', codec='auto',
+                 status_max_rate=2.0, viewer_queue_size=2, viewer_max_lag=2.0, slow_viewer_policy='skip',
+                 detection_backend='thread', detection_workers=None, settings_file='camera_settings.json',
+                 settings_save_delay=1.0, recording_dir=None, pre_roll=5.0, post_roll=5.0,
+                 event_store=None, frame_buffer=None, metrics=None, profiler=None, idle_stride=5, active_hold=10.0,
+                 detect_cpu_budget=None, throttle_idle_delay=None, log_rate_limit=None,
+                 bus_path=None, ring_slots=32, ring_slot_size=384 * 1024, ring_release_delay=30.0, thumbnails=None):
         self.host = host
         self.port = port
+        self.frame_queue_depth = frame_queue_depth  # Pending frames kept per camera, newer frames overwrite older ones
+        # 'annotated' re-encodes frames with boxes drawn in, 'passthrough' forwards the camera JPEG
+        # untouched and sends the boxes as a separate motion message
+        self.stream_mode = stream_mode
+        self.codec = create_codec(codec)  # JPEG decode/encode backend
+        self.detection_width = 320  # Minimum width of the reduced grayscale frame used for detection
+        self.status_publisher = StatusPublisher(self, max_rate=status_max_rate)  # Coalesces status broadcasts
+        # 'thread' runs the decode/detect/encode stage in each camera's thread, 'process' runs it
+        # in a pool of worker processes fed through shared memory
+        self.detection_backend = detection_backend
+        self.worker_pool = None
+        if detection_backend == 'process':
+            self.worker_pool = MotionWorkerPool(workers=detection_workers, codec=codec)
+        # Motion events are recorded to MJPEG segments when a recording directory is set
+        self.recorder = None
+        if recording_dir:
+            self.recorder = MotionRecorder(recording_dir, pre_roll=pre_roll, post_roll=post_roll)
+        self.event_store = event_store  # MotionEventStore receiving every detection, shared with the Flask API
+        # Quiet cameras are only checked every few frames, busy ones at full rate within a CPU budget
+        self.scheduler = DetectionScheduler(idle_stride=idle_stride, active_hold=active_hold, cpu_budget=detect_cpu_budget)
+        self.frame_buffer = frame_buffer  # LatestFrameBuffer read by the Flask snapshot and MJPEG routes
+        # ThumbnailCache of every camera's preview, refreshed at a low rate and served to the camera list
+        self.thumbnails = thumbnails
+        # Cameras nobody watches, records or sees motion on drop to a low-power profile after this many seconds
+        self.throttle = None
+        self.throttle_task = None
+        if throttle_idle_delay is not None:
+            self.throttle = CameraThrottle(idle_delay=throttle_idle_delay)
+        self.remote_demand = {}  # camera_id -> monotonic time an HTTP process last reported reading it
+        # In the split deployment fan-out and HTTP processes take frames and status from this bus
+        self.bus = BusServer(self, bus_path) if bus_path else None
+        self.metrics = metrics if metrics is not None else Metrics()  # Per-stage latency and byte counters
+        self.metrics.add_collector(self.collect_metrics)
+        # On-demand profiling of a camera's processing thread, controlled over WS or HTTP
+        self.profiler = profiler if profiler is not None else PipelineProfiler()
+        self.profiler.bind(self.processing_thread_for, self.announce_profile)
+        self.profile_requesters = {}  # camera_id -> web clients waiting for the profile report
         self.server = None
         self.clients = set()
-        self.camera_clients = {}  # Dictionary to store camera clients with their IDs
+        # Camera sessions indexed by id and by websocket, each with a fixed-size shared memory ring of
+        # its encoded frames that viewers, HTTP clients and motion workers read in place
+        self.cameras = CameraRegistry(frame_queue_depth, ring_slots=ring_slots, ring_slot_size=ring_slot_size)
+        self.ring_release_delay = ring_release_delay  # Seconds a disconnected camera keeps its frame ring
         self.web_clients = {}  # Dictionary to store web clients with their selected cameras
+        self.viewer_channels = {}  # Dictionary to store the outbound send queue of each web client
+        self.viewer_tiers = {}  # Quality tier each web client subscribed to, DEFAULT_TIER when absent
+        # Web clients following several cameras over one connection -> {camera_id: Subscription}; they
+        # receive tagged frames of those cameras only, whatever camera they selected for settings
+        self.viewer_subscriptions = {}
+        # camera_id (None for clients without a selection) -> tiers with subscribers, replaced
+        # wholesale on the event loop so processing threads can read it without a lock
+        self.tier_subscribers = {}
+        self.viewer_queue_size = viewer_queue_size  # Frames queued per web client before the oldest is dropped
+        self.viewer_max_lag = viewer_max_lag  # Seconds a frame may wait for a web client before it is skipped
+        self.slow_viewer_policy = slow_viewer_policy  # 'skip' stale frames or 'disconnect' the slow client
         self.commands_queue = deque(maxlen=10)  # Store recent commands for new clients
         self.device_status = {
             'cameras': {},  # Dictionary to store camera statuses
             'web_clients': 0
         }
-        # Initialize OpenCV variables with per-camera settings
-        self.prev_frames = {}  # Dictionary to store previous frames for each camera
-        self.frame_queues = {}  # Dictionary to store frame queues for each camera
-        self.processing_threads = {}  # Dictionary to store processing threads for each camera
-        self.stop_processing = {}  # Dictionary to store stop flags for each camera
-        self.thread_locks = {}  # Dictionary to store thread locks for each camera
-        self.frame_counts = {}  # Dictionary to store frame counts for each camera
-        self.last_fps_update = {}  # Dictionary to store last FPS update time for each camera
-        self.fps = {}  # Dictionary to store FPS for each camera
-        self.frame_times = {}  # Dictionary to store frame processing times for each camera
-        self.last_frame_time = {}  # Dictionary to store last frame time for each camera
-        self.thread_pool = ThreadPoolExecutor(max_workers=4)  # Thread pool for processing frames
         self.loop = asyncio.new_event_loop()  # Create a new event loop
         asyncio.set_event_loop(self.loop)  # Set it as the current event loop
         
-        # Set up logging
-        logging.basicConfig(level=logging.INFO)  # Change to INFO for less verbose logging
-        self.logger = logging.getLogger(__name__)
-        self.logger.setLevel(logging.INFO)
+        # RateLimitFilter returned by setup_logging, whose suppressed count is exported in /metrics
+        self.log_rate_limit = log_rate_limit
         
         # Initialize camera settings
         self.camera_settings = {}
@@ -99,49 +147,51 @@ class WSServer:
             'threshold': 25,
             'blur_size': 31,
             'dilation': 3,
-            'max_fps': 30  # Add max_fps setting
+            'max_fps': 30,  # Add max_fps setting
+            'engine': 'framediff',  # Detection engine: framediff, running_avg, mog2 or knn
+            'learning_rate': 0.05  # Background adaptation rate for running_avg, mog2 and knn
         }
+        # Settings are written behind, debounced and off the event loop
+        self.settings_store = SettingsStore(settings_file, self.settings_snapshot, delay=settings_save_delay)
         # Load saved settings if they exist
         self.load_settings()
-        print(f"[+] WSServer initialized with host={host}, port={port}")
-        
-        # Add performance monitoring
-        self.frame_times = {}
-        self.frame_counts = {}
-        self.last_fps_update = {}
-        self.fps = {}
-        self.last_frame_time = {}
+        logger.info("[+] WSServer initialized with host=%s, port=%s", host, port)
 
     def load_settings(self):
         """Load settings from file"""
         try:
-            with open('camera_settings.json', 'r') as f:
-                saved_settings = json.load(f)
-                if 'motion' in saved_settings:
-                    self.default_motion_settings.update(saved_settings['motion'])
-                if 'cameras' in saved_settings:
-                    self.camera_settings = saved_settings['cameras']
-                if 'camera_names' in saved_settings:
-                    # Update camera names in device status
-                    for camera_id, name in saved_settings['camera_names'].items():
-                        if camera_id in self.device_status['cameras']:
-                            self.device_status['cameras'][camera_id]['name'] = name
-                        else:
-                            # Create entry for disconnected camera
-                            self.device_status['cameras'][camera_id] = {
-                                'connected': False,
-                                'name': name,
-                                'last_seen': time.time(),
-                                'fps': 0
-                            }
-            print("[+] Settings loaded successfully")
+            saved_settings = self.settings_store.load()
+            if 'motion' in saved_settings:
+                self.default_motion_settings.update(saved_settings['motion'])
+            if 'cameras' in saved_settings:
+                self.camera_settings = saved_settings['cameras']
+            if 'camera_motion' in saved_settings:
+                # Saved values override the defaults, settings added since then keep their default
+                self.camera_motion_settings = {
+                    camera_id: {**self.default_motion_settings, **motion}
+                    for camera_id, motion in saved_settings['camera_motion'].items()
+                }
+            if 'camera_names' in saved_settings:
+                # Update camera names in device status
+                for camera_id, name in saved_settings['camera_names'].items():
+                    if camera_id in self.device_status['cameras']:
+                        self.device_status['cameras'][camera_id]['name'] = name
+                    else:
+                        # Create entry for disconnected camera
+                        self.device_status['cameras'][camera_id] = {
+                            'connected': False,
+                            'name': name,
+                            'last_seen': time.time(),
+                            'fps': 0
+                        }
+            logger.info("[+] Settings loaded successfully")
         except FileNotFoundError:
-            print("[+] No settings file found, using defaults")
+            logger.info("[+] No settings file found, using defaults")
         except Exception as e:
-            print(f"[-] Error loading settings: {e}")
+            logger.error("[-] Error loading settings: %s", e)
 
-    def save_settings(self):
-        """Save settings to file"""
+    def settings_snapshot(self):
+        """Build the dictionary persisted to the settings file"""
         # Create camera names dictionary, preserving existing names
         camera_names = {}
         for camera_id, info in self.device_status['cameras'].items():
@@ -149,17 +199,16 @@ class WSServer:
             if info.get('name') and info['name'] != f'Camera {camera_id}':
                 camera_names[camera_id] = info['name']
 
-        settings = {
+        return {
             'motion': self.default_motion_settings,
             'cameras': self.camera_settings,
+            'camera_motion': self.camera_motion_settings,
             'camera_names': camera_names
         }
-        try:
-            with open('camera_settings.json', 'w') as f:
-                json.dump(settings, f)
-            print("[+] Settings saved successfully")
-        except Exception as e:
-            print(f"[-] Error saving settings: {e}")
+
+    def save_settings(self):
+        """Schedule a debounced write of the settings file, changes already apply in memory"""
+        self.settings_store.mark_dirty()
 
     def get_camera_settings(self, camera_id):
         """Get settings for a specific camera, creating default if not exists"""
@@ -169,19 +218,66 @@ class WSServer:
 
     async def apply_camera_settings(self, camera_id):
         """Apply saved settings to a camera"""
-        if camera_id in self.camera_clients:
-            settings = self.get_camera_settings(camera_id)
+        websocket = self.cameras.websocket(camera_id)
+        if websocket is not None:
+            settings = {'frame_interval': DEFAULT_FRAME_INTERVAL, **self.get_camera_settings(camera_id)}
+            if self.throttle is not None:
+                settings = self.throttle.settings_for(camera_id, settings)
             camera_settings_message = {
                 "type": "settings",
                 "data": {"camera": settings}
             }
             try:
-                await self.camera_clients[camera_id].send(json.dumps(camera_settings_message))
-                print(f"[+] Applied settings to camera {camera_id}")
+                await websocket.send(json.dumps(camera_settings_message))
+                logger.info("[+] Applied settings to camera %s", camera_id, extra={'camera': camera_id})
+            except Exception as e:
+                logger.exception("[-] Error applying settings to camera %s: %s", camera_id, e,
+                                 extra={'camera': camera_id})
+
+    def camera_demand(self, camera_id):
+        """True while anything needs the camera at its own settings"""
+        if camera_id in self.web_clients.values():
+            return True
+        if any(camera_id in subscriptions for subscriptions in list(self.viewer_subscriptions.values())):
+            return True
+        if self.frame_buffer is not None and self.frame_buffer.read_recently(camera_id, self.DEMAND_READ_WINDOW):
+            return True
+        if time.monotonic() - self.remote_demand.get(camera_id, float('-inf')) < self.DEMAND_READ_WINDOW:
+            return True
+        if self.recorder is not None and self.recorder.is_recording(camera_id):
+            return True
+        schedule = self.scheduler.status(camera_id)
+        return schedule is not None and schedule['mode'] == 'active'
+
+    async def refresh_camera_demand(self):
+        """Throttle connected cameras that lost their demand and restore those that regained it"""
+        if self.throttle is None:
+            return
+        for session in self.cameras.connected():
+            camera_id = session.camera_id
+            action = self.throttle.update(camera_id, self.camera_demand(camera_id))
+            if action is None:
+                continue
+            logger.info("[+] Camera %s %s", camera_id, 'throttled to low power' if action == 'throttle' else 'restored',
+                        extra={'camera': camera_id})
+            await self.apply_camera_settings(camera_id)
+            if camera_id in self.device_status['cameras']:
+                self.device_status['cameras'][camera_id]['throttled'] = action == 'throttle'
+            self.status_publisher.mark_dirty()
+
+    async def throttle_loop(self):
+        """Re-evaluate camera demand once per second"""
+        while True:
+            try:
+                await self.refresh_camera_demand()
             except Exception as e:
-                print(f"[-] Error applying settings to camera {camera_id}: {e}")
-                import traceback
-                traceback.print_exc()
+                logger.exception("[-] Error updating camera throttling: %s", e)
+            await asyncio.sleep(1.0)
+
+    def start_throttle(self):
+        """Start the throttle task on the running event loop when throttling is enabled"""
+        if self.throttle is not None and (self.throttle_task is None or self.throttle_task.done()):
+            self.throttle_task = asyncio.get_running_loop().create_task(self.throttle_loop())
 
     def get_camera_motion_settings(self, camera_id):
         """Get motion settings for a specific camera, creating default if not exists"""
@@ -189,231 +285,376 @@ class WSServer:
             self.camera_motion_settings[camera_id] = self.default_motion_settings.copy()
         return self.camera_motion_settings[camera_id]
 
-    def detect_motion(self, frame, camera_id):
-        """Detect motion in the frame using camera-specific settings"""
+    def get_detection_scale(self, camera_id):
+        """Get the decode scale for motion detection based on the camera's resolution"""
+        settings = self.get_camera_settings(camera_id)
+        if self.throttle is not None:
+            settings = self.throttle.settings_for(camera_id, settings)
+        resolution = settings.get('resolution', 'VGA')
+        return detection_scale_for(resolution, self.detection_width)
+
+    def find_motion_boxes(self, gray, camera_id, scale):
+        """Find moving objects in a reduced grayscale frame, returning [x, y, w, h] boxes at full resolution"""
         try:
-            start_time = time.time()
-            
             # Validate input frame
-            if frame is None:
+            if gray is None:
                 return None
 
             # Get frame dimensions
-            height, width = frame.shape[:2]
+            height, width = gray.shape[:2]
             if width == 0 or height == 0:
                 return None
 
-            # Get camera-specific motion settings
+            start_time = time.perf_counter()
+            session = self.cameras.session(camera_id)
             settings = self.get_camera_motion_settings(camera_id)
-
-            # Optimize frame size for motion detection
-            scale_factor = 0.5  # Reduce frame size for faster processing
-            small_frame = cv2.resize(frame, (int(width * scale_factor), int(height * scale_factor)))
-
-            # Convert frame to grayscale
-            gray = cv2.cvtColor(small_frame, cv2.COLOR_BGR2GRAY)
-            
-            # Apply Gaussian blur with optimized kernel size
-            blurred = cv2.GaussianBlur(gray, (settings['blur_size'], settings['blur_size']), 0)
-            
-            # Calculate frame difference
-            if camera_id not in self.prev_frames or self.prev_frames[camera_id] is None:
-                self.prev_frames[camera_id] = blurred
-                return frame
-            
-            # Ensure both frames have the same size before comparison
-            if self.prev_frames[camera_id].shape != blurred.shape:
-                self.prev_frames[camera_id] = cv2.resize(self.prev_frames[camera_id], (blurred.shape[1], blurred.shape[0]))
-            
-            frame_diff = cv2.absdiff(self.prev_frames[camera_id], blurred)
-            self.prev_frames[camera_id] = blurred
-            
-            # Threshold the difference
-            _, thresh = cv2.threshold(frame_diff, settings['threshold'], 255, cv2.THRESH_BINARY)
-            
-            # Dilate the thresholded image with optimized kernel
-            kernel = np.ones((3,3), np.uint8)  # Reduced kernel size
-            dilated = cv2.dilate(thresh, kernel, iterations=settings['dilation'])
-            
-            # Find contours
-            contours, _ = cv2.findContours(dilated, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-            
-            # Draw bounding boxes around moving objects
-            for contour in contours:
-                if cv2.contourArea(contour) > settings['min_area']:
-                    x, y, w, h = cv2.boundingRect(contour)
-                    # Scale coordinates back to original frame size
-                    x = int(x / scale_factor)
-                    y = int(y / scale_factor)
-                    w = int(w / scale_factor)
-                    h = int(h / scale_factor)
-                    cv2.rectangle(frame, (x, y), (x+w, y+h), (0, 255, 0), 2)
-            
-            # Update performance metrics
-            processing_time = time.time() - start_time
-            self.frame_times[camera_id] = self.frame_times.get(camera_id, [])
-            self.frame_times[camera_id].append(processing_time)
-            
-            # Keep only last 30 frames for FPS calculation
-            if len(self.frame_times[camera_id]) > 30:
-                self.frame_times[camera_id].pop(0)
-            
-            return frame
+            session.detector = ensure_detector(session.detector, settings)
+            boxes = session.detector.detect(gray, settings, scale)
+            self.metrics.camera(camera_id).observe('detect', time.perf_counter() - start_time)
+            return boxes
             
         except Exception as e:
+            # Rate limited per camera by the log pipeline, a broken detector fails on every frame
+            logger.warning("[-] Motion detection failed for camera %s: %s", camera_id, e, extra={'camera': camera_id})
+            return None
+
+    def get_detect_cost_ms(self, camera_id):
+        """Recent detection time per frame, in milliseconds"""
+        return round(self.metrics.camera(camera_id).stages['detect'].ema * 1000.0, 2)
+
+    def collect_metrics(self):
+        """Gauges and mailbox counters read from the camera sessions at scrape time"""
+        depth, received, superseded, dropped, fps, ring_bytes, ring_oversized = [], [], [], [], [], [], []
+        for session in list(self.cameras.sessions.values()):
+            labels = {'camera': session.camera_id}
+            ring = session.ring
+            if ring is not None:
+                ring_bytes.append((labels, ring.nbytes))
+                ring_oversized.append((labels, ring.oversized))
+            mailbox_stats = session.mailbox.stats()
+            depth.append((labels, mailbox_stats['depth']))
+            superseded.append((labels, mailbox_stats['superseded']))
+            dropped.append((labels, mailbox_stats['dropped']))
+            fps.append((labels, round(session.fps, 2)))
+        stride, active, degraded, skipped = [], [], [], []
+        for camera_id in list(self.scheduler.cameras):
+            schedule = self.scheduler.status(camera_id)
+            if schedule is None:
+                continue
+            labels = {'camera': camera_id}
+            stride.append((labels, schedule['stride']))
+            active.append((labels, 1 if schedule['mode'] == 'active' else 0))
+            degraded.append((labels, schedule['degraded']))
+            skipped.append((labels, schedule['skipped']))
+        tier_counts = {tier: 0 for tier in QUALITY_TIERS}
+        for tier in [self.viewer_tiers.get(client, DEFAULT_TIER) for client in list(self.web_clients)]:
+            tier_counts[tier] += 1
+        tiers = [({'tier': tier}, count) for tier, count in tier_counts.items()]
+        subscribed = sum(len(subscriptions) for subscriptions in list(self.viewer_subscriptions.values()))
+        thumbnail_gauges = []
+        if self.thumbnails is not None:
+            stats = self.thumbnails.stats()
+            thumbnail_gauges = [
+                ('thumbnail_cache_bytes', 'gauge', 'Memory held by camera preview thumbnails', [({}, stats['bytes'])]),
+                ('thumbnail_cache_entries', 'gauge', 'Cameras with a cached preview thumbnail', [({}, stats['entries'])]),
+                ('thumbnail_cache_evictions_total', 'counter', 'Thumbnails evicted to stay under the memory cap',
+                 [({}, stats['evictions'])])
+            ]
+        # Per-viewer samples, so a lagging client can be told apart from the others
+        lag, lag_p95, sent, viewer_dropped, pending = [], [], [], [], []
+        for client, channel in list(self.viewer_channels.items()):
+            if not isinstance(channel, ViewerChannel):
+                continue  # Sent by the fan-out process that owns the connection
+            labels = {'viewer': viewer_name(client)}
+            viewer_stats = channel.stats()
+            lag.append((labels, viewer_stats['last_lag']))
+            lag_p95.append((labels, viewer_stats['lag_p95']))
+            sent.append((labels, viewer_stats['frames_sent']))
+            viewer_dropped.append((labels, viewer_stats['frames_dropped']))
+            pending.append((labels, viewer_stats['pending']))
+        log_counters = []
+        if self.log_rate_limit is not None:
+            log_counters = [('log_suppressed_total', 'counter', 'Log records dropped by the per-camera rate limit',
+                             [({}, self.log_rate_limit.suppressed)])]
+        throttled = []
+        if self.throttle is not None:
+            throttled = [({'camera': session.camera_id}, 1 if self.throttle.is_throttled(session.camera_id) else 0)
+                         for session in self.cameras.connected()]
+        return [
+            ('queue_depth', 'gauge', 'Frames waiting in the camera mailbox', depth),
+            ('frames_superseded_total', 'counter', 'Frames overwritten by a newer frame before processing', superseded),
+            ('frames_dropped_total', 'counter', 'Frames received but never processed', dropped),
+            ('camera_fps', 'gauge', 'Frames per second received from the camera', fps),
+            ('frame_ring_bytes', 'gauge', "Shared memory held by each camera's frame ring", ring_bytes),
+            ('frame_ring_oversized_total', 'counter', 'Frames too large for a ring slot, copied to bytes instead',
+             ring_oversized),
+            ('web_clients', 'gauge', 'Connected web clients', [({}, len(self.web_clients))]),
+            ('web_clients_by_tier', 'gauge', 'Connected web clients per quality tier', tiers),
+            ('viewer_lag_seconds', 'gauge', 'Queue delay of the last frame sent to each web client', lag),
+            ('viewer_lag_p95_seconds', 'gauge', 'Bucket bound of the 95th percentile queue delay per web client', lag_p95),
+            ('viewer_frames_sent_total', 'counter', 'Frames sent to each web client', sent),
+            ('viewer_frames_dropped_total', 'counter', 'Frames skipped for each web client', viewer_dropped),
+            ('viewer_queue_frames', 'gauge', 'Frames waiting in each web client send queue', pending),
+            ('web_client_subscriptions', 'gauge', 'Cameras followed by multiplexed web clients, summed over clients',
+             [({}, subscribed)]),
+            ('detect_stride', 'gauge', 'Frames per motion detection run chosen by the scheduler', stride),
+            ('detect_active', 'gauge', '1 while a camera is held at full detection rate after motion', active),
+            ('detect_degraded_level', 'gauge', 'Times the detection stride was doubled to meet the CPU budget', degraded),
+            ('detect_skipped_total', 'counter', 'Frames delivered without running motion detection', skipped),
+            ('detect_cpu_cores', 'gauge', 'CPU cores used by decode and detection over the last second',
+             [({}, round(self.scheduler.usage, 3))]),
+            ('camera_throttled', 'gauge', '1 while a camera runs the low-power profile for lack of demand', throttled),
+            ('status_broadcasts_total', 'counter', 'Status deltas sent to web clients',
+             [({}, self.status_publisher.flushes)]),
+            ('status_updates_coalesced_total', 'counter', 'Status updates merged into another broadcast',
+             [({}, self.status_publisher.coalesced)])
+        ] + thumbnail_gauges + log_counters
+
+    def detect_motion(self, frame, camera_id):
+        """Detect motion in the frame using camera-specific settings and draw the boxes into it"""
+        if frame is None:
+            return None
+        boxes = self.find_motion_boxes(prepare_detection_frame(frame, 2), camera_id, 2)
+        if boxes is None:
             return frame
+        return draw_boxes(frame, boxes)
+
+    def build_motion_message(self, camera_id, boxes, width, height):
+        """Build the motion metadata message sent alongside pass-through frames"""
+        return json.dumps({
+            "type": "motion",
+            "camera_id": camera_id,
+            "width": width,
+            "height": height,
+            "boxes": boxes
+        }, separators=(',', ':'))
 
     def process_frames(self, camera_id):
         """Process frames for a specific camera in a separate thread"""
-        print(f"[+] Starting frame processing for camera {camera_id}")
+        logger.info("[+] Starting frame processing for camera %s", camera_id, extra={'camera': camera_id})
+        session = self.cameras.session(camera_id)
+        mailbox = session.mailbox
+        # Slots sized for the camera's resolution, larger frames after a resolution change stay bytes
+        ring = session.frame_ring(jpeg_size_bound(self.get_camera_settings(camera_id).get('resolution', 'VGA')))
+        camera_metrics = self.metrics.camera(camera_id)
         settings = self.get_camera_motion_settings(camera_id)
         
         # Initialize frame timing
+        frame_seq = 0  # Sequence of the camera's frames, tagged onto frames sent to multiplexed viewers
         last_frame_time = time.time()
         frame_interval = 1.0 / settings.get('max_fps', 30)  # Default to 30 FPS if not set
         frame_count = 0
         fps_update_interval = 1.0  # Update FPS every second
         last_fps_update = time.time()
         
-        while not self.stop_processing.get(camera_id, False):
+        while not session.stop:
+            self.profiler.checkpoint(camera_id)
             try:
-                # Get frame from queue with timeout
-                frame_data = self.frame_queues[camera_id].get(timeout=1.0)
+                # Get frame from the mailbox with timeout
+                frame_data = mailbox.get(timeout=1.0)
                 if frame_data is None:  # Poison pill to stop processing
-                    print(f"[+] Stopping frame processing for camera {camera_id}")
+                    logger.info("[+] Stopping frame processing for camera %s", camera_id, extra={'camera': camera_id})
                     break
+                camera_metrics.observe('queue_wait', mailbox.last_wait)
 
                 # Track frame arrival time for FPS calculation
                 current_time = time.time()
                 frame_count += 1
+                frame_seq += 1
+
+                # Keep every frame in the pre-roll, or on disk while an event is recording
+                if self.recorder is not None:
+                    self.recorder.add_frame(camera_id, frame_data, current_time)
                 
                 # Calculate and update FPS every second
                 if current_time - last_fps_update >= fps_update_interval:
                     fps = frame_count / (current_time - last_fps_update)
-                    self.fps[camera_id] = fps
+                    session.fps = fps
                     frame_count = 0
                     last_fps_update = current_time
                     
-                    # Update device status with current FPS
+                    # Update device status with current FPS and mailbox counters
                     if camera_id in self.device_status['cameras']:
+                        mailbox_stats = mailbox.stats()
                         self.device_status['cameras'][camera_id]['fps'] = fps
                         self.device_status['cameras'][camera_id]['last_seen'] = current_time
+                        self.device_status['cameras'][camera_id]['dropped_frames'] = mailbox_stats['dropped']
+                        self.device_status['cameras'][camera_id]['superseded_frames'] = mailbox_stats['superseded']
+                        self.device_status['cameras'][camera_id]['detect_engine'] = self.get_camera_motion_settings(camera_id).get('engine', 'framediff')
+                        self.device_status['cameras'][camera_id]['detect_ms'] = self.get_detect_cost_ms(camera_id)
+                        schedule = self.scheduler.status(camera_id)
+                        if schedule is not None:
+                            self.device_status['cameras'][camera_id]['detect_mode'] = schedule['mode']
+                            self.device_status['cameras'][camera_id]['detect_stride'] = schedule['stride']
 
                 # Control frame rate
                 if current_time - last_frame_time < frame_interval:
+                    mailbox.mark_dropped()
                     continue
                 last_frame_time = current_time
 
                 # Validate frame data
                 if len(frame_data) < 100:
+                    mailbox.mark_dropped()
                     continue
 
-                # Convert binary data to numpy array
-                nparr = np.frombuffer(frame_data, np.uint8)
-                frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-                
-                if frame is None:
-                    continue
-
-                # Validate frame dimensions
-                height, width = frame.shape[:2]
-                if width == 0 or height == 0:
-                    continue
-
-                # Check for minimum frame size
-                if width < 100 or height < 100:
-                    continue
-
-                # Detect motion and draw bounding boxes
-                processed_frame = self.detect_motion(frame, camera_id)
-                
-                if processed_frame is None:
+                # Decode, detect motion and (in annotated mode) re-encode the frame
+                settings = self.get_camera_motion_settings(camera_id)
+                scale = self.get_detection_scale(camera_id)
+                tiers = self.tiers_for(camera_id)
+                # Frames the scheduler skips keep showing the boxes of the last detected frame
+                reuse = None
+                if not self.scheduler.should_detect(camera_id, settings.get('priority', 0)):
+                    reuse = session.last_detection
+                if reuse is not None and not (tiers and (self.stream_mode != 'passthrough' or set(tiers) - {DEFAULT_TIER})):
+                    # Nothing to detect, decode or encode, the camera's JPEG goes out as it is
+                    result = FrameResult(*reuse, {}, 0.0)
+                elif self.worker_pool is not None:
+                    tag = pack_tag(camera_id, frame_seq, current_time)
+                    result = self.worker_pool.process(camera_id, frame_data, settings, scale, self.stream_mode, tiers,
+                                                      reuse, ring, tag)
+                else:
+                    session.detector = ensure_detector(session.detector, settings)
+                    result = process_frame(self.codec, session.detector, frame_data, settings, scale,
+                                           self.stream_mode, tiers, reuse)
+                if result is None:
                     continue
+                if result.decode_time:
+                    camera_metrics.observe('decode', result.decode_time)
+                if result.encoded:
+                    camera_metrics.observe('encode', result.encode_time)
                 
-                # Encode the processed frame back to JPEG with optimized quality
-                _, buffer = cv2.imencode('.jpg', processed_frame, [cv2.IMWRITE_JPEG_QUALITY, 85])
+                if reuse is None:
+                    camera_metrics.observe('detect', result.detect_time)
+                    session.last_detection = (result.boxes, result.width, result.height)
+                    self.scheduler.record(camera_id, bool(result.boxes), result.decode_time + result.detect_time)
+                    if self.event_store is not None and result.boxes:
+                        self.event_store.record(camera_id, result.boxes, current_time)
                 
-                # Validate encoded frame
-                if len(buffer) < 100:
-                    continue
+                # Boxes are already filtered by min_area, any box starts or extends an event
+                if self.recorder is not None and self.recorder.update_motion(camera_id, bool(result.boxes), current_time):
+                    if camera_id in self.device_status['cameras']:
+                        self.device_status['cameras'][camera_id]['recording'] = self.recorder.is_recording(camera_id)
+                        self.status_publisher.mark_dirty()
+
+                motion_message = None
+                if self.stream_mode == 'passthrough':
+                    # Only the boxes are needed, the camera's JPEG is forwarded untouched
+                    # Skip the metadata message while there is nothing new to clear or draw
+                    if result.boxes or session.last_motion_boxes:
+                        motion_message = self.build_motion_message(camera_id, result.boxes, result.width, result.height)
+                    session.last_motion_boxes = result.boxes
+                # One buffer per tier in use, shared by every viewer of that tier and read in place from the
+                # camera's ring; worker results already live there, frames too large for a slot stay bytes
+                tag = pack_tag(camera_id, frame_seq, current_time)
+                frames = {}
+                for tier, buffer in result.encoded.items():
+                    if not isinstance(buffer, FrameRef):
+                        ref = ring.write(buffer, tag)
+                        if ref is None:
+                            # Counted in the ring's oversized total, exported as frame_ring_oversized_total
+                            logger.warning("[-] %s frame of camera %s (%d bytes) exceeds the %d byte ring slot",
+                                           tier, camera_id, len(buffer), ring.slot_size, extra={'camera': camera_id})
+                            ref = bytes(buffer)
+                        buffer = ref
+                    frames[tier] = buffer
+                if self.stream_mode == 'passthrough':
+                    frames[DEFAULT_TIER] = frame_data
+                if not frames:
+                    continue  # Nobody is watching
+
+                # Refresh the camera's preview from the thumb tier, requested by tiers_for when due
+                if self.thumbnails is not None and THUMBNAIL_TIER in frames and self.thumbnails.due(camera_id):
+                    thumbnail = frames[THUMBNAIL_TIER]
+                    if isinstance(thumbnail, FrameRef):
+                        thumbnail = thumbnail.tobytes()  # None once its slot was reused, retried on the next frame
+                    if thumbnail is not None:
+                        thumbnail = self.thumbnails.put(camera_id, thumbnail, current_time)
+                    if thumbnail is not None:
+                        self.loop.call_soon_threadsafe(self.announce_thumbnail, camera_id, thumbnail)
                     
-                # Broadcast processed frame to clients that have selected this camera
-                try:
-                    # Create a new event loop for this thread if needed
-                    try:
-                        loop = asyncio.get_event_loop()
-                    except RuntimeError:
-                        loop = asyncio.new_event_loop()
-                        asyncio.set_event_loop(loop)
+                # Publish once for every HTTP snapshot and MJPEG client, whatever their number
+                if self.frame_buffer is not None and DEFAULT_TIER in frames:
+                    self.frame_buffer.publish(camera_id, frames[DEFAULT_TIER], current_time)
                     
-                    # Run the broadcast coroutine in the event loop
-                    loop.run_until_complete(self.broadcast_to_web_clients(buffer.tobytes(), camera_id))
+                # Hand the frame to the server's event loop, which queues it for each viewer
+                try:
+                    self.loop.call_soon_threadsafe(self.fan_out_frame, camera_id, frames, motion_message, tag)
                 except Exception as e:
-                    print(f"[-] Error broadcasting frame for camera {camera_id}: {e}")
-                    import traceback
-                    traceback.print_exc()
+                    logger.exception("[-] Error broadcasting frame for camera %s: %s", camera_id, e,
+                                     extra={'camera': camera_id})
                     
             except Empty:
                 continue
             except Exception as e:
-                print(f"[-] Error processing frames for camera {camera_id}: {e}")
-                import traceback
-                traceback.print_exc()
+                logger.exception("[-] Error processing frames for camera %s: %s", camera_id, e,
+                                 extra={'camera': camera_id})
                 continue
 
+        # Close a cProfile window still open in this thread
+        self.profiler.checkpoint(camera_id, final=True)
+
+    def processing_thread_for(self, camera_id):
+        """Return the processing thread of a camera, or None"""
+        session = self.cameras.get(camera_id)
+        return session.thread if session is not None else None
+
+    def announce_profile(self, run):
+        """Tell the web clients that requested a profile that its report is ready, safe from any thread"""
+        try:
+            self.loop.call_soon_threadsafe(self._send_profile_ready, run.camera_id)
+        except RuntimeError:
+            pass  # Event loop already closed
+
+    def _send_profile_ready(self, camera_id):
+        message = json.dumps({
+            "type": "profile",
+            "status": "done",
+            "camera_id": camera_id,
+            "report_url": f"/profile/{camera_id}"
+        })
+        for websocket in self.profile_requesters.pop(camera_id, []):
+            if websocket in self.viewer_channels:
+                self.send_to_web_client(websocket, message)
+
     def start_processing_thread(self, camera_id):
         """Start a new processing thread for a camera"""
-        print(f"[+] Starting processing thread for camera {camera_id}")
-        with self.thread_locks.get(camera_id, threading.Lock()):
-            if camera_id not in self.processing_threads or not self.processing_threads[camera_id].is_alive():
-                # Initialize frame queue if not exists
-                if camera_id not in self.frame_queues:
-                    self.frame_queues[camera_id] = Queue()
-                    print(f"[+] Created frame queue for camera {camera_id}")
-                
-                # Initialize stop flag if not exists
-                if camera_id not in self.stop_processing:
-                    self.stop_processing[camera_id] = False
-                    print(f"[+] Initialized stop flag for camera {camera_id}")
-                
-                # Initialize thread lock if not exists
-                if camera_id not in self.thread_locks:
-                    self.thread_locks[camera_id] = threading.Lock()
-                    print(f"[+] Created thread lock for camera {camera_id}")
-                
-                # Create and start the processing thread
-                self.processing_threads[camera_id] = threading.Thread(
-                    target=self.process_frames,
-                    args=(camera_id,),
-                    daemon=True
-                )
-                self.processing_threads[camera_id].start()
-                print(f"[+] Started processing thread for camera {camera_id}")
-            else:
-                print(f"[!] Processing thread already running for camera {camera_id}")
+        session = self.cameras.session(camera_id)
+        if session.start_processing(self.process_frames):
+            logger.info("[+] Started processing thread for camera %s", camera_id, extra={'camera': camera_id})
+
+    def release_frame_ring(self, camera_id):
+        """Free the frame ring of a camera that stayed disconnected, runs on the server's event loop"""
+        session = self.cameras.get(camera_id)
+        if session is None or session.connected or session.ring is None:
+            return
+        if session.is_processing():
+            # The processing thread has not exited yet and may still write to the ring
+            self.loop.call_later(self.ring_release_delay, self.release_frame_ring, camera_id)
+            return
+        session.close_ring()
+        logger.info("[-] Freed the frame ring of camera %s", camera_id, extra={'camera': camera_id})
 
     def stop_processing_thread(self, camera_id):
         """Stop the processing thread for a camera"""
-        with self.thread_locks.get(camera_id, threading.Lock()):
-            if camera_id in self.stop_processing:
-                self.stop_processing[camera_id] = True
-                if camera_id in self.frame_queues:
-                    # Clear the queue and add poison pill
-                    while not self.frame_queues[camera_id].empty():
-                        try:
-                            self.frame_queues[camera_id].get_nowait()
-                        except Empty:
-                            break
-                    self.frame_queues[camera_id].put(None)  # Poison pill
-                if camera_id in self.processing_threads:
-                    self.processing_threads[camera_id].join(timeout=1.0)
-                    print(f"[-] Stopped processing thread for camera {camera_id}")
-                    # Remove the thread from the dictionary
-                    self.processing_threads.pop(camera_id, None)
+        session = self.cameras.get(camera_id)
+        if session is not None and session.stop_processing():
+            logger.info("[-] Stopped processing thread for camera %s", camera_id, extra={'camera': camera_id})
+        if session is not None:
+            session.last_detection = None
+        self.scheduler.remove(camera_id)
+        if self.worker_pool is not None:
+            self.worker_pool.release_camera(camera_id)
+        if self.recorder is not None:
+            self.recorder.stop_camera(camera_id)
+        if self.frame_buffer is not None:
+            self.frame_buffer.discard(camera_id)
+        if self.bus is not None:
+            self.bus.publish({'op': 'discard', 'camera': camera_id})
 
     async def handle_settings(self, settings, websocket):
         """Handle settings updates from clients"""
-        print(f"[+] Received settings update: {settings}")
+        logger.debug("[+] Received settings update: %s", settings)
         
         # Extract settings from web client format if needed
         if isinstance(settings, dict) and 'data' in settings:
@@ -422,18 +663,29 @@ class WSServer:
         # Get the selected camera ID for this web client
         selected_camera_id = self.web_clients.get(websocket)
         if not selected_camera_id:
-            print("[-] No camera selected for settings update")
+            logger.warning("[-] No camera selected for settings update")
             return
         
         settings_updated = False
         
         if 'motion' in settings:
-            motion_settings = settings['motion']
+            # The web UI names some motion settings in camelCase
+            motion_settings = {MOTION_SETTING_ALIASES.get(key, key): value for key, value in settings['motion'].items()}
+            if motion_settings.get('engine', 'framediff') not in ENGINES:
+                logger.warning("[-] Unknown motion engine %s, keeping current engine", motion_settings['engine'])
+                motion_settings.pop('engine')
+            if 'zones' in motion_settings:
+                try:
+                    motion_settings['zones'] = normalize_zones(motion_settings['zones'])
+                except ValueError as e:
+                    logger.warning("[-] Invalid motion zones for camera %s: %s, keeping current zones", selected_camera_id, e)
+                    motion_settings.pop('zones')
             # Update motion settings only for the selected camera
             if selected_camera_id not in self.camera_motion_settings:
                 self.camera_motion_settings[selected_camera_id] = self.default_motion_settings.copy()
             self.camera_motion_settings[selected_camera_id].update(motion_settings)
-            print(f"[+] Updated motion settings for camera {selected_camera_id}: {motion_settings}")
+            logger.info("[+] Updated motion settings for camera %s", selected_camera_id)
+            logger.debug("[+] Motion settings update for camera %s: %s", selected_camera_id, motion_settings)
             settings_updated = True
         
         if 'camera' in settings:
@@ -442,21 +694,21 @@ class WSServer:
             if selected_camera_id not in self.camera_settings:
                 self.camera_settings[selected_camera_id] = self.default_camera_settings.copy()
             self.camera_settings[selected_camera_id].update(camera_settings)
-            print(f"[+] Updated camera settings for camera {selected_camera_id}: {camera_settings}")
+            logger.info("[+] Updated camera settings for camera %s", selected_camera_id)
+            logger.debug("[+] Camera settings update for camera %s: %s", selected_camera_id, camera_settings)
             
             # Send camera settings to the specific camera
             camera_settings_message = {
                 "type": "settings",
                 "data": {"camera": camera_settings}
             }
-            if selected_camera_id in self.camera_clients:
+            camera_websocket = self.cameras.websocket(selected_camera_id)
+            if camera_websocket is not None:
                 try:
-                    await self.camera_clients[selected_camera_id].send(json.dumps(camera_settings_message))
-                    print(f"[+] Applied settings to camera {selected_camera_id}")
+                    await camera_websocket.send(json.dumps(camera_settings_message))
+                    logger.info("[+] Applied settings to camera %s", selected_camera_id)
                 except Exception as e:
-                    print(f"[-] Error sending camera settings to client: {e}")
-                    import traceback
-                    traceback.print_exc()
+                    logger.exception("[-] Error sending camera settings to camera %s: %s", selected_camera_id, e)
             settings_updated = True
         
         if settings_updated:
@@ -473,42 +725,11 @@ class WSServer:
             }
             
             # Send to all web clients that have selected this camera
+            settings_json = json.dumps(settings_message)
             for client, selected_cam in self.web_clients.items():
                 if selected_cam == selected_camera_id:
-                    try:
-                        await client.send(json.dumps(settings_message))
-                        print(f"[+] Sent settings update to web client for camera {selected_camera_id}")
-                    except Exception as e:
-                        print(f"[-] Error sending settings update to web client: {e}")
-                        import traceback
-                        traceback.print_exc()
-
-    async def broadcast_status(self):
-        """Broadcast current device status to all web clients"""
-        status_message = json.dumps({
-            "type": "status",
-            "data": self.device_status
-        })
-        print(f"[+] Broadcasting status: {status_message}")
-        
-        # Send to all web clients directly
-        for client, selected_cam in self.web_clients.items():
-            try:
-                # Only send status to clients that have selected a camera
-                if selected_cam is not None:
-                    await client.send(status_message)
-                    print(f"[+] Status sent to web client for camera {selected_cam}")
-                else:
-                    # For clients without a selected camera, send status to all clients
-                    await client.send(status_message)
-                    print(f"[+] Status sent to web client")
-            except websockets.exceptions.ConnectionClosed:
-                print("[-] Web client connection closed")
-                await self.unregister(client)
-            except Exception as e:
-                print(f"[-] Error sending status to client: {e}")
-                import traceback
-                traceback.print_exc()
+                    self.send_to_web_client(client, settings_json)
+                    logger.debug("[+] Sent settings update to web client for camera %s", selected_camera_id)
 
     async def register(self, websocket):
         """Register a new client and identify if it's a camera or web client"""
@@ -521,8 +742,8 @@ class WSServer:
                     if data.get('type') == 'camera':
                         camera_id = data.get('camera_id')
                         if camera_id:
-                            # Store the camera client with its unique ID
-                            self.camera_clients[camera_id] = websocket
+                            # Bind the connection to the camera's session, clearing stale frames
+                            self.cameras.attach(camera_id, websocket)
                             
                             # Initialize or update camera info in device status
                             if camera_id not in self.device_status['cameras']:
@@ -540,29 +761,18 @@ class WSServer:
                                     'fps': 0
                                 })
                             
-                            print(f"[+] Camera {camera_id} connected")
-                            
-                            # Reset processing thread state for this camera
-                            if camera_id in self.stop_processing:
-                                self.stop_processing[camera_id] = False
-                            if camera_id in self.frame_queues:
-                                # Clear the queue
-                                while not self.frame_queues[camera_id].empty():
-                                    try:
-                                        self.frame_queues[camera_id].get_nowait()
-                                    except Empty:
-                                        break
+                            logger.info("[+] Camera %s connected", camera_id, extra={'camera': camera_id})
                             
                             # Apply saved settings to the camera
                             await self.apply_camera_settings(camera_id)
-                            await self.broadcast_status()
+                            self.status_publisher.mark_dirty()
                             return
                 except json.JSONDecodeError:
                     pass
             else:
-                camera_id = self._get_camera_id_from_websocket(websocket)
-                if camera_id:
-                    self.camera_clients[camera_id] = websocket
+                session = self.cameras.for_websocket(websocket)
+                if session is not None:
+                    camera_id = session.camera_id
                     
                     # Initialize or update camera info in device status
                     if camera_id not in self.device_status['cameras']:
@@ -580,86 +790,180 @@ class WSServer:
                             'fps': 0
                         })
                     
-                    print(f"[+] Camera {camera_id} connected")
-                    
-                    # Reset processing thread state for this camera
-                    if camera_id in self.stop_processing:
-                        self.stop_processing[camera_id] = False
-                    if camera_id in self.frame_queues:
-                        # Clear the queue
-                        while not self.frame_queues[camera_id].empty():
-                            try:
-                                self.frame_queues[camera_id].get_nowait()
-                            except Empty:
-                                break
+                    logger.info("[+] Camera %s connected", camera_id, extra={'camera': camera_id})
                     
                     # Apply saved settings to the camera
                     await self.apply_camera_settings(camera_id)
-                    await self.broadcast_status()
+                    self.status_publisher.mark_dirty()
                     return
             
             # If we get here, this is a web client
-            self.web_clients[websocket] = None
-            self.device_status['web_clients'] = len(self.web_clients)
-            print("[+] Web client connected")
-            await self.broadcast_status()
+            self.add_web_client(websocket, ViewerChannel(
+                websocket,
+                max_frames=self.viewer_queue_size,
+                max_lag=self.viewer_max_lag,
+                policy=self.slow_viewer_policy,
+                lag_histogram=self.metrics.viewer_lag
+            ))
+            logger.info("[+] Web client connected")
             
         except websockets.exceptions.ConnectionClosed:
-            print("[-] Connection closed during registration")
+            logger.info("[-] Connection closed during registration")
         except Exception as e:
-            print(f"[-] Error during registration: {str(e)}")
-    
-    def _get_camera_id_from_websocket(self, websocket):
-        """Get camera ID from websocket connection"""
-        for camera_id, client in self.camera_clients.items():
-            if client == websocket:
-                return camera_id
-        return None
+            logger.error("[-] Error during registration: %s", e)
     
+    def add_web_client(self, websocket, channel):
+        """Track a web client, local or behind a fan-out process, and send it the full status"""
+        self.web_clients[websocket] = None
+        self.viewer_channels[websocket] = channel
+        channel.start()
+        self.refresh_tier_subscribers()
+        self.device_status['web_clients'] = len(self.web_clients)
+        # New clients get a full snapshot, everyone else receives the client count as a delta
+        self.send_to_web_client(websocket, self.status_publisher.snapshot_message())
+        self.status_publisher.mark_dirty()
+
     async def unregister(self, websocket):
         """Unregister a client"""
-        camera_id = self._get_camera_id_from_websocket(websocket)
-        if camera_id:
-            self.camera_clients.pop(camera_id, None)
+        session = self.cameras.detach(websocket)
+        if session is not None:
+            camera_id = session.camera_id
             if camera_id in self.device_status['cameras']:
                 self.device_status['cameras'][camera_id]['connected'] = False
                 self.device_status['cameras'][camera_id]['last_seen'] = time.time()
             # Stop the processing thread for this camera
             self.stop_processing_thread(camera_id)
-            print(f"[-] Camera {camera_id} disconnected")
+            self.loop.call_later(self.ring_release_delay, self.release_frame_ring, camera_id)
+            if self.throttle is not None:
+                self.throttle.forget(camera_id)
+                self.device_status['cameras'].get(camera_id, {}).pop('throttled', None)
+            logger.info("[-] Camera %s disconnected", camera_id, extra={'camera': camera_id})
         elif websocket in self.web_clients:
             self.web_clients.pop(websocket, None)
+            self.viewer_tiers.pop(websocket, None)
+            self.viewer_subscriptions.pop(websocket, None)
+            self.refresh_tier_subscribers()
+            channel = self.viewer_channels.pop(websocket, None)
+            if channel is not None:
+                channel.close()
             self.device_status['web_clients'] = len(self.web_clients)
-            print("[-] Web client disconnected")
+            logger.info("[-] Web client disconnected")
         
-        await self.broadcast_status()
+        self.status_publisher.mark_dirty()
 
-    async def broadcast_to_web_clients(self, message, camera_id=None):
+    def send_to_web_client(self, websocket, message, key=None):
+        """Queue a control message for one web client, replacing a queued one with the same key"""
+        channel = self.viewer_channels.get(websocket)
+        if channel is not None:
+            channel.send(message, key)
+
+    async def broadcast_to_web_clients(self, message, camera_id=None, key=None):
         """Broadcast message to all web clients"""
-        if not self.web_clients:
-            return
-        
-        # Create a copy of the web clients dictionary to avoid modification during iteration
-        web_clients = self.web_clients.copy()
-        for client, selected_cam in web_clients.items():
-            try:
-                # Only send frame to clients that have selected this camera
-                if isinstance(message, bytes) and camera_id is not None:
-                    # If client hasn't selected a camera yet, send the frame
-                    if selected_cam is None:
-                        await client.send(message)
-                    # If client has selected a camera, only send if it matches
-                    elif selected_cam == camera_id:
-                        await client.send(message)
-                else:
-                    # For non-frame messages (like status updates), send to all clients
-                    await client.send(message)
-            except websockets.exceptions.ConnectionClosed:
-                await self.unregister(client)
-            except Exception as e:
-                print(f"[-] Error broadcasting to web client: {str(e)}")
-                import traceback
-                traceback.print_exc()
+        # Messages are queued per client, so a slow client never delays the others
+        for client, selected_cam in list(self.web_clients.items()):
+            # Only send camera messages to clients that have selected this camera (or none yet)
+            if camera_id is None or selected_cam is None or selected_cam == camera_id:
+                self.send_to_web_client(client, message, key)
+
+    def fan_out_frame(self, camera_id, frames, motion_message=None, tag=b''):
+        """Queue a processed frame for every viewer of the camera in its tier, runs on the server's event loop"""
+        start_time = time.perf_counter()
+        now = time.monotonic()
+        queued = 0
+        bytes_out = 0
+        tagged = {}  # tier -> the frame with its tag in front, built once for all multiplexed viewers
+        for client, selected_cam in list(self.web_clients.items()):
+            subscriptions = self.viewer_subscriptions.get(client)
+            if subscriptions is not None:
+                subscription = subscriptions.get(camera_id)
+                if subscription is None or not subscription.due(now):
+                    continue
+                tier = subscription.tier
+            elif selected_cam == camera_id:
+                tier = self.viewer_tiers.get(client, DEFAULT_TIER)
+            else:
+                continue  # Clients without a selection preview cameras through thumbnails
+            channel = self.viewer_channels.get(client)
+            if channel is None:
+                continue
+            # A tier subscribed after this frame was encoded falls back to the full tier, or any encoded one
+            frame_bytes = frames.get(tier)
+            if frame_bytes is None:
+                frame_bytes = frames.get(DEFAULT_TIER) or next(iter(frames.values()))
+            if subscriptions is not None:
+                message = tagged.get(tier)
+                if message is None:
+                    message = tagged[tier] = tag_frame(frame_bytes, tag)
+                frame_bytes = message
+            messages = (motion_message, frame_bytes) if motion_message is not None else (frame_bytes,)
+            if channel.send_frame(*messages):
+                queued += 1
+                bytes_out += len(frame_bytes)
+        if self.bus is not None:
+            self.bus.publish_frame(camera_id, frames, motion_message, tag)
+        camera_metrics = self.metrics.camera(camera_id)
+        camera_metrics.frames_out += queued
+        camera_metrics.bytes_out += bytes_out
+        camera_metrics.observe('fan_out', time.perf_counter() - start_time)
+
+    def viewer_frame_tier(self, client, camera_id):
+        """Tier a web client receives a camera's frames in, None when it does not follow the camera"""
+        subscriptions = self.viewer_subscriptions.get(client)
+        if subscriptions is not None:
+            subscription = subscriptions.get(camera_id)
+            return subscription.tier if subscription is not None else None
+        if client in self.web_clients and self.web_clients[client] == camera_id:
+            return self.viewer_tiers.get(client, DEFAULT_TIER)
+        return None
+
+    def announce_thumbnail(self, camera_id, thumbnail):
+        """Tell every web client a camera's preview changed, runs on the server's event loop"""
+        message = json.dumps({
+            "type": "thumbnail",
+            "camera_id": camera_id,
+            "etag": thumbnail.etag,
+            "url": f"/thumbnail/{camera_id}"
+        })
+        for client in list(self.web_clients):
+            self.send_to_web_client(client, message, ('thumbnail', camera_id))
+        if self.bus is not None:
+            self.bus.publish_thumbnail(camera_id, thumbnail)
+
+    def tiers_for(self, camera_id):
+        """Quality tiers to encode for a camera's next frame, safe to call from processing threads"""
+        subscribers = self.tier_subscribers
+        tiers = set(subscribers.get(camera_id, frozenset()))
+        serves_http = self.frame_buffer is not None or (self.bus is not None and self.bus.serves_http)
+        if serves_http and self.stream_mode != 'passthrough':
+            # HTTP snapshots and MJPEG streams serve the full tier
+            tiers |= {DEFAULT_TIER}
+        if self.thumbnails is not None and self.thumbnails.due(camera_id):
+            tiers |= {THUMBNAIL_TIER}
+        return tuple(tiers)
+
+    def refresh_tier_subscribers(self):
+        """Rebuild the tiers in use per camera after a web client joins, leaves or changes selection"""
+        subscribers = {}
+        for client, selected_cam in list(self.web_clients.items()):
+            subscriptions = self.viewer_subscriptions.get(client)
+            if subscriptions is not None:
+                for camera_id, subscription in subscriptions.items():
+                    subscribers.setdefault(camera_id, set()).add(subscription.tier)
+                continue
+            if selected_cam is not None:
+                subscribers.setdefault(selected_cam, set()).add(self.viewer_tiers.get(client, DEFAULT_TIER))
+        self.tier_subscribers = {camera_id: frozenset(tiers) for camera_id, tiers in subscribers.items()}
+
+    def set_viewer_tier(self, websocket, tier):
+        """Subscribe a web client to a quality tier, returning the tier in effect"""
+        if tier in QUALITY_TIERS:
+            self.viewer_tiers[websocket] = tier
+            self.refresh_tier_subscribers()
+        return self.viewer_tiers.get(websocket, DEFAULT_TIER)
+
+    def get_viewer_stats(self):
+        """Return send lag and drop counters for each connected web client, keyed by its address"""
+        return {viewer_name(client): channel.stats() for client, channel in list(self.viewer_channels.items())}
     
     async def handle_message(self, websocket, message):
         """Handle incoming messages"""
@@ -670,7 +974,7 @@ class WSServer:
                 if data.get('type') == 'camera':
                     # Handle camera messages
                     camera_id = data.get('camera_id')
-                    if camera_id and camera_id in self.camera_clients:
+                    if camera_id and self.cameras.websocket(camera_id) is not None:
                         if data.get('action') == 'update_name':
                             # Handle camera name update
                             new_name = data.get('camera_name')
@@ -688,23 +992,76 @@ class WSServer:
                                 }
                                 await self.broadcast_to_web_clients(json.dumps(name_update_message))
                                 # Broadcast updated status to all clients
-                                await self.broadcast_status()
+                                self.status_publisher.mark_dirty()
                         else:
                             self.device_status['cameras'][camera_id]['last_seen'] = time.time()
-                            await self.broadcast_status()
+                            self.status_publisher.mark_dirty()
                 elif data.get('type') == 'web':
                     # Handle web client messages
                     if data.get('action') == 'select_camera':
                         camera_id = data.get('camera_id')
                         if camera_id in self.device_status['cameras']:
                             self.web_clients[websocket] = camera_id
+                            # The selection may carry the quality tier to watch it in
+                            if 'tier' in data:
+                                self.set_viewer_tier(websocket, data.get('tier'))
+                            self.refresh_tier_subscribers()
                             # Send confirmation to the web client
-                            await websocket.send(json.dumps({
+                            self.send_to_web_client(websocket, json.dumps({
                                 "type": "status",
                                 "message": "camera_selected",
-                                "camera_id": camera_id
+                                "camera_id": camera_id,
+                                "tier": self.viewer_tiers.get(websocket, DEFAULT_TIER)
+                            }))
+                            # Refresh the selecting client's view without broadcasting to everyone
+                            self.send_to_web_client(websocket, self.status_publisher.snapshot_message())
+                            # A throttled camera goes back to its own settings as soon as someone selects it
+                            await self.refresh_camera_demand()
+                    elif data.get('action') == 'set_tier':
+                        # Switch the client to another quality tier of the same stream
+                        tier = self.set_viewer_tier(websocket, data.get('tier'))
+                        self.send_to_web_client(websocket, json.dumps({
+                            "type": "status",
+                            "message": "tier_selected",
+                            "tier": tier,
+                            "tiers": list(QUALITY_TIERS)
+                        }))
+                    elif data.get('action') == 'subscribe':
+                        # Follow several cameras over this one connection, each in its own tier and at its own rate
+                        try:
+                            subscriptions = parse_subscriptions(data.get('cameras', {}), self.device_status['cameras'])
+                        except ValueError as e:
+                            self.send_to_web_client(websocket, json.dumps({
+                                "type": "status",
+                                "message": "subscribe_failed",
+                                "error": str(e)
+                            }))
+                        else:
+                            self.viewer_subscriptions[websocket] = subscriptions
+                            self.refresh_tier_subscribers()
+                            channel = self.viewer_channels.get(websocket)
+                            if channel is not None:
+                                channel.set_streams(len(subscriptions))
+                            self.send_to_web_client(websocket, json.dumps({
+                                "type": "status",
+                                "message": "subscribed",
+                                "cameras": {camera_id: subscription.to_dict()
+                                            for camera_id, subscription in subscriptions.items()}
                             }))
-                            await self.broadcast_status()
+                            await self.refresh_camera_demand()
+                    elif data.get('action') == 'unsubscribe':
+                        # Back to the frames of the selected camera, untagged
+                        if self.viewer_subscriptions.pop(websocket, None) is not None:
+                            self.refresh_tier_subscribers()
+                            channel = self.viewer_channels.get(websocket)
+                            if channel is not None:
+                                channel.set_streams(1)
+                            await self.refresh_camera_demand()
+                        self.send_to_web_client(websocket, json.dumps({
+                            "type": "status",
+                            "message": "subscribed",
+                            "cameras": None
+                        }))
                     elif data.get('action') == 'get_settings':
                         camera_id = data.get('camera_id')
                         if camera_id:
@@ -720,18 +1077,44 @@ class WSServer:
                                     "motion": motion_settings
                                 }
                             }
-                            await websocket.send(json.dumps(settings_message))
+                            self.send_to_web_client(websocket, json.dumps(settings_message))
                     elif data.get('action') == 'command':
                         # Handle command messages
                         command = data.get('message')
                         camera_id = data.get('camera_id')
-                        if command and camera_id and camera_id in self.camera_clients:
+                        camera_websocket = self.cameras.websocket(camera_id) if camera_id else None
+                        if command and camera_websocket is not None:
                             # Forward the command to the specific camera
                             command_message = {
                                 "type": "command",
                                 "message": command
                             }
-                            await self.camera_clients[camera_id].send(json.dumps(command_message))
+                            await camera_websocket.send(json.dumps(command_message))
+                    elif data.get('action') == 'profile':
+                        # Profile a camera's processing thread for a fixed window
+                        camera_id = data.get('camera_id')
+                        try:
+                            run = self.profiler.start(
+                                camera_id,
+                                mode=data.get('mode', 'sample'),
+                                duration=data.get('duration', 10.0),
+                                interval=data.get('interval', 0.005)
+                            )
+                            self.profile_requesters.setdefault(camera_id, []).append(websocket)
+                            reply = {"type": "profile", "status": "started", **run.status()}
+                        except (ValueError, RuntimeError) as e:
+                            reply = {"type": "profile", "status": "error", "camera_id": camera_id, "message": str(e)}
+                        self.send_to_web_client(websocket, json.dumps(reply))
+                    elif data.get('action') == 'profile_report':
+                        # Return the latest finished profile report of a camera
+                        camera_id = data.get('camera_id')
+                        report = self.profiler.report(camera_id)
+                        self.send_to_web_client(websocket, json.dumps({
+                            "type": "profile",
+                            "status": "report" if report is not None else "unavailable",
+                            "camera_id": camera_id,
+                            "report": report
+                        }))
                     elif data.get('action') == 'settings':
                         # Handle settings messages
                         settings = data.get('data')
@@ -739,29 +1122,31 @@ class WSServer:
                             await self.handle_settings(settings, websocket)
             else:
                 # Handle binary messages (camera frames)
-                camera_id = self._get_camera_id_from_websocket(websocket)
-                if camera_id:
-                    self.device_status['cameras'][camera_id]['last_seen'] = time.time()
+                start_time = time.perf_counter()
+                session = self.cameras.for_websocket(websocket)
+                if session is not None:
+                    self.device_status['cameras'][session.camera_id]['last_seen'] = time.time()
                     
                     # Start processing thread if not already running
-                    self.start_processing_thread(camera_id)
+                    if not session.is_processing():
+                        self.start_processing_thread(session.camera_id)
                     
-                    # Add frame to processing queue
-                    if camera_id in self.frame_queues:
-                        self.frame_queues[camera_id].put(message)
-                    else:
-                        print(f"[-] No frame queue found for camera {camera_id}")
+                    # Add frame to processing mailbox, replacing any frame not yet processed
+                    session.mailbox.put(message)
                     
-                    await self.broadcast_status()
+                    self.status_publisher.mark_dirty()
+                    camera_metrics = self.metrics.camera(session.camera_id)
+                    camera_metrics.frames_in += 1
+                    camera_metrics.bytes_in += len(message)
+                    camera_metrics.observe('ingest', time.perf_counter() - start_time)
                 else:
-                    print("[-] Received frame from unknown camera")
+                    logger.warning("[-] Received frame from unknown camera")
         except Exception as e:
-            print(f"[-] Error handling message: {str(e)}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("[-] Error handling message: %s", e)
     
     async def start(self):
         """Start the WebSocket server"""
+        self.loop = asyncio.get_running_loop()  # Processing threads hand frames to this loop
         async with websockets.serve(
             self._handler,
             self.host,
@@ -775,10 +1160,14 @@ class WSServer:
             read_limit=2**16,  # 64KB read buffer
             write_limit=2**16  # 64KB write buffer
         ):
-            print(f"[+] WebSocket server started on ws://{self.host}:{self.port}")
+            logger.info("[+] WebSocket server started on ws://%s:%s", self.host, self.port)
+            self.status_publisher.start()
+            self.start_throttle()
+            if self.bus is not None:
+                await self.bus.start()
             await asyncio.Future()  # run forever
     
-    async def _handler(self, websocket, path):
+    async def _handler(self, websocket, path=None):
         """Handle new WebSocket connections"""
         await self.register(websocket)
         try:
@@ -791,41 +1180,46 @@ class WSServer:
     
     def cleanup(self):
         """Clean up resources before server shutdown"""
-        print("[+] Cleaning up server resources...")
+        logger.info("[+] Cleaning up server resources...")
         
-        # Stop all processing threads
-        for camera_id in list(self.processing_threads.keys()):
-            self.stop_processing_thread(camera_id)
+        # Stop all processing threads and drop every camera session in one step
+        sessions = self.cameras.clear()
+        for session in sessions:
+            session.stop_processing()
         
-        # Clear all queues
-        for camera_id in list(self.frame_queues.keys()):
-            while not self.frame_queues[camera_id].empty():
-                try:
-                    self.frame_queues[camera_id].get_nowait()
-                except Empty:
-                    break
-            self.frame_queues[camera_id].put(None)  # Poison pill
+        # Stop all web client sender tasks
+        for channel in list(self.viewer_channels.values()):
+            try:
+                channel.close()
+            except RuntimeError:
+                pass  # Event loop already closed
+        self.viewer_channels.clear()
+
+        # Finish writing recordings still queued for disk
+        if self.recorder is not None:
+            self.recorder.close()
+
+        # Write any settings change still waiting for its debounce timer
+        self.settings_store.close()
+
+        # Disconnect fan-out and HTTP processes
+        if self.bus is not None:
+            self.bus.close()
         
-        # Clear all dictionaries
-        self.prev_frames.clear()
-        self.frame_queues.clear()
-        self.processing_threads.clear()
-        self.stop_processing.clear()
-        self.thread_locks.clear()
-        self.frame_counts.clear()
-        self.last_fps_update.clear()
-        self.fps.clear()
-        self.frame_times.clear()
-        self.last_frame_time.clear()
+        # Stop motion worker processes and free their shared memory
+        if self.worker_pool is not None:
+            self.worker_pool.shutdown()
+            self.worker_pool = None
         
-        # Shutdown thread pool
-        self.thread_pool.shutdown(wait=True)
+        # Free the frame rings now that no thread or worker writes to them
+        for session in sessions:
+            session.close_ring()
         
         # Close event loop if it's still running
         if not self.loop.is_closed():
             self.loop.close()
         
-        print("[+] Server cleanup completed")
+        logger.info("[+] Server cleanup completed")
 
     def __del__(self):
         """Cleanup when the server is destroyed"""
@@ -848,20 +1242,24 @@ class WSServer:
                     read_limit=2**16,  # 64KB read buffer
                     write_limit=2**16  # 64KB write buffer
                 )
-                print(f"[+] WebSocket server running on ws://{self.host}:{self.port}")
+                logger.info("[+] WebSocket server running on ws://%s:%s", self.host, self.port)
+                self.status_publisher.start()
+                self.start_throttle()
+                if self.bus is not None:
+                    await self.bus.start()
                 await self.server.wait_closed()
             except Exception as e:
-                print(f"[-] Server error: {e}")
+                logger.error("[-] Server error: %s", e)
                 self.cleanup()  # Ensure cleanup on error
         
         try:
             # Run the server in the event loop
             self.loop.run_until_complete(main())
         except KeyboardInterrupt:
-            print("[+] Shutting down WebSocket server")
+            logger.info("[+] Shutting down WebSocket server")
             self.cleanup()  # Ensure cleanup on interrupt
         except Exception as e:
-            print(f"[-] Server error: {e}")
+            logger.error("[-] Server error: %s", e)
             self.cleanup()  # Ensure cleanup on error
         finally:
             self.cleanup()  # Ensure cleanup in all cases 
\ No newline at end of file
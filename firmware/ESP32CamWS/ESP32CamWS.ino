@@ -68,6 +68,9 @@ struct CameraSettings {
     int vflip;
 } cameraSettings;
 
+// Milliseconds between frames, raised by the hub to save power when nobody watches this camera
+unsigned long frameInterval = 50; // 20 fps target
+
 // Function to apply camera settings
 void applyCameraSettings() {
     // Get the sensor
@@ -164,6 +167,9 @@ void handleSettingsMessage(const char* message) {
         if (camera.containsKey("quality")) {
             cameraSettings.quality = camera["quality"].as<int>();
         }
+        if (camera.containsKey("frame_interval")) {
+            frameInterval = constrain(camera["frame_interval"].as<unsigned long>(), 20UL, 5000UL);
+        }
         if (camera.containsKey("brightness")) {
             cameraSettings.brightness = camera["brightness"].as<int>();
         }
@@ -696,6 +702,9 @@ void handle_json(const String& raw_data) {
             if (camera.containsKey("quality")) {
                 cameraSettings.quality = camera["quality"].as<int>();
             }
+            if (camera.containsKey("frame_interval")) {
+                frameInterval = constrain(camera["frame_interval"].as<unsigned long>(), 20UL, 5000UL);
+            }
             if (camera.containsKey("brightness")) {
                 cameraSettings.brightness = camera["brightness"].as<int>();
             }
@@ -824,7 +833,6 @@ void handle_json(const String& raw_data) {
 }
 
 unsigned long lastFrame = 0;
-const unsigned long frameInterval = 50; // 20 fps target
 size_t lastFrameSize = 0;
 unsigned long lastFrameTime = 0;
 const unsigned long frameTimeout = 1000; // 1 second timeout for frame transmission
@@ -1,34 +1,158 @@
 #!/usr/bin/env python3
 # file: main.py
+import logging
+import multiprocessing
 import os
+import signal
 import sys
 import threading
 import time
 
 # Import Websocket and Flask servers
 from classes.WSServer import WSServer
+from classes.FanoutServer import FanoutServer
+from classes.FrameBus import BusFrameFeed
 import classes.FlaskServer as fs
+from classes.LatestFrameBuffer import LatestFrameBuffer
+from classes.LogPipeline import setup_logging
+from classes.Metrics import Metrics
+from classes.PipelineProfiler import PipelineProfiler
+from classes.ThumbnailCache import ThumbnailCache
+from classes.MotionEventStore import MotionEventStore
 
 # Configuration
 WSPORT = 5000
 FSPORT = 4242
+FRAME_QUEUE_DEPTH = 1  # Frames buffered per camera before newer frames overwrite older ones
+STREAM_MODE = 'annotated'  # 'passthrough' forwards camera JPEGs untouched and sends motion boxes as metadata
+STATUS_MAX_RATE = 2.0  # Maximum status broadcasts per second, changes in between are coalesced
+VIEWER_QUEUE_SIZE = 2  # Frames queued per web client before the oldest is dropped
+SLOW_VIEWER_POLICY = 'skip'  # 'skip' stale frames or 'disconnect' web clients that fall behind
+DETECTION_BACKEND = 'thread'  # 'process' runs decode/detection/encode in a worker process pool
+DETECTION_WORKERS = None  # Worker processes for the 'process' backend, defaults to the CPU count
+JPEG_CODEC = 'auto'  # 'auto' uses libjpeg-turbo (PyTurboJPEG) when available, otherwise OpenCV
+RECORDING_DIR = 'recordings'  # Motion events are saved here as MJPEG segments, None disables recording
+PRE_ROLL_SECONDS = 5.0  # Seconds of video kept in memory and saved before motion starts
+POST_ROLL_SECONDS = 5.0  # Seconds recorded after the last motion
+EVENTS_DB = 'motion_events.db'  # SQLite database of motion detections served by /api/events, None disables it
+SETTINGS_SAVE_DELAY = 1.0  # Seconds without settings changes before camera_settings.json is written
+DETECT_IDLE_STRIDE = 5  # While a camera is quiet, only every Nth frame is run through motion detection
+DETECT_ACTIVE_HOLD = 10.0  # Seconds a camera stays at full detection rate after its last motion
+DETECT_CPU_BUDGET = None  # CPU cores detection may use before low-priority cameras are slowed, None for no limit
+LOG_LEVEL = logging.INFO  # logging.DEBUG also logs settings payloads, written by a background thread either way
+THROTTLE_IDLE_DELAY = 30.0  # Seconds without viewers, recording or motion before a camera drops to low power, None disables
+DEPLOYMENT = 'single'  # 'split' runs camera ingest, viewer fan-out and HTTP in separate processes
+FANOUT_PROCESSES = 2  # Viewer-facing processes in the split deployment, all listening on FANOUT_PORT
+FANOUT_PORT = 5001  # Port web clients connect to in the split deployment, cameras keep using WSPORT
+BUS_PATH = '/tmp/espcam-bus.sock'  # Unix socket linking the processes of the split deployment
+FRAME_RING_SLOTS = 32  # Encoded frames held in each camera's shared memory ring
+FRAME_RING_SLOT_KB = 384  # Largest ring slot, rings are sized below it for the camera's resolution
+FRAME_RING_RELEASE_DELAY = 30.0  # Seconds a disconnected camera keeps its frame ring before it is freed
+THUMBNAIL_INTERVAL = 2.0  # Seconds between refreshes of each camera's preview thumbnail
+THUMBNAIL_CACHE_KB = 2048  # Memory held by preview thumbnails, least recently used cameras are evicted first
 
-def run_ws():
+def run_ws(event_store=None, frame_buffer=None, metrics=None, profiler=None, bus_path=None, thumbnails=None,
+           log_rate_limit=None):
     """Setup and run Websocket server"""
-    ws = WSServer(host='0.0.0.0', port=WSPORT)
+    ws = WSServer(host='0.0.0.0', port=WSPORT, frame_queue_depth=FRAME_QUEUE_DEPTH,
+                  stream_mode=STREAM_MODE, codec=JPEG_CODEC,
+                  status_max_rate=STATUS_MAX_RATE, viewer_queue_size=VIEWER_QUEUE_SIZE,
+                  slow_viewer_policy=SLOW_VIEWER_POLICY, detection_backend=DETECTION_BACKEND,
+                  detection_workers=DETECTION_WORKERS, settings_save_delay=SETTINGS_SAVE_DELAY,
+                  recording_dir=RECORDING_DIR, pre_roll=PRE_ROLL_SECONDS, post_roll=POST_ROLL_SECONDS,
+                  idle_stride=DETECT_IDLE_STRIDE, active_hold=DETECT_ACTIVE_HOLD, detect_cpu_budget=DETECT_CPU_BUDGET,
+                  throttle_idle_delay=THROTTLE_IDLE_DELAY, log_rate_limit=log_rate_limit,
+                  event_store=event_store, frame_buffer=frame_buffer, metrics=metrics, profiler=profiler,
+                  bus_path=bus_path, ring_slots=FRAME_RING_SLOTS, ring_slot_size=FRAME_RING_SLOT_KB * 1024,
+                  ring_release_delay=FRAME_RING_RELEASE_DELAY,
+                  thumbnails=thumbnails)
     print(f"[+] Starting WebSocket Server on port {WSPORT}")
     ws.run()
 
-def run_fs():
+def run_fs(event_store=None, frame_buffer=None, metrics=None, profiler=None, ws_port=WSPORT, thumbnails=None):
     """Setup and run Flask server"""
     print(f"[+] Starting Flask Server on port {FSPORT}")
-    fs.run(host='0.0.0.0', port=FSPORT)
+    fs.run(host='0.0.0.0', port=FSPORT, event_store=event_store, frame_buffer=frame_buffer, metrics=metrics,
+           profiler=profiler, ws_port=ws_port, thumbnails=thumbnails)
+
+def run_ingest():
+    """Split deployment: the process owning the cameras, publishing to the frame bus"""
+    log_rate_limit = setup_logging(level=LOG_LEVEL)
+    event_store = MotionEventStore(EVENTS_DB) if EVENTS_DB else None
+    # Refreshes are timed here, the HTTP process keeps its own copy of the thumbnails sent over the bus
+    thumbnails = ThumbnailCache(THUMBNAIL_CACHE_KB * 1024, THUMBNAIL_INTERVAL)
+    run_ws(event_store=event_store, metrics=Metrics(), profiler=PipelineProfiler(), bus_path=BUS_PATH,
+           thumbnails=thumbnails, log_rate_limit=log_rate_limit)
+
+def run_fanout(index):
+    """Split deployment: one of the processes serving web clients from the frame bus"""
+    setup_logging(level=LOG_LEVEL)
+    FanoutServer(BUS_PATH, port=FANOUT_PORT, name=f'fanout-{index}', viewer_queue_size=VIEWER_QUEUE_SIZE,
+                 slow_viewer_policy=SLOW_VIEWER_POLICY).run()
+
+def main_split():
+    """Run ingest and each fan-out in its own process, HTTP in this one"""
+    # Children are started before any thread exists in this process
+    processes = [multiprocessing.Process(target=run_ingest, name='ingest')]
+    processes += [multiprocessing.Process(target=run_fanout, args=(index,), name=f'fanout-{index}')
+                  for index in range(FANOUT_PROCESSES)]
+    for process in processes:
+        process.start()
+    setup_logging(level=LOG_LEVEL)
+    event_store = MotionEventStore(EVENTS_DB) if EVENTS_DB else None
+    # Full-tier frames, thumbnails and metrics mirrored from the ingest process for the HTTP routes
+    frame_buffer = LatestFrameBuffer()
+    thumbnails = ThumbnailCache(THUMBNAIL_CACHE_KB * 1024, THUMBNAIL_INTERVAL)
+    feed = BusFrameFeed(BUS_PATH, frame_buffer, thumbnails=thumbnails)
+    feed.start()
+    fs_thread = threading.Thread(target=run_fs, args=(event_store, frame_buffer, feed.metrics, None, FANOUT_PORT,
+                                                      thumbnails), daemon=True)
+    fs_thread.start()
+
+    print(f"[+] Web interface available at http://localhost:{FSPORT}")
+    print(f"[i] Cameras connect on port {WSPORT}, web clients on port {FANOUT_PORT} "
+          f"({FANOUT_PROCESSES} fan-out processes)")
+    print("[i] Use CTRL+C to exit")
+
+    try:
+        while all(process.is_alive() for process in processes):
+            time.sleep(0.5)
+        print("[-] A hub process exited, shutting down")
+        # SIGINT lets each process run its own cleanup, such as writing pending settings
+        for process in processes:
+            if process.is_alive():
+                os.kill(process.pid, signal.SIGINT)
+    except KeyboardInterrupt:
+        # CTRL+C already reached the children, they are cleaning up
+        print("\n[+] Shutting down servers...")
+    for process in processes:
+        process.join(timeout=5.0)
+        if process.is_alive():
+            process.terminate()
+    if event_store is not None:
+        event_store.close()
+    sys.exit(0)
 
 def main():
     """Run both servers in separate threads"""
+    # Route log records of both servers through the background log writer before either starts
+    log_rate_limit = setup_logging(level=LOG_LEVEL)
+    # Motion events are written by the WebSocket server and queried through the Flask API
+    event_store = MotionEventStore(EVENTS_DB) if EVENTS_DB else None
+    # Latest encoded frame of each camera, published by the WebSocket server for the HTTP routes
+    frame_buffer = LatestFrameBuffer()
+    # Frame pipeline instrumentation, exported by Flask at /metrics
+    metrics = Metrics()
+    # On-demand profiling of a camera's pipeline, started over WS or POST /profile/<camera_id>
+    profiler = PipelineProfiler()
+    # Low-rate camera previews for the camera list, pushed over WS and served by Flask at /thumbnail/<camera_id>
+    thumbnails = ThumbnailCache(THUMBNAIL_CACHE_KB * 1024, THUMBNAIL_INTERVAL)
+
     # Create the threads
-    ws_thread = threading.Thread(target=run_ws, daemon=True)
-    fs_thread = threading.Thread(target=run_fs, daemon=True)
+    ws_thread = threading.Thread(target=run_ws, args=(event_store, frame_buffer, metrics, profiler, None, thumbnails,
+                                                      log_rate_limit), daemon=True)
+    fs_thread = threading.Thread(target=run_fs, args=(event_store, frame_buffer, metrics, profiler, WSPORT, thumbnails),
+                                 daemon=True)
 
     # Start threads
     ws_thread.start()
@@ -43,6 +167,8 @@ def main():
             time.sleep(0.1)
     except KeyboardInterrupt:
         print("\n[+] Shutting down servers...")
+        if event_store is not None:
+            event_store.close()
         sys.exit(0)
 
 if __name__ == "__main__":
@@ -50,4 +176,7 @@ if __name__ == "__main__":
     os.makedirs('classes', exist_ok=True)
     
     # Run the main function
-    main()
\ No newline at end of file
+    if DEPLOYMENT == 'split':
+        main_split()
+    else:
+        main()
\ No newline at end of file
@@ -9,6 +9,15 @@ window.oncontextmenu = function () { return false; }
 let ws = null;
 let selectedCameraId = null;
 let lastFrameTime = null;  // Add variable for tracking frame timing
+let motionBoxes = null;  // Latest motion metadata for the selected camera (pass-through mode)
+let deviceStatus = null;  // Device status kept up to date from snapshots and deltas
+let pipelineMetrics = null;  // Latest per-stage latency summary sent by the server
+let streamTier = localStorage.getItem('streamTier') || 'full';  // Quality tier the stream is watched in
+let gridMode = localStorage.getItem('gridMode') === 'true';  // Show every camera in a grid over this one connection
+let subscribedCameras = '';  // Camera ids of the last subscription, to resubscribe only when they change
+const GRID_TIER = 'thumb';  // Quality tier of grid tiles
+const GRID_MAX_FPS = 5;  // Frames per second each grid tile is sent at most
+const FRAME_TAG_SIZE = 14;  // Version, camera id length, sequence and timestamp ahead of each frame's camera id
 
 // Settings state
 let cameraSettings = {};  // Store settings for each camera
@@ -73,7 +82,8 @@ function createDefaultSettings(cameraId) {
 			minArea: 4000,
 			threshold: 25,
 			blurSize: 31,
-			dilation: 3
+			dilation: 3,
+			engine: 'framediff'
 		}
 	};
 }
@@ -135,6 +145,9 @@ function updateSettingsUI() {
 		document.getElementById('blur-size').value = settings.motion.blurSize;
 		document.getElementById('dilation').value = settings.motion.dilation;
 		document.getElementById('dilation-value').textContent = settings.motion.dilation;
+		document.getElementById('motion-engine').value = settings.motion.engine || 'framediff';
+		const zones = settings.motion.zones || [];
+		document.getElementById('motion-zones').value = zones.length ? JSON.stringify(zones) : '';
 	} catch (e) {
 		console.log("[-] Error updating settings UI:", e);
 	}
@@ -299,6 +312,11 @@ function updateStatus(data) {
 				fpsCounter.textContent = `FPS: ${fps.toFixed(1)}`;
 			}
 
+			// Keep one grid tile and preview per camera and the subscription in line with the camera list
+			updateGrid(data.cameras);
+			updatePreviews(data.cameras);
+			subscribeCameras();
+
 			// Show/hide stream and loading message based on selected camera connection status
 			const stream = document.getElementById("stream");
 			const loading = document.getElementById("loading");
@@ -352,6 +370,221 @@ function updateStatus(data) {
 	}
 }
 
+// Show the selected camera's pipeline stage latencies as the FPS counter tooltip
+function showPipelineMetrics() {
+	const fpsCounter = document.getElementById("fps-counter");
+	if (!fpsCounter || !pipelineMetrics || !selectedCameraId) {
+		return;
+	}
+	const camera = pipelineMetrics.cameras[selectedCameraId];
+	if (!camera) {
+		fpsCounter.title = '';
+		return;
+	}
+	const lines = Object.entries(camera.stages).map(
+		([stage, summary]) => `${stage}: ${summary.recent_ms.toFixed(2)} ms (p95 ${summary.p95_ms} ms)`
+	);
+	lines.push(`viewer lag p95: ${pipelineMetrics.viewer_send_lag.p95_ms} ms`);
+	fpsCounter.title = lines.join('\n');
+}
+
+// Merge a status delta from the server into the current device status
+function applyStatusDelta(delta) {
+	if (!deviceStatus) {
+		deviceStatus = { cameras: {}, web_clients: 0 };
+	}
+	Object.entries(delta).forEach(([key, value]) => {
+		if (key !== 'cameras') {
+			deviceStatus[key] = value;
+		}
+	});
+	if (delta.cameras) {
+		deviceStatus.cameras = deviceStatus.cameras || {};
+		Object.entries(delta.cameras).forEach(([cameraId, fields]) => {
+			if (fields === null) {
+				delete deviceStatus.cameras[cameraId];
+			} else {
+				const camera = Object.assign(deviceStatus.cameras[cameraId] || {}, fields);
+				Object.keys(fields).forEach((field) => {
+					if (fields[field] === null) {
+						delete camera[field];  // Field removed on the hub
+					}
+				});
+				deviceStatus.cameras[cameraId] = camera;
+			}
+		});
+	}
+	return deviceStatus;
+}
+
+// Split a binary frame into the camera id, sequence and timestamp of its tag and the JPEG after it
+function parseFrame(buffer) {
+	const view = new DataView(buffer);
+	if (buffer.byteLength < FRAME_TAG_SIZE || view.getUint8(0) !== 1) {
+		return null;
+	}
+	const idLength = view.getUint8(1);
+	const start = FRAME_TAG_SIZE + idLength;
+	return {
+		cameraId: new TextDecoder().decode(new Uint8Array(buffer, FRAME_TAG_SIZE, idLength)),
+		seq: view.getUint32(2),
+		timestamp: view.getFloat64(6) * 1000,
+		jpeg: new Blob([new Uint8Array(buffer, start)], { type: 'image/jpeg' })
+	};
+}
+
+// Show a frame in an image element, releasing the previous frame's object URL once the new one loads
+function showFrame(img, jpeg, onload) {
+	const url = URL.createObjectURL(jpeg);
+	img.onload = () => {
+		if (img.dataset.objectUrl) {
+			URL.revokeObjectURL(img.dataset.objectUrl);
+		}
+		img.dataset.objectUrl = url;
+		if (onload) {
+			onload();
+		}
+	};
+	img.src = url;
+}
+
+// Tell the server which cameras to send over this connection: every camera as grid thumbnails, or the selected one
+function subscribeCameras() {
+	if (!ws || ws.readyState !== WebSocket.OPEN) {
+		return;
+	}
+	const cameras = {};
+	if (gridMode && deviceStatus && deviceStatus.cameras) {
+		Object.keys(deviceStatus.cameras).forEach(cameraId => {
+			cameras[cameraId] = { tier: GRID_TIER, max_fps: GRID_MAX_FPS };
+		});
+	} else if (selectedCameraId) {
+		cameras[selectedCameraId] = { tier: streamTier };
+	}
+	const key = JSON.stringify(cameras);
+	if (key === subscribedCameras) {
+		return;
+	}
+	subscribedCameras = key;
+	ws.send(JSON.stringify({
+		type: 'web',
+		action: 'subscribe',
+		cameras: cameras
+	}));
+}
+
+// Keep one tile per camera in the grid, clicking a tile opens that camera
+function updateGrid(cameras) {
+	const grid = document.getElementById('camera-grid');
+	if (!grid) {
+		return;
+	}
+	Object.entries(cameras).forEach(([cameraId, cameraData]) => {
+		let tile = grid.querySelector(`[data-camera-id="${CSS.escape(cameraId)}"]`);
+		if (!tile) {
+			tile = document.createElement('div');
+			tile.className = 'camera-tile';
+			tile.dataset.cameraId = cameraId;
+			tile.innerHTML = '<img alt=""><span class="camera-tile-label"></span>';
+			tile.addEventListener('click', () => {
+				document.getElementById('camera-select').value = cameraId;
+				selectCamera(cameraId);
+				setGridMode(false);
+			});
+			grid.appendChild(tile);
+		}
+		tile.querySelector('.camera-tile-label').textContent = cameraData.name || cameraId;
+		tile.classList.toggle('disconnected', !cameraData.connected);
+	});
+	grid.querySelectorAll('.camera-tile').forEach(tile => {
+		if (!cameras[tile.dataset.cameraId]) {
+			tile.remove();
+		}
+	});
+}
+
+// Keep one thumbnail preview per camera under the camera list, clicking a preview selects that camera
+function updatePreviews(cameras) {
+	const previews = document.getElementById('camera-previews');
+	if (!previews) {
+		return;
+	}
+	Object.entries(cameras).forEach(([cameraId, cameraData]) => {
+		let preview = previews.querySelector(`[data-camera-id="${CSS.escape(cameraId)}"]`);
+		if (!preview) {
+			preview = document.createElement('div');
+			preview.className = 'camera-tile';
+			preview.dataset.cameraId = cameraId;
+			preview.innerHTML = '<img alt=""><span class="camera-tile-label"></span>';
+			const img = preview.querySelector('img');
+			// The cached thumbnail, if the camera sent one yet, until the server announces a newer one
+			img.onerror = () => img.removeAttribute('src');
+			img.src = `/thumbnail/${encodeURIComponent(cameraId)}`;
+			preview.addEventListener('click', () => {
+				document.getElementById('camera-select').value = cameraId;
+				selectCamera(cameraId);
+				setGridMode(false);
+				updatePreviews(deviceStatus ? deviceStatus.cameras : cameras);
+			});
+			previews.appendChild(preview);
+		}
+		preview.querySelector('.camera-tile-label').textContent = cameraData.name || cameraId;
+		preview.classList.toggle('disconnected', !cameraData.connected);
+		preview.classList.toggle('selected', cameraId === selectedCameraId);
+	});
+	previews.querySelectorAll('.camera-tile').forEach(preview => {
+		if (!cameras[preview.dataset.cameraId]) {
+			preview.remove();
+		}
+	});
+}
+
+// Load a camera's refreshed thumbnail, the ETag in the URL keeps the browser from showing a stale copy
+function showThumbnail(data) {
+	const previews = document.getElementById('camera-previews');
+	const preview = previews && previews.querySelector(`[data-camera-id="${CSS.escape(data.camera_id)}"]`);
+	if (preview) {
+		preview.querySelector('img').src = `${data.url}?v=${encodeURIComponent(data.etag)}`;
+	}
+}
+
+// Switch between the selected camera's stream and the grid of every camera
+function setGridMode(enabled) {
+	gridMode = enabled;
+	localStorage.setItem('gridMode', enabled);
+	document.getElementById('grid-view').checked = enabled;
+	document.getElementById('camera-grid').classList.toggle('hidden', !enabled);
+	document.getElementById('stream-wrapper').classList.toggle('hidden', enabled);
+	subscribeCameras();
+}
+
+// Draw motion boxes from pass-through metadata over the stream image
+function drawMotionOverlay() {
+	const stream = document.getElementById('stream');
+	const canvas = document.getElementById('motion-overlay');
+	if (!stream || !canvas) {
+		return;
+	}
+
+	// Keep the canvas the same size as the displayed image
+	canvas.width = stream.clientWidth;
+	canvas.height = stream.clientHeight;
+	const ctx = canvas.getContext('2d');
+	ctx.clearRect(0, 0, canvas.width, canvas.height);
+
+	if (!motionBoxes || motionBoxes.camera_id !== selectedCameraId || !motionBoxes.boxes.length) {
+		return;
+	}
+
+	const scaleX = canvas.width / motionBoxes.width;
+	const scaleY = canvas.height / motionBoxes.height;
+	ctx.strokeStyle = '#00ff00';
+	ctx.lineWidth = 2;
+	motionBoxes.boxes.forEach(([x, y, w, h]) => {
+		ctx.strokeRect(x * scaleX, y * scaleY, w * scaleX, h * scaleY);
+	});
+}
+
 // Add camera name editing functionality
 function editCameraName(cameraId, currentName) {
 	const newName = prompt("Enter new camera name:", currentName);
@@ -410,7 +643,6 @@ function WSConnection(host, port) {
 	
 	// Variables for stream handling
 	let stream_started = false;
-	let urlObject = null;
 	let reconnectAttempts = 0;
 	const maxReconnectAttempts = 5;
 	const reconnectDelay = 5000; // 5 seconds
@@ -431,7 +663,9 @@ function WSConnection(host, port) {
 	
 	try {
 		ws = new WebSocket(WS_URL);
+		ws.binaryType = 'arraybuffer';  // Frames are read through their tag before being shown
 		ws.hasInitialSelection = false;  // Initialize the flag
+		subscribedCameras = '';
 		console.log("[+] WebSocket object created");
 		
 		// Set up connection timeout
@@ -466,10 +700,12 @@ function WSConnection(host, port) {
 					const selectMessage = {
 						type: 'web',
 						action: 'select_camera',
-						camera_id: selectedCameraId
+						camera_id: selectedCameraId,
+						tier: streamTier
 					};
 					ws.send(JSON.stringify(selectMessage));
 				}
+				subscribeCameras();
 				
 				// Send current settings after connection
 				sendSettings();
@@ -505,13 +741,21 @@ function WSConnection(host, port) {
 
 		ws.onmessage = function(event) {
 			try {
-				// Check if the message is binary (Blob)
-				if (event.data instanceof Blob) {
-					// Only show the stream if we have a selected camera
-					if (selectedCameraId) {
+				// Binary messages are frames tagged with their camera
+				if (event.data instanceof ArrayBuffer) {
+					const frame = parseFrame(event.data);
+					if (!frame) {
+						return;
+					}
+					if (gridMode) {
+						const tile = document.querySelector(`#camera-grid [data-camera-id="${CSS.escape(frame.cameraId)}"] img`);
+						if (tile) {
+							showFrame(tile, frame.jpeg);
+						}
+					} else if (frame.cameraId === selectedCameraId) {
+						// Redraw any motion boxes on top once the frame is shown
 						const stream = document.getElementById('stream');
-						const url = URL.createObjectURL(event.data);
-						stream.src = url;
+						showFrame(stream, frame.jpeg, drawMotionOverlay);
 						stream.classList.remove('hidden');
 						document.getElementById('loading').classList.add('hidden');
 					}
@@ -524,6 +768,7 @@ function WSConnection(host, port) {
 				if (data && data.type === 'status') {
 					// Check if data.data exists before updating status
 					if (data.data) {
+						deviceStatus = data.data;
 						updateStatus(data.data);
 						// If we have a selected camera but it's not in the status, clear the selection
 						if (selectedCameraId && (!data.data.cameras || !data.data.cameras[selectedCameraId])) {
@@ -535,6 +780,21 @@ function WSConnection(host, port) {
 					} else {
 						console.log("[-] Received status message without data");
 					}
+				} else if (data && data.type === 'status_delta') {
+					// Only changed fields are sent, merge them before refreshing the display
+					if (data.data) {
+						updateStatus(applyStatusDelta(data.data));
+					}
+				} else if (data && data.type === 'metrics') {
+					// Per-stage latency summary, shown as the FPS counter tooltip
+					pipelineMetrics = data.data;
+					showPipelineMetrics();
+				} else if (data && data.type === 'thumbnail') {
+					// A camera's preview was refreshed, fetched over HTTP from the thumbnail cache
+					showThumbnail(data);
+				} else if (data && data.type === 'motion') {
+					// Motion boxes for the next pass-through frame, drawn when it loads
+					motionBoxes = data;
 				} else if (data && data.type === 'settings') {
 					// Handle settings received from server
 					if (data.data && selectedCameraId) {
@@ -761,6 +1021,8 @@ document.addEventListener('DOMContentLoaded', function() {
 	
 	// Load saved settings
 	loadSettings();
+	document.getElementById('stream-tier').value = streamTier;
+	setGridMode(gridMode);
 	
 	// Add event listener for edit name button
 	const editButton = document.getElementById("edit-camera-name");
@@ -809,6 +1071,14 @@ document.addEventListener('DOMContentLoaded', function() {
 		document.getElementById('dilation-value').textContent = e.target.value;
 	});
 	
+	document.getElementById('motion-engine').addEventListener('change', function(e) {
+		if (!selectedCameraId || !cameraSettings[selectedCameraId]) {
+			console.error('No camera selected or settings not found');
+			return;
+		}
+		cameraSettings[selectedCameraId].motion.engine = e.target.value;
+	});
+
 	// Update motion settings apply button handler
 	document.getElementById('apply-motion-settings').addEventListener('click', function() {
 		console.log("[+] Applying motion settings:", cameraSettings[selectedCameraId].motion);
@@ -947,12 +1217,36 @@ document.addEventListener('DOMContentLoaded', function() {
 		settings.motion.threshold = parseInt(document.getElementById('threshold').value);
 		settings.motion.blurSize = parseInt(document.getElementById('blur-size').value);
 		settings.motion.dilation = parseInt(document.getElementById('dilation').value);
+		settings.motion.engine = document.getElementById('motion-engine').value;
 
 		// Save settings and send to server
 		saveSettings();
 		sendSettings();
 	});
 	
+	// Zones are sent on their own, so a typo never resends the other motion settings
+	document.getElementById('apply-motion-zones').addEventListener('click', function() {
+		if (!selectedCameraId || !cameraSettings[selectedCameraId] || !ws || ws.readyState !== WebSocket.OPEN) {
+			console.error('No camera selected or not connected');
+			return;
+		}
+		const text = document.getElementById('motion-zones').value.trim();
+		let zones;
+		try {
+			zones = text ? JSON.parse(text) : [];
+		} catch (e) {
+			alert('Motion zones must be valid JSON: ' + e.message);
+			return;
+		}
+		cameraSettings[selectedCameraId].motion.zones = zones;
+		saveSettings();
+		ws.send(JSON.stringify({
+			type: 'web',
+			action: 'settings',
+			data: {motion: {zones: zones}}
+		}));
+	});
+
 	// Set up LED control buttons
 	const ledOnBtn = document.getElementById('led-on');
 	const ledOffBtn = document.getElementById('led-off');
@@ -979,11 +1273,18 @@ document.addEventListener('DOMContentLoaded', function() {
 	
 	// Auto-connect to the server
 	const host = "192.168.0.156";
-	const port = "5000";
+	const port = document.body.dataset.wsPort || "5000";
 	console.log("[+] Auto-connecting to server:", host, ":", port);
 	ws = WSConnection(host, port);
 });
 
+// Switch the stream to another quality tier, e.g. thumbnails on a weak connection
+function selectTier(tier) {
+	streamTier = tier;
+	localStorage.setItem('streamTier', tier);
+	subscribeCameras();
+}
+
 // handle camera selection
 function selectCamera(cameraId) {
 	if (!cameraId) {
@@ -998,9 +1299,11 @@ function selectCamera(cameraId) {
 		const message = {
 			type: 'web',
 			action: 'select_camera',
-			camera_id: cameraId
+			camera_id: cameraId,
+			tier: streamTier
 		};
 		ws.send(JSON.stringify(message));
+		subscribeCameras();
 		
 		// Request settings from server
 		const settingsMessage = {
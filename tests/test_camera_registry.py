@@ -0,0 +1,51 @@
+# file: tests/test_camera_registry.py
+import threading
+
+from classes.CameraRegistry import CameraRegistry
+
+
+def test_stuck_thread_blocks_a_second_processing_thread():
+    session = CameraRegistry().session('0')
+    release = threading.Event()
+    started = []
+
+    def stuck(camera_id):
+        started.append(camera_id)
+        release.wait()  # Stands in for a decode or worker call that outlives the stop timeout
+
+    assert session.start_processing(stuck)
+    assert session.stop_processing(timeout=0.01)
+    assert session.is_processing()
+    assert not session.start_processing(stuck)
+    assert len(started) == 1
+
+    release.set()
+    session.thread.join()
+    assert not session.is_processing()
+    assert session.start_processing(lambda camera_id: None)
+    session.thread.join()
+
+
+def test_stopped_thread_is_forgotten():
+    session = CameraRegistry().session('0')
+
+    def run(camera_id):
+        while session.mailbox.get(timeout=1.0) is not None:
+            pass
+
+    session.start_processing(run)
+    assert session.stop_processing()
+    assert session.thread is None
+    assert not session.stop_processing()
+
+
+def test_reattached_camera_replaces_its_old_connection():
+    registry = CameraRegistry()
+    old, new = object(), object()
+    registry.attach('0', old)
+    session = registry.attach('0', new)
+    assert registry.for_websocket(old) is None
+    assert registry.for_websocket(new) is session
+    assert registry.detach(old) is None
+    assert registry.detach(new) is session
+    assert registry.connected() == []
@@ -0,0 +1,133 @@
+# file: tests/test_camera_throttle.py
+import asyncio
+
+import websockets
+
+from benchmarks.fleet import FrameLibrary, SimulatedCamera, SimulatedViewer
+from classes.CameraThrottle import DEFAULT_FRAME_INTERVAL, LOW_POWER_PROFILE, CameraThrottle
+from classes.WSServer import WSServer
+
+OWN_SETTINGS = {'resolution': 'UXGA', 'quality': 10, 'frame_interval': 50, 'vflip': True}
+
+
+class CommandedCamera:
+    """Stands in for a connected camera, applying the settings the demand check pushes on every command"""
+
+    def __init__(self, camera_id, throttle):
+        self.camera_id = camera_id
+        self.throttle = throttle
+        self.settings = dict(OWN_SETTINGS)
+        self.commands = []
+
+    def tick(self, demand):
+        """One pass of the hub's once-per-second demand check"""
+        action = self.throttle.update(self.camera_id, demand)
+        if action is not None:
+            self.commands.append(action)
+            self.settings = self.throttle.settings_for(self.camera_id, OWN_SETTINGS)
+        return action
+
+
+def run(camera, clock, demand, seconds):
+    for _ in range(seconds):
+        camera.tick(demand)
+        clock.now += 1.0
+
+
+def make_camera(clock, idle_delay=30.0):
+    return CommandedCamera('0', CameraThrottle(idle_delay=idle_delay, clock=clock))
+
+
+def test_camera_is_throttled_only_after_the_idle_delay(clock):
+    camera = make_camera(clock, idle_delay=30.0)
+    run(camera, clock, False, 30)
+    assert camera.commands == []
+    assert camera.tick(False) == 'throttle'
+    assert camera.settings == {**OWN_SETTINGS, **LOW_POWER_PROFILE}
+    run(camera, clock, False, 60)
+    assert camera.commands == ['throttle']
+
+
+def test_demand_restores_the_cameras_own_settings_at_once(clock):
+    camera = make_camera(clock, idle_delay=5.0)
+    run(camera, clock, False, 6)
+    assert camera.tick(True) == 'restore'
+    assert camera.settings == OWN_SETTINGS
+    assert not camera.throttle.is_throttled('0')
+
+
+def test_flicking_demand_never_makes_the_camera_flap(clock):
+    camera = make_camera(clock, idle_delay=10.0)
+    for second in range(120):
+        camera.tick(second % 8 < 2)  # A viewer glances at the camera for 2 s every 8 s
+        clock.now += 1.0
+    assert camera.commands == []
+    assert camera.settings == OWN_SETTINGS
+
+
+def test_each_idle_period_costs_one_throttle_and_one_restore(clock):
+    camera = make_camera(clock, idle_delay=10.0)
+    for _ in range(3):
+        run(camera, clock, False, 20)
+        run(camera, clock, True, 5)
+    assert camera.commands == ['throttle', 'restore'] * 3
+    assert camera.throttle.changes == 6
+
+
+def test_forgotten_camera_starts_over(clock):
+    camera = make_camera(clock, idle_delay=5.0)
+    run(camera, clock, False, 10)
+    camera.throttle.forget('0')
+    assert camera.throttle.settings_for('0', OWN_SETTINGS) == OWN_SETTINGS
+    run(camera, clock, False, 5)
+    assert camera.commands == ['throttle']
+
+
+async def wait_until(condition, timeout=5.0):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not condition():
+        assert loop.time() < deadline, "timed out waiting for the hub"
+        await asyncio.sleep(0.01)
+
+
+def test_hub_pushes_the_low_power_profile_and_restores_own_settings(tmp_path):
+    server = WSServer(host='127.0.0.1', settings_file=str(tmp_path / 'camera_settings.json'),
+                      throttle_idle_delay=0.0, active_hold=0.0)
+    own = {'frame_interval': DEFAULT_FRAME_INTERVAL, **server.get_camera_settings('sim-0')}
+
+    async def scenario():
+        hub = await websockets.serve(server._handler, '127.0.0.1', 0)
+        url = f"ws://127.0.0.1:{hub.sockets[0].getsockname()[1]}"
+        camera = SimulatedCamera(url, 'sim-0', FrameLibrary(count=2, activity='static'), fps=10.0)
+        tasks = [asyncio.ensure_future(camera.run(10.0))]
+        try:
+            await wait_until(lambda: camera.settings_received)
+            assert camera.settings_received == [own]
+
+            # Nobody watches the camera: the next demand check throttles it
+            await server.refresh_camera_demand()
+            await wait_until(lambda: len(camera.settings_received) == 2)
+            assert camera.settings_received[1] == {**own, **LOW_POWER_PROFILE}
+            assert camera.interval == LOW_POWER_PROFILE['frame_interval'] / 1000.0
+
+            # A viewer selects it: the next check sends the camera's own settings back
+            tasks.append(asyncio.ensure_future(SimulatedViewer(url, camera).run(10.0)))
+            await wait_until(lambda: 'sim-0' in server.web_clients.values())
+            await server.refresh_camera_demand()
+            await wait_until(lambda: len(camera.settings_received) == 3)
+            assert camera.settings_received[2] == own
+            assert camera.frame_interval == DEFAULT_FRAME_INTERVAL
+            assert server.throttle.changes == 2
+        finally:
+            # Closing the hub first ends the clients' connections without waiting out their close timeout
+            hub.close()
+            await hub.wait_closed()
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    try:
+        server.loop.run_until_complete(scenario())
+    finally:
+        server.cleanup()
@@ -0,0 +1,71 @@
+# file: tests/test_detection_scheduler.py
+from classes.DetectionScheduler import MAX_DEGRADE_LEVEL, DetectionScheduler
+
+
+def make_scheduler(clock, **kwargs):
+    return DetectionScheduler(clock=clock, **kwargs)
+
+
+def window(scheduler, clock, costs):
+    """Spend the given detection seconds per camera over one budget window, then rebalance"""
+    for camera_id, cost in costs.items():
+        scheduler.camera(camera_id).cost += cost
+    clock.now += scheduler.window
+    scheduler.rebalance(clock.now)
+
+
+def test_idle_camera_is_checked_every_idle_stride_frames(clock):
+    scheduler = make_scheduler(clock, idle_stride=5)
+    decisions = [scheduler.should_detect('a') for _ in range(10)]
+    assert decisions == [True, False, False, False, False] * 2
+
+
+def test_motion_switches_to_every_frame_until_the_hold_expires(clock):
+    scheduler = make_scheduler(clock, idle_stride=5, active_hold=10.0)
+    scheduler.should_detect('a')
+    scheduler.record('a', motion=True, cost=0.0)
+    assert all(scheduler.should_detect('a') for _ in range(5))
+    clock.now += 10.0
+    assert scheduler.status('a')['mode'] == 'idle'
+    assert scheduler.status('a')['stride'] == 5
+
+
+def test_over_budget_degrades_the_lowest_priority_camera_one_level_per_window(clock):
+    scheduler = make_scheduler(clock, cpu_budget=1.0)
+    scheduler.should_detect('low', priority=0)
+    scheduler.should_detect('high', priority=5)
+    window(scheduler, clock, {'low': 0.8, 'high': 0.8})
+    assert scheduler.usage == 1.6
+    assert (scheduler.camera('low').level, scheduler.camera('high').level) == (1, 0)
+    for _ in range(MAX_DEGRADE_LEVEL):
+        window(scheduler, clock, {'low': 0.8, 'high': 0.8})
+    # Once the lowest priority camera is fully degraded the next one follows
+    assert (scheduler.camera('low').level, scheduler.camera('high').level) == (MAX_DEGRADE_LEVEL, 1)
+    assert scheduler.status('low')['stride'] == scheduler.idle_stride << MAX_DEGRADE_LEVEL
+
+
+def test_recovery_waits_until_the_doubled_cost_fits_the_budget(clock):
+    scheduler = make_scheduler(clock, cpu_budget=1.0)
+    for camera_id, priority in (('low', 0), ('high', 5)):
+        scheduler.should_detect(camera_id, priority=priority)
+        scheduler.camera(camera_id).level = 2
+    window(scheduler, clock, {'low': 0.35, 'high': 0.35})
+    assert (scheduler.camera('low').level, scheduler.camera('high').level) == (2, 2)  # 0.7 + 0.35 exceeds 0.9
+    window(scheduler, clock, {'low': 0.3, 'high': 0.2})
+    assert (scheduler.camera('low').level, scheduler.camera('high').level) == (2, 1)  # Highest priority first
+
+
+def test_rebalance_within_the_window_changes_nothing(clock):
+    scheduler = make_scheduler(clock, cpu_budget=1.0)
+    scheduler.camera('a').cost = 5.0
+    clock.now += scheduler.window / 2
+    scheduler.rebalance(clock.now)
+    assert scheduler.camera('a').level == 0
+    assert scheduler.camera('a').cost == 5.0
+
+
+def test_no_budget_only_measures_usage(clock):
+    scheduler = make_scheduler(clock)
+    window(scheduler, clock, {'a': 3.0})
+    assert scheduler.usage == 3.0
+    assert scheduler.camera('a').level == 0
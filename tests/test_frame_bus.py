@@ -0,0 +1,152 @@
+# file: tests/test_frame_bus.py
+import asyncio
+import time
+
+from classes.FrameBus import (CONTROL, FRAME, BusFrameFeed, BusLink, BusServer, pack_control, pack_frame,
+                              read_message)
+from classes.FramePipeline import DEFAULT_TIER
+from classes.FrameRing import pack_tag
+from classes.LatestFrameBuffer import LatestFrameBuffer
+from classes.Metrics import Metrics
+from classes.ThumbnailCache import Thumbnail, ThumbnailCache
+
+
+class FakeServer:
+    """The parts of WSServer the ingest side of the bus calls into"""
+
+    def __init__(self):
+        self.metrics = Metrics()
+        self.remote_demand = {}
+        self.selected = {}  # RemoteViewer -> camera_id
+        self.handled = []
+        self.unregistered = []
+
+    def add_web_client(self, viewer, channel):
+        self.selected[viewer] = None
+
+    async def handle_message(self, viewer, data):
+        self.handled.append((viewer.viewer_id, data))
+        self.selected[viewer] = data
+
+    async def unregister(self, viewer):
+        self.unregistered.append(viewer.viewer_id)
+        self.selected.pop(viewer, None)
+
+    def viewer_frame_tier(self, viewer, camera_id):
+        return DEFAULT_TIER if self.selected.get(viewer) == camera_id else None
+
+
+class FakeWriter:
+    def __init__(self):
+        self.data = bytearray()
+        self.transport = self
+        self.buffered = 0  # Bytes the peer has not read yet
+
+    def get_write_buffer_size(self):
+        return self.buffered
+
+    def write(self, data):
+        self.data += data
+
+    def writelines(self, chunks):
+        for chunk in chunks:
+            self.data += chunk
+
+    def is_closing(self):
+        return False
+
+    def close(self):
+        pass
+
+
+async def read_all(data):
+    reader = asyncio.StreamReader()
+    reader.feed_data(bytes(data))
+    reader.feed_eof()
+    messages = []
+    while not reader.at_eof():
+        kind, message = await read_message(reader)
+        if kind == FRAME:
+            meta, body = message
+            message = (meta, bytes(body))
+        messages.append((kind, message))
+    return messages
+
+
+async def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out waiting for the frame bus"
+        await asyncio.sleep(0.01)
+
+
+def test_messages_round_trip_with_the_tag_ahead_of_the_jpeg():
+    tag = pack_tag('0', 3, 1.5)
+    frame = b''.join(pack_frame({'camera': '0', 'tag': len(tag)}, tag, b'jpeg'))
+    data = pack_control({'op': 'hello', 'role': 'http'}) + frame
+    messages = asyncio.run(read_all(data))
+    assert messages == [(CONTROL, {'op': 'hello', 'role': 'http'}),
+                        (FRAME, ({'camera': '0', 'tag': len(tag)}, tag + b'jpeg'))]
+
+
+def test_fanout_link_runs_viewer_messages_and_batches_broadcasts():
+    server = FakeServer()
+    bus = BusServer(server, path='unused')
+    writer = FakeWriter()
+    link = BusLink(bus, writer)
+
+    async def scenario():
+        await link.handle({'op': 'hello', 'role': 'fanout', 'name': 'fanout-0'})
+        for viewer_id in (1, 2):
+            await link.handle({'op': 'join', 'viewer': viewer_id, 'address': ['10.0.0.5', 5000 + viewer_id]})
+        await link.handle({'op': 'message', 'viewer': 1, 'data': '0'})
+        message = '{"type":"status_delta"}'
+        for viewer in list(link.viewers):
+            link.send_to_viewer(viewer, message)  # One broadcast to both viewers
+        await asyncio.sleep(0)
+        link.publish_frame('0', {DEFAULT_TIER: b'jpeg'}, None, 1.0, b'')
+        writer.buffered = bus.max_buffer + 1  # The fan-out process stopped reading
+        link.publish_frame('0', {DEFAULT_TIER: b'jpeg'}, None, 2.0, b'')
+        await link.handle({'op': 'leave', 'viewer': 2})
+
+    asyncio.run(scenario())
+    assert server.handled == [(1, '0')]
+    assert server.unregistered == [2]
+    messages = asyncio.run(read_all(writer.data))
+    assert messages[0] == (CONTROL, {'op': 'send', 'viewers': [1, 2], 'data': '{"type":"status_delta"}'})
+    assert messages[1] == (FRAME, ({'camera': '0', 'tier': DEFAULT_TIER, 'time': 1.0, 'tag': 0}, b'jpeg'))
+    assert len(messages) == 2
+    assert (link.frames_sent, link.frames_dropped) == (1, 1)
+
+
+def test_http_process_mirrors_frames_thumbnails_and_demand(tmp_path):
+    server = FakeServer()
+    frame_buffer = LatestFrameBuffer()
+    thumbnails = ThumbnailCache()
+    path = str(tmp_path / 'bus.sock')
+
+    async def scenario():
+        bus = BusServer(server, path)
+        await bus.start()
+        feed = BusFrameFeed(path, frame_buffer, demand_window=10.0, thumbnails=thumbnails)
+        feed_task = asyncio.ensure_future(feed.run())
+        try:
+            await wait_until(lambda: bus.serves_http)
+            tag = pack_tag('0', 1, 2.0)
+            bus.publish_frame('0', {DEFAULT_TIER: b'jpeg', 'thumb': b'small'}, '{"type":"motion"}', tag)
+            bus.publish_thumbnail('0', Thumbnail(1, 2.0, b'preview', 'etag'))
+            await wait_until(lambda: frame_buffer.latest('0') is not None and thumbnails.get('0') is not None)
+            assert frame_buffer.latest('0').data == b'jpeg'  # The tag is cut off, only the full tier is sent
+            assert thumbnails.get('0').data == b'preview'
+
+            # The read above counts as demand, reported to the ingest process within a second
+            await wait_until(lambda: '0' in server.remote_demand, timeout=3.0)
+
+            bus.publish({'op': 'discard', 'camera': '0'})
+            await wait_until(lambda: frame_buffer.latest('0') is None)
+        finally:
+            feed_task.cancel()
+            await asyncio.gather(feed_task, return_exceptions=True)
+            bus.close()
+
+    asyncio.run(scenario())
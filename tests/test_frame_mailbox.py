@@ -0,0 +1,55 @@
+# file: tests/test_frame_mailbox.py
+from queue import Empty
+
+import pytest
+
+from classes.FrameMailbox import FrameMailbox
+
+
+def test_newest_frame_wins_at_depth_one():
+    mailbox = FrameMailbox(1)
+    assert mailbox.put(b'first') is False
+    assert mailbox.put(b'second') is True  # Evicted the first frame
+    assert mailbox.get_nowait() == b'second'
+    assert mailbox.stats() == {'received': 2, 'superseded': 1, 'dropped': 0, 'depth': 0}
+
+
+def test_deeper_mailbox_evicts_oldest_first():
+    mailbox = FrameMailbox(2)
+    for frame in (b'a', b'b', b'c'):
+        mailbox.put(frame)
+    assert mailbox.qsize() == 2
+    assert mailbox.get_nowait() == b'b'
+    assert mailbox.get_nowait() == b'c'
+    assert mailbox.superseded == 1
+
+
+def test_get_times_out_when_empty():
+    mailbox = FrameMailbox()
+    with pytest.raises(Empty):
+        mailbox.get(timeout=0.01)
+    with pytest.raises(Empty):
+        mailbox.get_nowait()
+
+
+def test_clear_and_mark_dropped_count_as_dropped():
+    mailbox = FrameMailbox(3)
+    mailbox.put(b'a')
+    mailbox.put(b'b')
+    mailbox.clear()
+    mailbox.mark_dropped(2)
+    assert mailbox.empty()
+    assert mailbox.dropped == 4
+
+
+def test_close_drops_pending_and_rejects_puts_until_reopened():
+    mailbox = FrameMailbox()
+    mailbox.put(b'pending')
+    mailbox.close()
+    assert mailbox.get(timeout=0.01) is None
+    assert mailbox.put(b'late') is False
+    assert mailbox.stats() == {'received': 1, 'superseded': 0, 'dropped': 2, 'depth': 0}
+    mailbox.reopen()
+    mailbox.put(b'again')
+    assert mailbox.get(timeout=0.01) == b'again'
+    assert mailbox.last_wait >= 0.0
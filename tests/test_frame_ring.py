@@ -0,0 +1,107 @@
+# file: tests/test_frame_ring.py
+import pytest
+
+from classes.FrameRing import RESERVE_MARGIN, TAG_ROOM, FrameRing, pack_tag, tag_frame, unpack_tag
+from classes.WSServer import WSServer
+
+
+@pytest.fixture
+def ring():
+    ring = FrameRing(slots=RESERVE_MARGIN + 4, slot_size=1024)
+    yield ring
+    ring.close()
+
+
+def test_written_frame_reads_back(ring):
+    ref = ring.write(b'jpeg-1')
+    assert len(ref) == 6
+    assert ref.tobytes() == b'jpeg-1'
+    view = ref.view()
+    assert bytes(view) == b'jpeg-1'
+    view.release()
+
+
+def test_frame_stays_readable_until_the_reserve_margin(ring):
+    first = ring.write(b'first')
+    readable_for = ring.slots - RESERVE_MARGIN
+    for index in range(readable_for - 1):
+        ring.write(b'frame-%d' % index)
+    assert first.tobytes() == b'first'
+    ring.write(b'one-more')  # The slot is now within RESERVE_MARGIN of being reused
+    assert not ring.readable(first)
+    assert first.view() is None
+    assert first.tobytes() is None
+
+
+def test_reused_slot_is_not_mistaken_for_the_old_frame(ring):
+    first = ring.write(b'first')
+    for index in range(ring.slots):
+        ring.write(b'frame-%d' % index)
+    assert first.slot == ring.head % ring.slots
+    assert first.tobytes() is None
+
+
+def test_reserved_slot_is_unreadable_until_committed(ring):
+    ref = ring.write(b'old')
+    for _ in range(ring.slots - 1):
+        ring.write(b'filler')
+    slot, seq = ring.reserve()
+    assert slot == ref.slot
+    assert ring.seqs[slot] == 0
+    ring.array[slot, TAG_ROOM:TAG_ROOM + 3] = list(b'new')
+    committed = ring.commit(slot, seq, 3)
+    assert committed.tobytes() == b'new'
+
+
+def test_oversized_frame_is_left_to_the_caller(ring):
+    assert ring.write(b'x' * (ring.slot_size + 1)) is None
+    assert ring.oversized == 1
+    assert ring.head == 0
+
+
+def test_tag_is_written_in_front_of_the_frame(ring):
+    tag = pack_tag('front-door', 7, 1700000000.5)
+    ref = ring.write(b'jpeg', tag)
+    camera_id, seq, timestamp, jpeg = unpack_tag(tag_frame(ref, tag).tobytes())
+    assert (camera_id, seq, timestamp, bytes(jpeg)) == ('front-door', 7, 1700000000.5, b'jpeg')
+    assert ref.tobytes() == b'jpeg'
+    assert tag_frame(b'jpeg', tag) == tag + b'jpeg'
+
+
+def test_poisoned_slots_are_skipped_until_released(ring):
+    ring.poison({1, 2})
+    assert [ring.reserve()[0] for _ in range(3)] == [3, 4, 5]
+    ring.release({1, 2})
+    ring.head = 0
+    assert ring.reserve()[0] == 1
+
+
+def test_poisoning_keeps_slots_beyond_the_margin(ring):
+    with pytest.raises(ValueError):
+        ring.poison(set(range(ring.slots - RESERVE_MARGIN + 1)))
+    assert ring.poisoned == set()
+
+
+def test_closed_ring_reads_as_overwritten():
+    ring = FrameRing(slots=RESERVE_MARGIN + 1, slot_size=64)
+    ref = ring.write(b'frame')
+    ring.close()
+    assert ref.view() is None
+    assert ref.tobytes() is None
+
+
+def test_ring_needs_more_slots_than_the_margin():
+    with pytest.raises(ValueError):
+        FrameRing(slots=RESERVE_MARGIN)
+
+
+def test_oversized_frames_are_exported_per_camera(tmp_path):
+    server = WSServer(settings_file=str(tmp_path / 'camera_settings.json'))
+    try:
+        ring = server.cameras.session('0').frame_ring(64)
+        ring.write(b'x' * 65)
+        ring.write(b'x' * 64)
+        samples = {sample[0]: sample[3] for sample in server.collect_metrics()}
+        assert samples['frame_ring_oversized_total'] == [({'camera': '0'}, 1)]
+    finally:
+        server.cleanup()
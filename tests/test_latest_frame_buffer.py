@@ -0,0 +1,101 @@
+# file: tests/test_latest_frame_buffer.py
+import threading
+
+import pytest
+
+from classes import FlaskServer
+from classes.FrameRing import RESERVE_MARGIN, FrameRing
+from classes.LatestFrameBuffer import LatestFrameBuffer
+
+
+@pytest.fixture
+def client():
+    frame_buffer = LatestFrameBuffer()
+    config = dict(FlaskServer.app.config)
+    FlaskServer.app.config['FRAME_BUFFER'] = frame_buffer
+    yield FlaskServer.app.test_client(), frame_buffer
+    FlaskServer.app.config.update(config)
+
+
+def test_snapshot_answers_304_until_a_new_frame_is_published(client):
+    http, frame_buffer = client
+    frame_buffer.publish('0', b'jpeg-1', 1700000000.0)
+    first = http.get('/snapshot/0')
+    assert first.status_code == 200
+    assert first.data == b'jpeg-1'
+    assert first.headers['Cache-Control'] == 'no-cache'
+    etag = first.headers['ETag']
+
+    assert http.get('/snapshot/0', headers={'If-None-Match': etag}).status_code == 304
+    frame_buffer.publish('0', b'jpeg-2')
+    second = http.get('/snapshot/0', headers={'If-None-Match': etag})
+    assert second.status_code == 200
+    assert second.data == b'jpeg-2'
+    assert second.headers['ETag'] != etag
+
+
+def test_unknown_or_discarded_camera_is_404(client):
+    http, frame_buffer = client
+    assert http.get('/snapshot/0').status_code == 404
+    frame_buffer.publish('0', b'jpeg')
+    frame_buffer.discard('0')
+    assert http.get('/snapshot/0').status_code == 404
+    assert http.get('/stream/0').status_code == 404
+
+
+def test_etags_differ_across_cameras_and_restarts():
+    first, second = LatestFrameBuffer(), LatestFrameBuffer()
+    for frame_buffer in (first, second):
+        frame_buffer.publish('0', b'jpeg')
+        frame_buffer.publish('1', b'jpeg')
+    assert first.latest('0').etag != first.latest('1').etag
+    assert first.latest('0').etag != second.latest('0').etag
+
+
+def test_ring_frame_is_copied_once_when_first_read():
+    ring = FrameRing(slots=RESERVE_MARGIN + 4, slot_size=64)
+    frame_buffer = LatestFrameBuffer()
+    try:
+        frame_buffer.publish('0', ring.write(b'jpeg'))
+        frame = frame_buffer.latest('0')
+        assert frame.data == b'jpeg'
+        assert frame_buffer.latest('0') is frame
+    finally:
+        ring.close()
+
+
+def test_wait_wakes_on_publish_and_ends_on_discard():
+    frame_buffer = LatestFrameBuffer()
+    frame_buffer.publish('0', b'first')
+    seq = frame_buffer.latest('0').seq
+    results = []
+    waiter = threading.Thread(target=lambda: results.append(frame_buffer.wait('0', seq, timeout=5.0)))
+    waiter.start()
+    frame_buffer.publish('0', b'second')
+    waiter.join()
+    assert results[0].data == b'second'
+
+    waiter = threading.Thread(target=lambda: results.append(frame_buffer.wait('0', results[0].seq, timeout=5.0)))
+    waiter.start()
+    frame_buffer.discard('0')
+    waiter.join()
+    assert results[1] is None
+
+
+def test_stream_sends_published_frames_as_multipart_parts():
+    frame_buffer = LatestFrameBuffer()
+    frame_buffer.publish('0', b'first')
+    stream = FlaskServer.mjpeg_stream(frame_buffer, '0', frame_buffer.latest('0'))
+    assert next(stream) == b'--frame\r\nContent-Type: image/jpeg\r\nContent-Length: 5\r\n\r\nfirst\r\n'
+    frame_buffer.publish('0', b'second')
+    assert next(stream).endswith(b'\r\n\r\nsecond\r\n')
+    frame_buffer.discard('0')
+    with pytest.raises(StopIteration):
+        next(stream)
+
+
+def test_http_reads_count_as_demand():
+    frame_buffer = LatestFrameBuffer()
+    assert not frame_buffer.read_recently('0', 10.0)
+    frame_buffer.latest('0')
+    assert frame_buffer.read_recently('0', 10.0)
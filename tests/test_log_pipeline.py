@@ -0,0 +1,75 @@
+# file: tests/test_log_pipeline.py
+import logging
+import queue
+
+from classes.LogPipeline import DeferredQueueHandler, RateLimitFilter
+from classes.WSServer import WSServer
+
+
+def make_record(lineno=10, camera=None, msg='[-] Decode failed'):
+    record = logging.LogRecord('classes.WSServer', logging.ERROR, 'WSServer.py', lineno, msg, None, None)
+    if camera is not None:
+        record.camera = camera
+    return record
+
+
+def test_repeats_beyond_the_burst_are_suppressed_per_camera(clock):
+    rate_limit = RateLimitFilter(burst=2, interval=10.0, clock=clock)
+    assert [rate_limit.filter(make_record(camera='0')) for _ in range(4)] == [True, True, False, False]
+    assert rate_limit.filter(make_record(camera='1'))  # Another camera has its own window
+    assert rate_limit.filter(make_record(lineno=11, camera='0'))  # So does another call site
+    assert rate_limit.suppressed == 2
+
+
+def test_first_record_after_the_window_reports_the_suppressed_count(clock):
+    rate_limit = RateLimitFilter(burst=1, interval=10.0, clock=clock)
+    for _ in range(4):
+        rate_limit.filter(make_record(camera='0'))
+    clock.now += 10.0
+    record = make_record(camera='0')
+    assert rate_limit.filter(record)
+    assert record.getMessage() == '[-] Decode failed (3 similar messages suppressed)'
+    clock.now += 10.0
+    record = make_record(camera='0')
+    rate_limit.filter(record)
+    assert record.getMessage() == '[-] Decode failed'
+
+
+def test_message_is_merged_with_its_arguments_when_logged():
+    records = queue.SimpleQueue()
+    logger = logging.getLogger('tests.deferred')
+    logger.propagate = False
+    logger.addHandler(DeferredQueueHandler(records))
+    try:
+        boxes = [[1, 2, 3, 4]]
+        logger.warning('[-] Boxes %s', boxes)
+        boxes.append([5, 6, 7, 8])  # Changed before the listener thread gets to the record
+    finally:
+        logger.handlers.clear()
+        logger.propagate = True
+    record = records.get_nowait()
+    assert record.getMessage() == '[-] Boxes [[1, 2, 3, 4]]'
+    assert record.args is None
+
+
+def test_server_leaves_process_logging_alone(tmp_path):
+    root = logging.getLogger()
+    handlers, level = list(root.handlers), root.level
+    server = WSServer(settings_file=str(tmp_path / 'camera_settings.json'))
+    try:
+        assert root.handlers == handlers
+        assert root.level == level
+        assert 'log_suppressed_total' not in [sample[0] for sample in server.collect_metrics()]
+    finally:
+        server.loop.close()
+
+
+def test_server_exports_the_filter_it_is_given(tmp_path):
+    rate_limit = RateLimitFilter()
+    rate_limit.suppressed = 7
+    server = WSServer(settings_file=str(tmp_path / 'camera_settings.json'), log_rate_limit=rate_limit)
+    try:
+        samples = {sample[0]: sample[3] for sample in server.collect_metrics()}
+        assert samples['log_suppressed_total'] == [({}, 7)]
+    finally:
+        server.loop.close()
@@ -0,0 +1,77 @@
+# file: tests/test_metrics.py
+from classes.Metrics import LATENCY_BUCKETS, Histogram, Metrics, escape_label
+
+
+def samples(text):
+    """Sample lines of a Prometheus exposition, keyed by name and labels"""
+    values = {}
+    for line in text.splitlines():
+        if line and not line.startswith('#'):
+            key, value = line.rsplit(' ', 1)
+            values[key] = float(value)
+    return values
+
+
+def test_histogram_quantile_is_the_bound_of_its_bucket():
+    histogram = Histogram()
+    for value in (0.0002, 0.0002, 0.003, 0.2):
+        histogram.observe(value)
+    assert histogram.quantile(0.5) == 0.00025
+    assert histogram.quantile(0.95) == 0.25
+    assert Histogram().quantile(0.5) == 0.0
+    assert histogram.summary()['p50_ms'] == 0.25
+
+
+def test_stage_histograms_are_cumulative_per_camera():
+    metrics = Metrics()
+    camera = metrics.camera('0')
+    camera.observe('decode', 0.002)
+    camera.observe('decode', 0.02)
+    camera.frames_in = 3
+    values = samples(metrics.render_prometheus())
+    assert values['espcam_stage_seconds_bucket{camera="0",stage="decode",le="0.0025"}'] == 1
+    assert values['espcam_stage_seconds_bucket{camera="0",stage="decode",le="0.025"}'] == 2
+    assert values['espcam_stage_seconds_bucket{camera="0",stage="decode",le="+Inf"}'] == 2
+    assert values['espcam_stage_seconds_count{camera="0",stage="decode"}'] == 2
+    assert values['espcam_stage_seconds_sum{camera="0",stage="decode"}'] == 0.022
+    assert values['espcam_frames_in_total{camera="0"}'] == 3
+    buckets = [key for key in values if key.startswith('espcam_viewer_send_lag_seconds_bucket')]
+    assert len(buckets) == len(LATENCY_BUCKETS) + 1
+
+
+def test_every_metric_has_help_and_type():
+    metrics = Metrics()
+    metrics.camera('0')
+    metrics.add_collector(lambda: [('queue_depth', 'gauge', 'Frames waiting', [({'camera': '0'}, 1)])])
+    lines = metrics.render_prometheus().splitlines()
+    names = {line.split()[2] for line in lines if line.startswith('# TYPE')}
+    assert names == {line.split()[2] for line in lines if line.startswith('# HELP')}
+    assert 'espcam_queue_depth' in names
+
+
+def test_collectors_add_samples_and_failures_are_skipped():
+    metrics = Metrics()
+    metrics.add_collector(lambda: 1 / 0)
+    metrics.add_collector(lambda: [
+        ('web_clients', 'gauge', 'Connected web clients', [({}, 2)]),
+        ('viewer_lag_seconds', 'gauge', 'Lag per viewer', [({'viewer': '10.0.0.5:5000'}, 0.25)])
+    ])
+    values = samples(metrics.render_prometheus())
+    assert values['espcam_web_clients'] == 2
+    assert values['espcam_viewer_lag_seconds{viewer="10.0.0.5:5000"}'] == 0.25
+
+
+def test_label_values_are_escaped():
+    assert escape_label('a"b\\c\nd') == 'a\\"b\\\\c\\nd'
+    metrics = Metrics()
+    metrics.camera('say "hi"').frames_in = 1
+    assert 'espcam_frames_in_total{camera="say \\"hi\\""} 1' in metrics.render_prometheus()
+
+
+def test_summary_lists_only_observed_stages():
+    metrics = Metrics()
+    metrics.camera('0').observe('encode', 0.004)
+    summary = metrics.summary()
+    assert list(summary['cameras']['0']['stages']) == ['encode']
+    assert summary['cameras']['0']['stages']['encode']['p95_ms'] == 5.0
+    assert summary['viewer_send_lag']['count'] == 0
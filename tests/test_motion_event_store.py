@@ -0,0 +1,59 @@
+# file: tests/test_motion_event_store.py
+import pytest
+
+from classes.MotionEventStore import MotionEventStore, decode_cursor, encode_cursor
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = MotionEventStore(str(tmp_path / 'motion_events.db'), flush_interval=0.01)
+    yield store
+    store.close()
+
+
+def fill(store, timestamps, camera_id='0'):
+    for timestamp in timestamps:
+        store.record(camera_id, [(0, 0, 4, 4)], timestamp)
+    store.close()  # Commits everything queued
+
+
+def read_all(store, limit, **filters):
+    events, cursor, pages = [], None, 0
+    while True:
+        page, cursor = store.query(limit=limit, cursor=cursor, **filters)
+        events.extend(page)
+        pages += 1
+        if cursor is None:
+            return events, pages
+
+
+def test_pages_split_inside_a_run_of_equal_timestamps(store):
+    fill(store, [100.0] * 7 + [99.0] * 3)
+    events, pages = read_all(store, limit=3)
+    assert pages == 4
+    assert len(events) == 10
+    assert len({event['id'] for event in events}) == 10
+    keys = [(event['timestamp'], event['id']) for event in events]
+    assert keys == sorted(keys, reverse=True)
+
+
+def test_filters_apply_to_every_page(store):
+    store.record('1', [(0, 0, 2, 2)], 100.0)
+    fill(store, [100.0, 100.0, 101.0, 102.0, 103.0])
+    events, _ = read_all(store, limit=2, camera_id='0', start=100.0, end=103.0)
+    assert [event['timestamp'] for event in events] == [102.0, 101.0, 100.0, 100.0]
+    assert {event['camera_id'] for event in events} == {'0'}
+
+
+def test_last_full_page_has_no_cursor(store):
+    fill(store, [1.0, 2.0, 3.0])
+    events, cursor = store.query(limit=3)
+    assert len(events) == 3
+    assert cursor is None
+
+
+def test_cursor_round_trip_keeps_float_precision():
+    timestamp = 1700000000.123456
+    assert decode_cursor(encode_cursor(timestamp, 42)) == (timestamp, 42)
+    with pytest.raises(ValueError):
+        decode_cursor('not-a-cursor')
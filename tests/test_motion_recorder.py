@@ -0,0 +1,91 @@
+# file: tests/test_motion_recorder.py
+import glob
+import os
+
+from classes.MotionRecorder import INDEX_EXTENSION, MotionRecorder, PreRollBuffer, SegmentReader
+
+
+def segments(directory, camera_id='0'):
+    return sorted(path[:-len(INDEX_EXTENSION)] for path in glob.glob(os.path.join(directory, camera_id, '*' + INDEX_EXTENSION)))
+
+
+def test_pre_roll_keeps_only_the_last_seconds():
+    buffer = PreRollBuffer(seconds=2.0)
+    for second in range(5):
+        buffer.append(float(second), b'frame-%d' % second)
+    assert [timestamp for timestamp, _ in buffer.drain()] == [2.0, 3.0, 4.0]
+    assert len(buffer) == 0
+    assert buffer.bytes == 0
+
+
+def test_pre_roll_is_capped_in_bytes():
+    buffer = PreRollBuffer(seconds=60.0, max_bytes=10)
+    for second in range(5):
+        buffer.append(float(second), b'1234')
+    assert len(buffer) == 2
+    assert buffer.bytes == 8
+
+
+def test_event_is_recorded_with_pre_roll_and_post_roll(tmp_path):
+    recorder = MotionRecorder(str(tmp_path), pre_roll=2.0, post_roll=1.0, flush_interval=0.01)
+    for second in range(5):
+        recorder.add_frame('0', b'idle-%d' % second, float(second))
+    assert recorder.update_motion('0', True, 5.0)
+    recorder.add_frame('0', b'motion', 5.0)
+    assert not recorder.update_motion('0', False, 6.0)  # Still within the post-roll
+    recorder.add_frame('0', b'post', 6.0)
+    assert recorder.update_motion('0', False, 6.5)
+    recorder.add_frame('0', b'after', 7.0)  # Back in the pre-roll, not on disk
+    recorder.close()
+
+    paths = segments(str(tmp_path))
+    assert len(paths) == 1
+    frames = list(SegmentReader(paths[0]).frames())
+    assert frames == [(2.0, b'idle-2'), (3.0, b'idle-3'), (4.0, b'idle-4'), (5.0, b'motion'), (6.0, b'post')]
+    assert recorder.stats()['written_frames'] == 5
+
+
+def test_reader_seeks_by_timestamp(tmp_path):
+    recorder = MotionRecorder(str(tmp_path), pre_roll=0.0, flush_interval=0.01)
+    recorder.update_motion('0', True, 100.0)
+    for index in range(50):
+        recorder.add_frame('0', b'%02d' % index, 100.0 + index * 0.5)
+    recorder.close()
+
+    reader = SegmentReader(segments(str(tmp_path))[0] + '.mjpeg')
+    assert len(reader) == 50
+    assert reader.seek(110.0) == 20
+    assert reader.seek(110.2) == 21
+    assert reader.seek(0.0) == 0
+    assert reader.seek(1000.0) == 50
+    assert reader.frame(21) == (110.5, b'21')
+    assert [data for _, data in reader.frames(110.0, 111.0)] == [b'20', b'21', b'22']
+
+
+def test_reader_ignores_a_partial_index_record(tmp_path):
+    recorder = MotionRecorder(str(tmp_path), pre_roll=0.0, flush_interval=0.01)
+    recorder.update_motion('0', True, 1.0)
+    recorder.add_frame('0', b'frame', 1.0)
+    recorder.close()
+    path = segments(str(tmp_path))[0]
+    with open(path + INDEX_EXTENSION, 'ab') as index:
+        index.write(b'\x00' * 5)  # Torn write of a segment still being recorded
+    assert list(SegmentReader(path).frames()) == [(1.0, b'frame')]
+
+
+def test_long_event_is_split_into_segments(tmp_path):
+    recorder = MotionRecorder(str(tmp_path), pre_roll=0.0, segment_seconds=10.0, flush_interval=0.01)
+    recorder.update_motion('0', True, 0.0)
+    for second in range(0, 25, 5):
+        recorder.update_motion('0', True, float(second))
+        recorder.add_frame('0', b'frame', float(second))
+    recorder.close()
+    assert [len(SegmentReader(path)) for path in segments(str(tmp_path))] == [3, 2]
+
+
+def test_frames_beyond_the_pending_cap_are_dropped(tmp_path):
+    recorder = MotionRecorder(str(tmp_path), pre_roll=0.0, max_pending_bytes=0, flush_interval=0.01)
+    recorder.update_motion('0', True, 1.0)
+    recorder.add_frame('0', b'frame', 1.0)
+    recorder.close()
+    assert recorder.stats()['dropped_frames'] == 1
@@ -0,0 +1,61 @@
+# file: tests/test_motion_zones.py
+import pytest
+
+from classes.MotionZones import MAX_ZONES, ZoneMask, normalize_zones
+
+SQUARE = [[0.25, 0.25], [0.75, 0.25], [0.75, 0.75], [0.25, 0.75]]
+WHOLE = [[0, 0], [1, 0], [1, 1], [0, 1]]
+
+
+def test_missing_zones_mean_no_zones():
+    assert normalize_zones(None) == []
+    assert normalize_zones([]) == []
+
+
+def test_points_are_floats_clamped_to_the_frame():
+    zones = normalize_zones([{'points': [[-1, '0.5'], [2, 0], [0.5, 1.5]]}])
+    assert zones == [{'type': 'include', 'points': [[0.0, 0.5], [1.0, 0.0], [0.5, 1.0]]}]
+
+
+@pytest.mark.parametrize('zones', [
+    {'points': SQUARE},
+    [SQUARE],
+    [{'type': 'ignore', 'points': SQUARE}],
+    [{'points': SQUARE[:2]}],
+    [{'points': [[0, 0], [1, 1], [0.5]]}],
+    [{'points': [[0, 0], [1, 1], ['a', 'b']]}],
+    [{'points': SQUARE}] * (MAX_ZONES + 1),
+])
+def test_malformed_zones_are_rejected(zones):
+    with pytest.raises(ValueError):
+        normalize_zones(zones)
+
+
+def test_include_zone_crops_to_its_bounding_rect():
+    rect, mask = ZoneMask.build(normalize_zones([{'points': SQUARE}]), (101, 201))
+    assert rect == (50, 25, 101, 51)
+    assert mask.shape == (51, 101)
+    assert mask.min() == 255
+
+
+def test_exclude_zone_cuts_a_hole_in_the_whole_frame():
+    rect, mask = ZoneMask.build(normalize_zones([{'type': 'exclude', 'points': SQUARE}]), (101, 201))
+    assert rect == (0, 0, 201, 101)
+    assert mask[50, 100] == 0
+    assert mask[0, 0] == 255
+
+
+def test_whole_frame_and_fully_excluded_zones():
+    assert ZoneMask.build(normalize_zones([{'points': WHOLE}]), (90, 120)) == (None, None)
+    assert ZoneMask.build(normalize_zones([{'type': 'exclude', 'points': WHOLE}]), (90, 120)) == ((0, 0, 0, 0), None)
+
+
+def test_mask_is_rebuilt_only_when_zones_or_shape_change():
+    zone_mask = ZoneMask()
+    zones = normalize_zones([{'points': SQUARE}])
+    first = zone_mask.update(zones, (101, 201))
+    second = zone_mask.update(normalize_zones([{'points': SQUARE}]), (101, 201))  # Equal zones, new list
+    assert second[1] is first[1]
+    assert zone_mask.builds == 1
+    zone_mask.update(zones, (51, 101))
+    assert zone_mask.builds == 2
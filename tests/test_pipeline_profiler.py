@@ -0,0 +1,70 @@
+# file: tests/test_pipeline_profiler.py
+import threading
+
+import pytest
+
+from classes import FlaskServer
+from classes.PipelineProfiler import MAX_DURATION, PipelineProfiler
+
+
+@pytest.fixture
+def camera_thread():
+    stop = threading.Event()
+    thread = threading.Thread(target=stop.wait, daemon=True)
+    thread.start()
+    yield thread
+    stop.set()
+    thread.join()
+
+
+@pytest.fixture
+def profiler(camera_thread):
+    return PipelineProfiler(thread_for=lambda camera_id: camera_thread if camera_id == '0' else None)
+
+
+@pytest.mark.parametrize('arguments', [
+    {'duration': 'nan'},
+    {'duration': float('inf')},
+    {'interval': float('nan')},
+    {'duration': None},
+    {'duration': 'ten'},
+    {'mode': 'trace'},
+])
+def test_bad_arguments_are_rejected(profiler, arguments):
+    with pytest.raises(ValueError):
+        profiler.start('0', **arguments)
+    assert profiler.status('0') is None
+
+
+def test_duration_is_clamped_to_the_window(profiler):
+    run = profiler.start('0', mode='cprofile', duration=600)
+    assert run.duration == MAX_DURATION
+
+
+def test_busy_or_idle_camera_is_a_conflict(profiler):
+    profiler.start('0', mode='cprofile', duration=1.0)
+    with pytest.raises(RuntimeError):
+        profiler.start('0', mode='cprofile')
+    with pytest.raises(RuntimeError):
+        profiler.start('1')
+
+
+def test_cprofile_run_reports_when_the_thread_stops(profiler):
+    run = profiler.start('0', mode='cprofile', duration=10.0)
+    profiler.checkpoint('0')
+    profiler.checkpoint('0', final=True)
+    assert run.done
+    assert profiler.report('0')
+
+
+def test_route_answers_400_for_bad_arguments_and_409_when_busy(profiler):
+    config = dict(FlaskServer.app.config)
+    FlaskServer.app.config['PROFILER'] = profiler
+    try:
+        http = FlaskServer.app.test_client()
+        assert http.post('/profile/0?duration=nan').status_code == 400
+        assert http.post('/profile/0?mode=cprofile&duration=1').status_code == 202
+        assert http.post('/profile/0?mode=cprofile').status_code == 409
+        assert http.post('/profile/1').status_code == 404
+    finally:
+        FlaskServer.app.config.update(config)
@@ -0,0 +1,100 @@
+# file: tests/test_settings_store.py
+import asyncio
+import json
+import os
+
+from classes.SettingsStore import SettingsStore
+
+
+def make_store(tmp_path, settings, **kwargs):
+    return SettingsStore(str(tmp_path / 'camera_settings.json'), lambda: dict(settings), **kwargs)
+
+
+def test_burst_of_changes_is_written_once(tmp_path):
+    settings = {'value': 0}
+    store = make_store(tmp_path, settings, delay=0.05, max_delay=1.0)
+
+    async def burst():
+        for value in range(10):
+            settings['value'] = value
+            store.mark_dirty()
+            await asyncio.sleep(0.005)
+        await asyncio.sleep(0.15)
+
+    asyncio.run(burst())
+    store.close()
+    assert store.requests == 10
+    assert store.writes == 1
+    assert json.loads((tmp_path / 'camera_settings.json').read_text()) == {'value': 9}
+
+
+def test_max_delay_bounds_the_wait_while_changes_keep_arriving(tmp_path):
+    settings = {'value': 0}
+    store = make_store(tmp_path, settings, delay=0.05, max_delay=0.1)
+
+    async def drag():
+        # A change every 20 ms never leaves 50 ms of quiet time
+        for value in range(20):
+            settings['value'] = value
+            store.mark_dirty()
+            await asyncio.sleep(0.02)
+
+    asyncio.run(drag())
+    writes_while_dragging = store.writes
+    store.close()
+    assert writes_while_dragging >= 2
+
+
+def test_unchanged_settings_are_not_rewritten(tmp_path):
+    store = make_store(tmp_path, {'value': 1})
+    store.flush()
+    store.flush()
+    store.close()
+    assert store.writes == 1
+    assert store.skipped == 2  # Second flush and the one in close
+
+
+def test_failed_replace_keeps_the_old_file_and_retries(tmp_path, monkeypatch):
+    settings = {'value': 1}
+    store = make_store(tmp_path, settings)
+    store.flush()
+
+    def failing_replace(source, target):
+        raise OSError('disk full')
+
+    settings['value'] = 2
+    with monkeypatch.context() as patch:
+        patch.setattr(os, 'replace', failing_replace)
+        store.flush()
+    path = tmp_path / 'camera_settings.json'
+    assert json.loads(path.read_text()) == {'value': 1}
+    assert [name for name in os.listdir(tmp_path) if name.endswith('.tmp')] == []
+
+    store.flush()  # The failed write is retried although the settings did not change since
+    store.close()
+    assert json.loads(path.read_text()) == {'value': 2}
+
+
+def test_load_marks_the_file_contents_as_written(tmp_path):
+    path = tmp_path / 'camera_settings.json'
+    path.write_text(json.dumps({'value': 3}))
+    store = SettingsStore(str(path), lambda: {'value': 3})
+    assert store.load() == {'value': 3}
+    store.close()
+    assert store.writes == 0
+
+
+def test_changes_after_close_are_saved_synchronously(tmp_path):
+    settings = {'value': 1}
+    store = make_store(tmp_path, settings, delay=0.01)
+
+    async def late_change():
+        store.close()
+        settings['value'] = 2
+        store.mark_dirty()
+        await asyncio.sleep(0.05)  # No debounce timer may fire on the shut down writer
+
+    asyncio.run(late_change())
+    assert store.timer is None
+    assert store.writes == 2
+    assert json.loads((tmp_path / 'camera_settings.json').read_text()) == {'value': 2}
@@ -0,0 +1,75 @@
+# file: tests/test_status_publisher.py
+import asyncio
+import json
+
+from classes.StatusPublisher import StatusPublisher
+
+
+class FakeServer:
+    def __init__(self):
+        self.device_status = {'cameras': {}, 'uptime': 0}
+        self.messages = []
+        self.web_clients = set()
+
+    async def broadcast_to_web_clients(self, message, key=None):
+        self.messages.append(json.loads(message))
+
+
+def flush(publisher):
+    asyncio.run(publisher.flush())
+    return publisher.server.messages[-1]['data'] if publisher.server.messages else None
+
+
+def test_delta_carries_only_changed_fields():
+    server = FakeServer()
+    publisher = StatusPublisher(server)
+    server.device_status['cameras']['0'] = {'fps': 19.96, 'connected': True}
+    assert flush(publisher) == {'cameras': {'0': {'fps': 20.0, 'connected': True}}, 'uptime': 0}
+    server.device_status['cameras']['0']['fps'] = 20.01  # Rounds to the value already sent
+    server.device_status['uptime'] = 5
+    assert flush(publisher) == {'uptime': 5}
+
+
+def test_removed_fields_and_cameras_are_sent_as_none():
+    server = FakeServer()
+    publisher = StatusPublisher(server)
+    server.device_status['cameras'] = {'0': {'connected': True, 'throttled': True}, '1': {'connected': True}}
+    flush(publisher)
+    del server.device_status['cameras']['0']['throttled']
+    del server.device_status['cameras']['1']
+    assert flush(publisher) == {'cameras': {'0': {'throttled': None}, '1': None}}
+
+
+def test_field_set_to_none_is_a_change():
+    server = FakeServer()
+    publisher = StatusPublisher(server)
+    server.device_status['cameras']['0'] = {'recording': None}
+    assert flush(publisher)['cameras'] == {'0': {'recording': None}}
+
+
+def test_unchanged_status_sends_nothing_and_counts_as_coalesced():
+    server = FakeServer()
+    publisher = StatusPublisher(server)
+    for _ in range(5):
+        publisher.mark_dirty()
+    flush(publisher)
+    flush(publisher)
+    assert len(server.messages) == 1
+    assert publisher.stats() == {'requests': 5, 'flushes': 1, 'coalesced': 4}
+
+
+def test_run_merges_bursts_into_one_broadcast():
+    server = FakeServer()
+    publisher = StatusPublisher(server, max_rate=20.0)
+
+    async def burst():
+        publisher.start()
+        for uptime in range(10):
+            server.device_status['uptime'] = uptime
+            publisher.mark_dirty()
+        await asyncio.sleep(0.12)
+        publisher.stop()
+
+    asyncio.run(burst())
+    assert server.messages == [{'type': 'status_delta', 'data': {'uptime': 9}}]
+    assert publisher.coalesced == 9
@@ -0,0 +1,71 @@
+# file: tests/test_thumbnail_cache.py
+from classes.FrameRing import RESERVE_MARGIN, FrameRing
+from classes.ThumbnailCache import ThumbnailCache
+
+
+def test_least_recently_used_camera_is_evicted_over_the_cap():
+    cache = ThumbnailCache(max_bytes=30)
+    for camera_id in ('0', '1', '2'):
+        cache.put(camera_id, b'x' * 10)
+    cache.get('0')  # Previewed, so '1' is now the least recently used
+    cache.put('3', b'x' * 10)
+    assert cache.get('1') is None
+    assert [camera_id for camera_id in ('0', '2', '3') if cache.get(camera_id) is not None] == ['0', '2', '3']
+    assert cache.stats()['bytes'] == 30
+    assert cache.stats()['evictions'] == 1
+
+
+def test_refresh_replaces_the_bytes_of_the_old_thumbnail():
+    cache = ThumbnailCache(max_bytes=30)
+    cache.put('0', b'x' * 20)
+    first = cache.get('0')
+    second = cache.put('0', b'y' * 5)
+    assert cache.stats()['bytes'] == 5
+    assert second.etag != first.etag
+    assert cache.get('0').data == b'y' * 5
+
+
+def test_thumbnail_larger_than_the_cap_is_not_stored():
+    cache = ThumbnailCache(max_bytes=10)
+    cache.put('0', b'small')
+    assert cache.put('1', b'x' * 11) is None
+    assert cache.get('0').data == b'small'
+
+
+def test_missing_data_is_ignored():
+    cache = ThumbnailCache()
+    assert cache.put('0', None) is None
+    assert cache.stats()['entries'] == 0
+    assert cache.due('0')
+
+
+def test_overwritten_ring_frame_leaves_the_thumbnail_due():
+    ring = FrameRing(slots=RESERVE_MARGIN + 1, slot_size=64)
+    cache = ThumbnailCache()
+    try:
+        ref = ring.write(b'thumb')
+        ring.write(b'newer')
+        assert cache.put('0', ref.tobytes()) is None
+    finally:
+        ring.close()
+    assert cache.due('0')
+
+
+def test_refresh_is_due_once_per_interval():
+    cache = ThumbnailCache(interval=60.0)
+    assert cache.due('0')
+    cache.put('0', b'thumb')
+    assert not cache.due('0')
+    cache.discard('0')
+    assert cache.due('0')
+    assert cache.get('0') is None
+
+
+def test_hits_and_misses_are_counted():
+    cache = ThumbnailCache()
+    cache.put('0', bytearray(b'thumb'))
+    cache.get('0')
+    cache.get('1')
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses']) == (1, 1)
+    assert isinstance(cache.get('0').data, bytes)
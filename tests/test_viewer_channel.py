@@ -0,0 +1,129 @@
+# file: tests/test_viewer_channel.py
+import asyncio
+
+from classes.FrameRing import RESERVE_MARGIN, FrameRing
+from classes.ViewerChannel import ViewerChannel, viewer_name
+
+
+class FakeWebSocket:
+    remote_address = ('10.0.0.5', 50123)
+
+    def __init__(self):
+        self.sent = []
+        self.closed_with = None
+
+    async def send(self, message):
+        self.sent.append(message)
+
+    async def close(self, code=1000, reason=''):
+        self.closed_with = code
+
+
+async def drain(channel):
+    channel.start()
+    await asyncio.sleep(0.01)
+    channel.close()
+
+
+def test_control_messages_go_out_before_frames():
+    websocket = FakeWebSocket()
+
+    async def scenario():
+        channel = ViewerChannel(websocket)
+        channel.send_frame(b'frame')
+        channel.send('status')
+        await drain(channel)
+
+    asyncio.run(scenario())
+    assert websocket.sent == ['status', b'frame']
+
+
+def test_full_frame_queue_drops_the_oldest_frame():
+    websocket = FakeWebSocket()
+
+    async def scenario():
+        channel = ViewerChannel(websocket, max_frames=2)
+        for frame in (b'1', b'2', b'3'):
+            channel.send_frame(frame)
+        await drain(channel)
+        return channel
+
+    channel = asyncio.run(scenario())
+    assert websocket.sent == [b'2', b'3']
+    assert channel.stats()['frames_dropped'] == 1
+    assert channel.stats()['frames_sent'] == 2
+
+
+def test_frame_queue_grows_with_subscribed_streams():
+    channel = ViewerChannel(FakeWebSocket(), max_frames=2)
+    channel.set_streams(3)
+    for frame in range(6):
+        channel.send_frame(b'%d' % frame)
+    assert len(channel.frames) == 6
+    assert channel.frames_dropped == 0
+
+
+def test_stale_frames_are_skipped_or_disconnect_by_policy():
+    skipping, disconnecting = FakeWebSocket(), FakeWebSocket()
+
+    async def scenario():
+        channels = [ViewerChannel(skipping, max_lag=0.0, policy='skip'),
+                    ViewerChannel(disconnecting, max_lag=0.0, policy='disconnect')]
+        for channel in channels:
+            channel.send_frame(b'late')
+        await asyncio.sleep(0.01)  # Every queued frame is now older than max_lag
+        for channel in channels:
+            await drain(channel)
+        return channels
+
+    skip_channel, _ = asyncio.run(scenario())
+    assert skipping.sent == [] and skipping.closed_with is None
+    assert skip_channel.frames_dropped == 1
+    assert disconnecting.closed_with == 1013
+
+
+def test_keyed_control_message_replaces_the_queued_one():
+    channel = ViewerChannel(FakeWebSocket())
+    channel.send('metrics-1', key='metrics')
+    channel.send('delta')
+    channel.send('metrics-2', key='metrics')
+    assert [message for _, message in channel.control] == ['metrics-2', 'delta']
+
+
+def test_control_cap_disconnects_a_stalled_client():
+    websocket = FakeWebSocket()
+
+    async def scenario():
+        channel = ViewerChannel(websocket, max_control=3)
+        for index in range(4):
+            channel.send(f'delta-{index}')
+        await asyncio.sleep(0)
+        return channel
+
+    channel = asyncio.run(scenario())
+    assert channel.closed
+    assert websocket.closed_with == 1013
+    assert not channel.control
+
+
+def test_frame_overwritten_in_the_ring_counts_as_dropped():
+    websocket = FakeWebSocket()
+    ring = FrameRing(slots=RESERVE_MARGIN + 1, slot_size=64)
+
+    async def scenario():
+        channel = ViewerChannel(websocket, max_frames=4)
+        channel.send_frame(ring.write(b'old'))
+        ring.write(b'new')  # The first frame's slot is now within the reserve margin
+        await drain(channel)
+        return channel
+
+    try:
+        channel = asyncio.run(scenario())
+    finally:
+        ring.close()
+    assert websocket.sent == []
+    assert channel.frames_dropped == 1
+
+
+def test_viewer_name_is_host_and_port():
+    assert viewer_name(FakeWebSocket()) == '10.0.0.5:50123'
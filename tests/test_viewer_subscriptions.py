@@ -0,0 +1,50 @@
+# file: tests/test_viewer_subscriptions.py
+import pytest
+
+from classes.FramePipeline import DEFAULT_TIER
+from classes.ViewerSubscriptions import MAX_SUBSCRIPTIONS, Subscription, parse_subscriptions
+
+
+def test_list_of_ids_follows_each_camera_at_full_rate():
+    subscriptions = parse_subscriptions(['0', '1'])
+    assert list(subscriptions) == ['0', '1']
+    assert subscriptions['0'].to_dict() == {'tier': DEFAULT_TIER, 'max_fps': None}
+
+
+def test_options_set_tier_and_rate_per_camera():
+    subscriptions = parse_subscriptions({'0': {'tier': 'thumb', 'max_fps': '2'}, '1': {'tier': 'poster'}, '2': None})
+    assert subscriptions['0'].to_dict() == {'tier': 'thumb', 'max_fps': 2.0}
+    assert subscriptions['1'].tier == DEFAULT_TIER  # Unknown tiers fall back to the default
+    assert subscriptions['2'].to_dict() == {'tier': DEFAULT_TIER, 'max_fps': None}
+
+
+def test_unknown_cameras_are_dropped_and_the_count_is_capped():
+    assert list(parse_subscriptions(['0', 'gone'], known={'0'})) == ['0']
+    cameras = [str(index) for index in range(MAX_SUBSCRIPTIONS + 5)]
+    assert len(parse_subscriptions(cameras)) == MAX_SUBSCRIPTIONS
+
+
+@pytest.mark.parametrize('cameras', ['0', 3, None, {'0': {'max_fps': 'fast'}}, {'0': {'max_fps': [5]}}])
+def test_malformed_subscriptions_are_rejected(cameras):
+    with pytest.raises(ValueError):
+        parse_subscriptions(cameras)
+
+
+def test_unlimited_subscription_is_always_due():
+    subscription = Subscription(max_fps=0)
+    assert all(subscription.due(0.001 * index) for index in range(10))
+
+
+def test_rate_limit_keeps_the_average_against_jitter():
+    subscription = Subscription(max_fps=5.0)
+    # Frames arrive every 50 ms with jitter, 5 fps lets through one in four on average
+    sent = sum(subscription.due(index * 0.05 + (0.01 if index % 2 else 0.0)) for index in range(80))
+    assert sent == 20
+
+
+def test_no_burst_after_a_gap():
+    subscription = Subscription(max_fps=10.0)
+    assert subscription.due(0.0)
+    assert subscription.due(5.0)  # Long silence from the camera
+    assert not subscription.due(5.05)
+    assert subscription.due(5.1)